@@ -0,0 +1,82 @@
+# Maintenance commands, run from the backend directory:
+#   python -m app.cli reconcile-counters [--chunk-size 500]
+#   python -m app.cli reconcile-hearts-received [--chunk-size 500]
+#   python -m app.cli rebuild-scores [--chunk-size 500]
+#   python -m app.cli rebuild-terms [--chunk-size 500]
+#   python -m app.cli backfill-geohashes [--chunk-size 500]
+#   python -m app.cli rebuild-search [--chunk-size 500]
+import argparse
+from sqlmodel import Session
+
+from app.utils.database import engine, create_db_and_tables
+from app.utils.engagement import reconcile_engagement_counters, reconcile_hearts_received
+from app.utils.post_scores import rebuild_post_scores
+from app.utils.text_index import rebuild_post_terms
+from app.utils.geo import backfill_geohashes as backfill_post_geohashes
+from app.utils.search_index import rebuild_search_index
+
+def reconcile_counters(args):
+    with Session(engine) as session:
+        corrected = reconcile_engagement_counters(session, chunk_size=args.chunk_size)
+    print(f"Reconciled engagement counters, {corrected} posts corrected.")
+
+def reconcile_hearts(args):
+    with Session(engine) as session:
+        corrected = reconcile_hearts_received(session, chunk_size=args.chunk_size)
+    # The autocomplete index ranks by this total and is loaded at startup
+    print(f"Reconciled hearts received, {corrected} users corrected. Restart the API to reload the autocomplete index.")
+
+def rebuild_scores(args):
+    with Session(engine) as session:
+        rebuilt = rebuild_post_scores(session, chunk_size=args.chunk_size)
+    print(f"Rebuilt {rebuilt} post scores.")
+
+def rebuild_terms(args):
+    with Session(engine) as session:
+        indexed = rebuild_post_terms(session, chunk_size=args.chunk_size)
+    print(f"Re-indexed terms for {indexed} posts.")
+
+def backfill_geohashes(args):
+    with Session(engine) as session:
+        updated = backfill_post_geohashes(session, chunk_size=args.chunk_size)
+    print(f"Updated geohashes for {updated} posts.")
+
+def rebuild_search(args):
+    with Session(engine) as session:
+        indexed = rebuild_search_index(session, chunk_size=args.chunk_size)
+    print(f"Re-indexed {indexed} posts and users for search.")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Gratitude Network maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    reconcile_parser = subparsers.add_parser("reconcile-counters", help="Recompute Post engagement counters from Interaction")
+    reconcile_parser.add_argument("--chunk-size", type=int, default=500)
+    reconcile_parser.set_defaults(func=reconcile_counters)
+
+    hearts_parser = subparsers.add_parser("reconcile-hearts-received", help="Recompute User.hearts_received from heart interactions")
+    hearts_parser.add_argument("--chunk-size", type=int, default=500)
+    hearts_parser.set_defaults(func=reconcile_hearts)
+
+    scores_parser = subparsers.add_parser("rebuild-scores", help="Recompute every PostScore row")
+    scores_parser.add_argument("--chunk-size", type=int, default=500)
+    scores_parser.set_defaults(func=rebuild_scores)
+
+    terms_parser = subparsers.add_parser("rebuild-terms", help="Rebuild the PostTerm index from post content")
+    terms_parser.add_argument("--chunk-size", type=int, default=500)
+    terms_parser.set_defaults(func=rebuild_terms)
+
+    geohash_parser = subparsers.add_parser("backfill-geohashes", help="Derive Post.geohash from location_data")
+    geohash_parser.add_argument("--chunk-size", type=int, default=500)
+    geohash_parser.set_defaults(func=backfill_geohashes)
+
+    search_parser = subparsers.add_parser("rebuild-search", help="Rebuild the full-text search index for posts and users")
+    search_parser.add_argument("--chunk-size", type=int, default=500)
+    search_parser.set_defaults(func=rebuild_search)
+
+    args = parser.parse_args(argv)
+    create_db_and_tables()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,30 @@
 from fastapi import FastAPI, Request, Depends
 from contextlib import asynccontextmanager
-from starlette.middleware.base import BaseHTTPMiddleware
 from fastapi.middleware.cors import CORSMiddleware # Import CORSMiddleware
-from .routers import auth_router, profiles_router, posts_router, interactions_router, social_router, feed_router, search_router
-from .utils.database import create_db_and_tables
-from .utils.rate_limiter import RateLimitMiddleware
-from .utils.jwt import get_current_user
+from .routers import auth_router, profiles_router, posts_router, interactions_router, social_router, feed_router, search_router, metrics_router
+from .utils.database import create_db_and_tables, engine
+from .utils.async_database import ASYNC_READS_ENABLED, dispose_async_engine
+from .utils.post_scores import run_score_worker
+from .utils.username_index import username_index
+from .utils.trending import load_trending_snapshot, run_trending_snapshots
+from sqlmodel import Session
+from .utils.rate_limiter import RateLimitMiddleware, run_rate_limit_sweeper
+from .utils.jwt import get_token_subject
+from .utils.pagination import NEXT_CURSOR_HEADER
 import logging # Import logging
+import asyncio
 
 # Configure logging
 logging.basicConfig(level=logging.INFO) # Set logging level to INFO
 logger = logging.getLogger(__name__)
 
+def load_username_index():
+    try:
+        with Session(engine) as session:
+            username_index.load(session)
+    except Exception as e:
+        logger.error(f"Error loading username index: {e}")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     try:
@@ -21,7 +34,18 @@ async def lifespan(app: FastAPI):
         logger.error(f"Error creating database tables: {e}")
         # Depending on the severity, you might want to raise the exception
         # or handle it more gracefully, e.g., by exiting the application.
+    score_worker = asyncio.create_task(run_score_worker(engine))
+    load_trending_snapshot()
+    trending_snapshots = asyncio.create_task(run_trending_snapshots())
+    rate_limit_sweeper = asyncio.create_task(run_rate_limit_sweeper())
+    # Warm the autocomplete index off the event loop; the first query loads it otherwise
+    username_index_load = asyncio.create_task(asyncio.to_thread(load_username_index))
     yield
+    score_worker.cancel()
+    rate_limit_sweeper.cancel()
+    trending_snapshots.cancel()  # writes a final snapshot
+    await asyncio.gather(trending_snapshots, username_index_load, return_exceptions=True)
+    await dispose_async_engine()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -32,21 +56,30 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
+    expose_headers=[NEXT_CURSOR_HEADER],  # Lets the frontend read pagination cursors
 )
 
-class AuthMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        # Attempt to get the current user, but don't fail if not authenticated
-        try:
-            user = await get_current_user(request)
-            request.state.user = user
-        except Exception:
-            request.state.user = None # Or handle anonymous users as needed
-        response = await call_next(request)
-        return response
+class AuthMiddleware:
+    # Plain ASGI middleware, so responses (streaming ones included) pass through untouched
+    def __init__(self, app):
+        self.app = app
 
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            # Decode the token once, without touching the database; anonymous requests just get None.
+            # Routes that need the user row load it through get_current_user, at most once.
+            # The result lands in scope["state"], which every later Request shares.
+            get_token_subject(Request(scope))
+        await self.app(scope, receive, send)
+
+# Added last so it runs first, and the rate limiter can key on the token subject
+app.add_middleware(RateLimitMiddleware)
 app.add_middleware(AuthMiddleware)
-app.add_middleware(RateLimitMiddleware, limit=50, window=3600)
+
+if ASYNC_READS_ENABLED:
+    # Async versions of the hot read routes; included first so they match ahead of the sync ones
+    for async_reads in (posts_router, interactions_router, profiles_router, search_router):
+        app.include_router(async_reads.async_router)
 
 app.include_router(auth_router.router)
 app.include_router(profiles_router.router) # Included profiles_router
@@ -55,6 +88,7 @@ app.include_router(interactions_router.router)
 app.include_router(social_router.router)
 app.include_router(feed_router.router)
 app.include_router(search_router.router)
+app.include_router(metrics_router.router)
 
 @app.get("/healthz")
 def healthz():
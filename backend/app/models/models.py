@@ -2,7 +2,7 @@ from sqlmodel import Field, SQLModel, Relationship
 import uuid
 from datetime import datetime, timezone
 from typing import List, Optional
-from sqlalchemy import Column, UniqueConstraint
+from sqlalchemy import Column, Index, UniqueConstraint
 from sqlalchemy.types import JSON as SQLAlchemyJSON
 from pydantic import ConfigDict
 
@@ -35,16 +35,24 @@ class User(SQLModel, table=True):
 
 class Post(SQLModel, table=True):
     model_config = ConfigDict(ignored_types=(SQLAlchemyJSON,))
+    __table_args__ = (
+        Index("ix_post_user_fanned_out", "user_id", "fanned_out", "created_at"),
+    )
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     user_id: uuid.UUID = Field(foreign_key="user.id")
     content: str = Field(index=True)
     image_url: str | None = None
     location_data: dict | None = Field(default=None, sa_column=Column(SQLAlchemyJSON))
+    geohash: str | None = Field(default=None, index=True) # Derived from location_data on write, see utils/geo.py
     post_type: str = "simple_text"
     is_draft: bool = False
     scheduled_for: datetime | None = None
     completion_rate: float = 0.0
     reports: int = 0
+    hearts_count: int = 0 # Denormalized engagement counters, see utils/engagement.py
+    comments_count: int = 0
+    shares_count: int = 0
+    fanned_out: bool = True # False when the author was too popular to fan out on write, see utils/timeline.py
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     deleted_at: datetime | None = None
@@ -66,6 +74,39 @@ class Interaction(SQLModel, table=True):
     user: "User" = Relationship(back_populates="interactions")
     post: "Post" = Relationship(back_populates="interactions")
 
+class PostScore(SQLModel, table=True):
+    # Precomputed ranking score per post, maintained by utils/post_scores.py
+    __table_args__ = (
+        Index("ix_postscore_rank", "score", "created_at"),
+    )
+    post_id: uuid.UUID = Field(foreign_key="post.id", primary_key=True)
+    user_id: uuid.UUID = Field(foreign_key="user.id", index=True) # Post author, for relationship filtering
+    base_score: float = 0.0 # Engagement and content rules, no time-dependent component
+    score: float = 0.0 # base_score plus the recency bonus, refreshed by the score worker
+    created_at: datetime # Copied from Post for ranking tie-breaks
+    computed_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class PostTerm(SQLModel, table=True):
+    # Inverted index of normalized post terms, maintained by utils/text_index.py
+    __table_args__ = (
+        Index("ix_postterm_term_post", "term", "post_id"),
+    )
+    post_id: uuid.UUID = Field(foreign_key="post.id", primary_key=True)
+    term: str = Field(primary_key=True)
+    is_hashtag: bool = False # The term appeared as a #hashtag in the post
+
+class TimelineEntry(SQLModel, table=True):
+    # Materialized home timeline row, written on fan-out by utils/timeline.py
+    __table_args__ = (
+        UniqueConstraint("user_id", "post_id", name="unique_timeline_entry"),
+        Index("ix_timelineentry_user_created", "user_id", "created_at"),
+    )
+    id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    user_id: uuid.UUID = Field(foreign_key="user.id") # Timeline owner
+    post_id: uuid.UUID = Field(foreign_key="post.id")
+    author_id: uuid.UUID = Field(foreign_key="user.id") # For trimming on unfollow
+    created_at: datetime # Post creation time
+
 class Follow(SQLModel, table=True):
     __table_args__ = (
         UniqueConstraint("follower_id", "following_id", name="unique_follower_following"),
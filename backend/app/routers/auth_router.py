@@ -1,12 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel, EmailStr
 from sqlmodel import Session, select
 from datetime import datetime, timezone
 from sqlalchemy.exc import IntegrityError # Import IntegrityError
+from typing import Optional
+import logging
 
 from app.models.models import User
 from app.utils import jwt, security, email
-from app.utils.database import engine
+from app.utils.database import get_session  # shared with the other routers
+from app.utils.search_index import index_user, remove_user, invalidate_user_searches
+from app.utils.username_index import username_index
+from app.utils.principal_cache import principal_cache
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -29,31 +37,55 @@ class PasswordReset(BaseModel):
 class EmailVerification(BaseModel):
     token: str
 
-# Dependency to get the database session
-def get_session():
-    from app.utils.database import engine
-    with Session(engine) as session:
-        yield session
+# signup, login and the password reset confirmation are async so that waiting on bcrypt holds
+# no threadpool thread. Their database and login-attempt calls are blocking, so each runs on
+# the threadpool, holding a thread only for as long as the query takes.
+
+def _user_by_email(session: Session, address: str) -> Optional[User]:
+    return session.exec(select(User).where(User.email == address)).first()
+
+def _user_by_username(session: Session, username: str) -> Optional[User]:
+    return session.exec(select(User).where(User.username == username)).first()
+
+def _create_user(session: Session, user: UserCreate, hashed_password: str):
+    new_user = User(email=user.email, username=user.username, password_hash=hashed_password)
+    session.add(new_user)
+    index_user(session, new_user)
+    session.commit()
+    session.refresh(new_user)
+    username_index.upsert(new_user.id, new_user.username, new_user.hearts_received)
+    invalidate_user_searches(new_user.username)
+    # Send verification email
+    verification_token = jwt.create_access_token(data={"sub": new_user.email})
+    email.send_verification_email(new_user.email, verification_token)
+
+def _save_password_hash(session: Session, user: User, password_hash: str):
+    user.password_hash = password_hash
+    session.add(user)
+    session.commit()
+    principal_cache.invalidate(user.email)
+
+def _migrate_password_hash(session: Session, user: User, password_hash: str):
+    # Best effort: the login has already succeeded and must not fail on the rehash
+    try:
+        _save_password_hash(session, user, password_hash)
+    except Exception as e:
+        session.rollback()
+        logger.warning(f"Could not store rehashed password: {e}")
 
 @router.post("/auth/signup", status_code=status.HTTP_201_CREATED)
-def signup(user: UserCreate, session: Session = Depends(get_session)):
+async def signup(user: UserCreate, session: Session = Depends(get_session)):
     try:
-        db_user = session.exec(select(User).where(User.email == user.email)).first()
+        db_user = await run_in_threadpool(_user_by_email, session, user.email)
         if db_user:
             raise HTTPException(status_code=400, detail="Email already registered")
         
-        db_user = session.exec(select(User).where(User.username == user.username)).first()
+        db_user = await run_in_threadpool(_user_by_username, session, user.username)
         if db_user:
             raise HTTPException(status_code=400, detail="Username already registered")
 
-        hashed_password = security.hash_password(user.password)
-        new_user = User(email=user.email, username=user.username, password_hash=hashed_password)
-        session.add(new_user)
-        session.commit()
-        session.refresh(new_user)
-        # Send verification email
-        verification_token = jwt.create_access_token(data={"sub": new_user.email})
-        email.send_verification_email(new_user.email, verification_token)
+        hashed_password = await security.run_hashing(security.hash_password, user.password)
+        await run_in_threadpool(_create_user, session, user, hashed_password)
         return {"message": "User created successfully. Please check your email for verification."}
     except IntegrityError:
         # This catches cases where a race condition might lead to duplicate email/username
@@ -64,14 +96,28 @@ def signup(user: UserCreate, session: Session = Depends(get_session)):
         raise HTTPException(status_code=500, detail=f"Internal server error during signup: {e}")
 
 @router.post("/auth/login")
-def login(form_data: UserLogin, session: Session = Depends(get_session)):
-    if security.is_login_attempt_blocked(form_data.email):
+async def login(form_data: UserLogin, session: Session = Depends(get_session)):
+    if await run_in_threadpool(security.is_login_attempt_blocked, form_data.email):
         raise HTTPException(status_code=403, detail="Too many failed login attempts")
 
-    user = session.exec(select(User).where(User.email == form_data.email)).first()
-    if not user or not security.verify_password(form_data.password, user.password_hash):
-        security.record_failed_login_attempt(form_data.email)
+    user = await run_in_threadpool(_user_by_email, session, form_data.email)
+    # Only failures against real accounts are counted. Those cost a bcrypt check each, while
+    # unknown addresses are free to try, and spraying them would evict real lockout counters.
+    if not user:
         raise HTTPException(status_code=401, detail="Incorrect email or password")
+    if not await security.run_hashing(security.verify_password, form_data.password, user.password_hash):
+        await run_in_threadpool(security.record_failed_login_attempt, form_data.email)
+        raise HTTPException(status_code=401, detail="Incorrect email or password")
+    await run_in_threadpool(security.reset_login_attempts, form_data.email)
+
+    # Move hashes made with an older BCRYPT_ROUNDS to the current cost while we have the password
+    if security.needs_rehash(user.password_hash):
+        try:
+            password_hash = await security.run_hashing(security.hash_password, form_data.password)
+        except HTTPException:
+            password_hash = None  # the pool is saturated; try again on a later login
+        if password_hash is not None:
+            await run_in_threadpool(_migrate_password_hash, session, user, password_hash)
 
     # Temporarily commented out for development to bypass email verification
     # if not user.email_verified:
@@ -91,6 +137,7 @@ def verify_email(verification: EmailVerification, session: Session = Depends(get
         user.email_verified = True
         session.add(user)
         session.commit()
+        principal_cache.invalidate(user.email)
         return {"message": "Email verified successfully"}
     except HTTPException as e:
         raise e
@@ -104,28 +151,29 @@ def reset_password_request(request: PasswordResetRequest, session: Session = Dep
     return {"message": "If a user with that email exists, a password reset link has been sent."}
 
 @router.post("/auth/reset-password/confirm")
-def reset_password_confirm(request: PasswordReset, session: Session = Depends(get_session)):
+async def reset_password_confirm(request: PasswordReset, session: Session = Depends(get_session)):
     try:
         token_data = jwt.verify_token(request.token, HTTPException(status_code=400, detail="Invalid token"))
-        user = session.exec(select(User).where(User.email == token_data.email)).first()
+        user = await run_in_threadpool(_user_by_email, session, token_data.email)
         if not user:
             raise HTTPException(status_code=400, detail="User not found")
-        user.password_hash = security.hash_password(request.new_password)
-        session.add(user)
-        session.commit()
+        password_hash = await security.run_hashing(security.hash_password, request.new_password)
+        await run_in_threadpool(_save_password_hash, session, user, password_hash)
         return {"message": "Password has been reset successfully."}
     except HTTPException as e:
         raise e
 
 @router.delete("/auth/delete")
-def delete_account(session: Session = Depends(get_session), token: str = Depends(jwt.verify_token)):
+def delete_account(request: Request, session: Session = Depends(get_session)):
     # This is a soft delete. A background job would be needed to purge the data.
-    user = session.exec(select(User).where(User.email == token.email)).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    user = jwt.resolve_current_user(request, session)
     user.deleted_at = datetime.now(timezone.utc)
     session.add(user)
+    remove_user(session, user.id)
     session.commit()
+    principal_cache.invalidate(user.email)
+    username_index.remove(user.id)
+    invalidate_user_searches(user.username, user.bio)
     return {"message": "Account scheduled for deletion."}
 
 # Placeholder for OAuth endpoints
@@ -1,46 +1,71 @@
-from fastapi import APIRouter, Depends
-from sqlmodel import Session, select
-from app.models.models import Post, User, Follow
-from fastapi import APIRouter, Depends
-from sqlmodel import Session, select
-from app.models.models import Post, User, Follow
+from fastapi import APIRouter, Depends, Query, Response
+from fastapi.encoders import jsonable_encoder
+from sqlmodel import Session
+from typing import Callable, Optional
+import json
+from app.models.models import User
 from app.utils.database import get_session
 from app.utils.jwt import get_current_user
-from app.utils.feed_algorithm import calculate_post_score, get_personalized_feed, get_discovery_feed, get_topic_feed
-# from app.utils.redis_client import get_redis_client
-# import json
+from app.utils.feed_algorithm import get_personalized_feed, get_discovery_feed, get_topic_feed, get_local_feed, FeedPage, FEED_PAGE_SIZE, MAX_FEED_PAGE_SIZE
+from app.utils.pagination import NEXT_CURSOR_HEADER
+from app.utils.cache import feed_cache
+from app.utils.text_index import topic_cache_namespace
 
+# Sync only: ranking is CPU-bound, so it runs on the threadpool rather than on the event loop,
+# where the async engine's run_sync would put it
 router = APIRouter()
 
-@router.get("/feed")
-def get_personalized_feed_route(db: Session = Depends(get_session), current_user: User = Depends(get_current_user)): #, redis_client = Depends(get_redis_client)):
-    # cache_key = f"personalized_feed:{current_user.id}"
-    # cached_feed = redis_client.get(cache_key)
-    # if cached_feed:
-    #     return json.loads(cached_feed)
+PERSONALIZED_FEED_TTL = 60
+DISCOVERY_FEED_TTL = 300
+TOPIC_FEED_TTL = 300
+LOCAL_FEED_TTL = 60
+DEFAULT_LOCAL_RADIUS_KM = 25.0
+MAX_LOCAL_RADIUS_KM = 200.0
 
-    feed = get_personalized_feed(db, current_user)
-    # redis_client.setex(cache_key, 60, json.dumps([p.dict() for p in feed])) # Cache for 60 seconds
-    return feed
+def _serialize_page(page: FeedPage) -> bytes:
+    # Serialized once when computed; cache hits are returned byte for byte. The first line
+    # carries the response headers, the rest is the JSON body.
+    timings = page.timings
+    headers = {
+        # Per-stage pipeline timings, visible in browser devtools
+        "Server-Timing": (
+            f"candidates;dur={timings['candidates']:.2f}, rank;dur={timings['rank']:.2f}, "
+            f"candidate_count;desc=\"{timings['candidate_count']}\""
+        ),
+    }
+    if page.next_cursor:
+        headers[NEXT_CURSOR_HEADER] = page.next_cursor
+    body = json.dumps(jsonable_encoder(page.posts), separators=(",", ":"))
+    return (json.dumps(headers) + "\n" + body).encode("utf-8")
 
-@router.get("/feed/discover")
-def get_discovery_feed_route(db: Session = Depends(get_session)): #, redis_client = Depends(get_redis_client)):
-    # cache_key = "discovery_feed"
-    # cached_feed = redis_client.get(cache_key)
-    # if cached_feed:
-    #     return json.loads(cached_feed)
+def _cached_page(namespace: str, key: str, compute: Callable[[], FeedPage], ttl: int) -> Response:
+    hit = True
+    def compute_serialized():
+        nonlocal hit
+        hit = False
+        return _serialize_page(compute())
+
+    payload = feed_cache.get_or_compute(namespace, key, compute_serialized, ttl)
+    header_line, body = payload.split(b"\n", 1)
+    headers = json.loads(header_line)
+    if hit:
+        headers["Server-Timing"] = "cache;desc=hit"
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# Feeds are keyset paginated: pass the X-Next-Cursor response header back as ?cursor= for the next page
 
-    feed = get_discovery_feed(db)
-    # redis_client.setex(cache_key, 300, json.dumps([p.dict() for p in feed])) # Cache for 5 minutes
-    return feed
+@router.get("/feed")
+def get_personalized_feed_route(limit: int = Query(default=FEED_PAGE_SIZE, ge=1, le=MAX_FEED_PAGE_SIZE), cursor: Optional[str] = None, db: Session = Depends(get_session), current_user: User = Depends(get_current_user)):
+    return _cached_page(f"feed:{current_user.id}", f"{limit}:{cursor or ''}", lambda: get_personalized_feed(db, current_user, limit, cursor), PERSONALIZED_FEED_TTL)
+
+@router.get("/feed/discover")
+def get_discovery_feed_route(limit: int = Query(default=FEED_PAGE_SIZE, ge=1, le=MAX_FEED_PAGE_SIZE), cursor: Optional[str] = None, db: Session = Depends(get_session)):
+    return _cached_page("discover", f"{limit}:{cursor or ''}", lambda: get_discovery_feed(db, limit, cursor), DISCOVERY_FEED_TTL)
 
 @router.get("/feed/topic/{topic}")
-def get_topic_feed_route(topic: str, db: Session = Depends(get_session)): #, redis_client = Depends(get_redis_client)):
-    # cache_key = f"topic_feed:{topic}"
-    # cached_feed = redis_client.get(cache_key)
-    # if cached_feed:
-    #     return json.loads(cached_feed)
-
-    feed = get_topic_feed(db, topic)
-    # redis_client.setex(cache_key, 300, json.dumps([p.dict() for p in feed])) # Cache for 5 minutes
-    return feed
+def get_topic_feed_route(topic: str, limit: int = Query(default=FEED_PAGE_SIZE, ge=1, le=MAX_FEED_PAGE_SIZE), cursor: Optional[str] = None, db: Session = Depends(get_session)):
+    return _cached_page(topic_cache_namespace(topic), f"{topic}:{limit}:{cursor or ''}", lambda: get_topic_feed(db, topic, limit, cursor), TOPIC_FEED_TTL)
+
+@router.get("/feed/local")
+def get_local_feed_route(lat: float = Query(ge=-90, le=90), lng: float = Query(ge=-180, le=180), radius_km: float = Query(default=DEFAULT_LOCAL_RADIUS_KM, gt=0, le=MAX_LOCAL_RADIUS_KM), limit: int = Query(default=FEED_PAGE_SIZE, ge=1, le=MAX_FEED_PAGE_SIZE), cursor: Optional[str] = None, db: Session = Depends(get_session)):
+    return _cached_page("local", f"{lat}:{lng}:{radius_km}:{limit}:{cursor or ''}", lambda: get_local_feed(db, lat, lng, radius_km, limit, cursor), LOCAL_FEED_TTL)
@@ -1,12 +1,21 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from app.models.models import Interaction, Post, User, CommentCreate
 from app.utils.database import get_session
+from app.utils.async_database import get_async_session
 from app.utils.jwt import get_current_user
 from app.utils.notifications import create_notification
+from app.utils.engagement import adjust_engagement_counter, adjust_hearts_received
+from app.utils.post_scores import refresh_post_score
+from app.utils.cache import invalidate_engaged_post_feeds
+from app.utils.text_index import extract_terms
+from app.utils.username_index import username_index
 import uuid
 
 router = APIRouter()
+# The same routes on the async engine; main.py mounts them ahead of the sync ones when enabled
+async_router = APIRouter()
 
 @router.post("/posts/{post_id}/heart")
 def heart_post(post_id: uuid.UUID, db: Session = Depends(get_session), current_user: User = Depends(get_current_user)):
@@ -21,19 +30,35 @@ def heart_post(post_id: uuid.UUID, db: Session = Depends(get_session), current_u
 
     new_interaction = Interaction(user_id=current_user.id, post_id=post_id, interaction_type="heart")
     db.add(new_interaction)
+    adjust_engagement_counter(db, post_id, "heart", 1)
+    adjust_hearts_received(db, post.user_id, 1)
+    db.refresh(post)
+    refresh_post_score(db, post)
     db.commit()
+    invalidate_engaged_post_feeds(extract_terms(post.content))
+    username_index.adjust_hearts(post.user_id, 1)
     db.refresh(new_interaction)
     create_notification(db, post.user, "heart", "New Heart!", f"{current_user.username} hearted your post.", {"post_id": str(post.id), "user_id": str(current_user.id)})
     return {"id": str(new_interaction.id), "user_id": str(new_interaction.user_id), "post_id": str(new_interaction.post_id), "interaction_type": new_interaction.interaction_type, "created_at": new_interaction.created_at.isoformat()}
 
 @router.delete("/posts/{post_id}/heart")
 def unheart_post(post_id: uuid.UUID, db: Session = Depends(get_session), current_user: User = Depends(get_current_user)):
+    post = db.get(Post, post_id)
+    if not post:
+        raise HTTPException(status_code=404, detail="Post not found")
+
     interaction = db.exec(select(Interaction).where(Interaction.post_id == post_id, Interaction.user_id == current_user.id, Interaction.interaction_type == "heart")).first()
     if not interaction:
         raise HTTPException(status_code=404, detail="Heart not found")
 
     db.delete(interaction)
+    adjust_engagement_counter(db, post_id, "heart", -1)
+    adjust_hearts_received(db, post.user_id, -1)
+    db.refresh(post)
+    refresh_post_score(db, post)
     db.commit()
+    invalidate_engaged_post_feeds(extract_terms(post.content))
+    username_index.adjust_hearts(post.user_id, -1)
     return {"message": "Heart removed"}
 
 @router.post("/posts/{post_id}/comments")
@@ -45,7 +70,11 @@ def add_comment(post_id: uuid.UUID, comment: CommentCreate, db: Session = Depend
 
     new_comment = Interaction(user_id=current_user.id, post_id=post_id, interaction_type="comment", content=comment.content)
     db.add(new_comment)
+    adjust_engagement_counter(db, post_id, "comment", 1)
+    db.refresh(post)
+    refresh_post_score(db, post)
     db.commit()
+    invalidate_engaged_post_feeds(extract_terms(post.content))
     db.refresh(new_comment)
     create_notification(db, post.user, "comment", "New Comment!", f"{current_user.username} commented on your post: {comment.content[:50]}...", {"post_id": str(post.id), "user_id": str(current_user.id)})
     return {"id": str(new_comment.id), "user_id": str(new_comment.user_id), "post_id": str(new_comment.post_id), "interaction_type": new_comment.interaction_type, "content": new_comment.content, "created_at": new_comment.created_at.isoformat()}
@@ -54,3 +83,8 @@ def add_comment(post_id: uuid.UUID, comment: CommentCreate, db: Session = Depend
 def get_comments(post_id: uuid.UUID, db: Session = Depends(get_session)):
     comments = db.exec(select(Interaction).where(Interaction.post_id == post_id, Interaction.interaction_type == "comment")).all()
     return comments
+
+@async_router.get("/posts/{post_id:uuid}/comments")
+async def get_comments_async(post_id: uuid.UUID, db: AsyncSession = Depends(get_async_session)):
+    comments = (await db.exec(select(Interaction).where(Interaction.post_id == post_id, Interaction.interaction_type == "comment"))).all()
+    return comments
@@ -0,0 +1,36 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from app.utils.metrics import collect_metrics
+import hmac
+import ipaddress
+import os
+
+# /metrics exposes cache, pool and login-attempt internals, so it only answers scrapers on an
+# allowed network or presenting METRICS_TOKEN as a bearer token. With neither configured only
+# loopback clients get through.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+METRICS_ALLOWED_NETWORKS = [
+    ipaddress.ip_network(network.strip())
+    for network in os.getenv("METRICS_ALLOWED_NETWORKS", "127.0.0.1/32,::1/128").split(",")
+    if network.strip()
+]
+
+router = APIRouter()
+
+def _from_allowed_network(host: str) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in METRICS_ALLOWED_NETWORKS)
+
+def require_metrics_access(request: Request):
+    authorization = request.headers.get("Authorization", "")
+    if METRICS_TOKEN and hmac.compare_digest(authorization.encode(), f"Bearer {METRICS_TOKEN}".encode()):
+        return
+    if request.client is not None and _from_allowed_network(request.client.host):
+        return
+    raise HTTPException(status_code=403, detail="Not allowed to read metrics")
+
+@router.get("/metrics", dependencies=[Depends(require_metrics_access)])
+def get_metrics():
+    return collect_metrics()
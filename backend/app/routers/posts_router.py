@@ -2,27 +2,42 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
 from pydantic import BaseModel
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from typing import List, Optional
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from sqlalchemy.orm import selectinload
+import uuid
 
 from app.models.models import Post, User
 from .auth_router import get_session
+from app.utils.async_database import get_async_session
 from app.utils.middleware import get_current_user
 from app.utils.validation import validate_post_content
 from app.utils.image_utils import save_upload_file, process_image, UPLOAD_DIR
+from app.utils.post_scores import refresh_post_score
+from app.utils.timeline import fan_out_post
+from app.utils.cache import invalidate_ranked_feeds, invalidate_personalized_feeds
+from app.utils.text_index import extract_terms, index_post_terms
+from app.utils.geo import geohash_for_location
+from app.utils.search_index import index_post, invalidate_post_searches
+from app.utils.trending import trending_terms
 
 router = APIRouter()
+# The same routes on the async engine; main.py mounts them ahead of the sync ones when enabled
+async_router = APIRouter()
 
 class PostCreate(BaseModel):
     content: str
     post_type: str = "simple_text"
     is_draft: bool = False
+    location_data: Optional[dict] = None
     scheduled_for: Optional[datetime] = None
 
 class PostUpdate(BaseModel):
     content: Optional[str] = None
+    post_type: Optional[str] = None
     is_draft: Optional[bool] = None
+    location_data: Optional[dict] = None
 
 @router.post("/posts", status_code=201)
 def create_post(post_data: PostCreate, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
@@ -32,11 +47,23 @@ def create_post(post_data: PostCreate, current_user: User = Depends(get_current_
         content=post_data.content,
         post_type=post_data.post_type,
         is_draft=post_data.is_draft,
+        location_data=post_data.location_data,
+        geohash=geohash_for_location(post_data.location_data),
         scheduled_for=post_data.scheduled_for
     )
     session.add(new_post)
+    refresh_post_score(session, new_post)
+    index_post_terms(session, new_post)
+    index_post(session, new_post)
+    follower_ids = fan_out_post(session, new_post)
     session.commit()
     session.refresh(new_post)
+    terms = extract_terms(new_post.content)
+    invalidate_ranked_feeds(terms)
+    invalidate_post_searches(new_post.content)
+    if not new_post.is_draft:
+        trending_terms.add_terms(terms)
+    invalidate_personalized_feeds(follower_ids)
     return new_post
 
 @router.get("/posts", response_model=List[Post])
@@ -67,19 +94,35 @@ def edit_post(post_id: str, post_data: PostUpdate, current_user: User = Depends(
     if not post or post.user_id != current_user.id:
         raise HTTPException(status_code=404, detail="Post not found")
 
-    if datetime.now(timezone.utc) - post.created_at > timedelta(hours=24):
+    created_at = post.created_at.replace(tzinfo=timezone.utc) if post.created_at.tzinfo is None else post.created_at
+    if datetime.now(timezone.utc) - created_at > timedelta(hours=24):
         raise HTTPException(status_code=403, detail="Cannot edit posts older than 24 hours")
 
+    # Topic feeds and searches that matched the old content must drop the post too
+    old_content = post.content
+    affected_terms = set(extract_terms(post.content))
     if post_data.content:
         validate_post_content(post_data.content)
         post.content = post_data.content
+        index_post_terms(session, post)
+        index_post(session, post)
+        affected_terms.update(extract_terms(post.content))
+    if post_data.post_type is not None and post_data.post_type != post.post_type:
+        post.post_type = post_data.post_type
+        refresh_post_score(session, post)
     if post_data.is_draft is not None:
         post.is_draft = post_data.is_draft
+    if post_data.location_data is not None:
+        post.geohash = geohash_for_location(post_data.location_data)
+        post.location_data = post_data.location_data
     
     post.updated_at = datetime.utcnow()
     session.add(post)
     session.commit()
     session.refresh(post)
+    invalidate_ranked_feeds(affected_terms)
+    if post.content != old_content:
+        invalidate_post_searches(old_content, post.content)
     return post
 
 @router.post("/posts/{post_id}/image")
@@ -94,5 +137,15 @@ def upload_post_image(post_id: str, file: UploadFile = File(...), current_user:
 
     post.image_url = str(file_path)
     session.add(post)
+    refresh_post_score(session, post)
     session.commit()
+    invalidate_ranked_feeds(extract_terms(post.content))
     return {"message": "Image uploaded successfully"}
+
+# Only UUIDs match, so /posts/drafts and the like still reach their sync routes
+@async_router.get("/posts/{post_id:uuid}", response_model=Post)
+async def get_post_async(post_id: uuid.UUID, session: AsyncSession = Depends(get_async_session)):
+    post = await session.get(Post, post_id)
+    if not post:
+        raise HTTPException(status_code=404, detail="Post not found")
+    return post
@@ -3,13 +3,20 @@ import uuid
 from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from datetime import datetime # Added datetime import
 
 from app.models.models import User, UserPreferences, Achievement # Import UserPreferences and Achievement
 from app.routers.auth_router import get_session
+from app.utils.async_database import get_async_session
 from app.utils.jwt import get_current_user
+from app.utils.search_index import index_user, invalidate_user_searches
+from app.utils.username_index import username_index
+from app.utils.principal_cache import principal_cache
 
 router = APIRouter()
+# The same routes on the async engine; main.py mounts them ahead of the sync ones when enabled
+async_router = APIRouter()
 
 class UserProfile(BaseModel):
     id: uuid.UUID
@@ -68,10 +75,21 @@ def update_current_user_profile(
     current_user: User = Depends(get_current_user),
     session: Session = Depends(get_session),
 ):
-    for field, value in profile_update.model_dump(exclude_unset=True).items():
-        setattr(current_user, field, value)
+    # current_user may be a cached snapshot up to PRINCIPAL_CACHE_TTL_SECONDS old. Only the
+    # updated fields go onto a row freshly loaded in this session, so counters changed
+    # meanwhile, like hearts_received, are never written back stale.
+    user = session.get(User, current_user.id, populate_existing=True)
+    updates = profile_update.model_dump(exclude_unset=True)
+    old_text = (user.username, user.bio)
+    for field, value in updates.items():
+        setattr(user, field, value)
+    index_user(session, user)
     session.commit()
-    return current_user
+    principal_cache.invalidate(user.email)
+    invalidate_user_searches(*old_text, user.username, user.bio)
+    if "username" in updates:
+        username_index.upsert(user.id, user.username, user.hearts_received)
+    return user
 
 @router.get("/profiles/{user_id}", response_model=UserProfile)
 def read_user_profile(
@@ -138,3 +156,14 @@ def get_user_stats(
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     return user
+
+# Only UUIDs match, so /profiles/me still reaches its sync route
+@async_router.get("/profiles/{user_id:uuid}", response_model=UserProfile)
+async def read_user_profile_async(
+    user_id: uuid.UUID,
+    session: AsyncSession = Depends(get_async_session),
+):
+    user = (await session.exec(select(User).where(User.id == user_id))).first()
+    if not user:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    return user
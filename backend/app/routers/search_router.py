@@ -1,24 +1,97 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.encoders import jsonable_encoder
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import Callable, Optional
+import asyncio
+import json
+import os
 from app.models.models import User, Post
-from app.utils.database import get_session
+from app.utils.database import get_session, SessionFactory
+from app.utils.async_database import get_async_session
 from app.utils.jwt import get_current_user
+from app.utils.pagination import NEXT_CURSOR_HEADER
+from app.utils.search_index import search_posts as search_post_index, search_users as search_user_index, search_cache_key, SEARCH_PAGE_SIZE, MAX_SEARCH_PAGE_SIZE
+from app.utils.cache import search_cache
+from app.utils.username_index import username_index, AUTOCOMPLETE_LIMIT, MAX_AUTOCOMPLETE_LIMIT
+from app.utils.trending import trending_terms, TRENDING_LIMIT, MAX_TRENDING_LIMIT
 
 router = APIRouter()
+# The same routes on the async engine; main.py mounts them ahead of the sync ones when enabled
+async_router = APIRouter()
+
+# Short, since relevance also shifts with corpus statistics that invalidation does not track
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL_SECONDS", "30"))
+
+# Pages are cached by normalized query, so "Family" and "family " share an entry; the first
+# line of the payload carries the next cursor, the rest is the JSON body
+def _serialize_results(page) -> bytes:
+    results, next_cursor = page
+    body = json.dumps(jsonable_encoder(results), separators=(",", ":"))
+    return (json.dumps(next_cursor) + "\n" + body).encode("utf-8")
+
+def _results_response(payload: bytes) -> Response:
+    cursor_line, body = payload.split(b"\n", 1)
+    next_cursor = json.loads(cursor_line)
+    return Response(content=body, media_type="application/json", headers={NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None)
+
+def _cached_results(kind: str, query: str, limit: int, cursor: Optional[str], compute: Callable) -> Response:
+    cache_key = search_cache_key(query)
+    if cache_key is None:
+        return Response(content="[]", media_type="application/json")
+    prefix, normalized_query = cache_key
+    payload = search_cache.get_or_compute(f"{kind}:{prefix}", f"{normalized_query}:{limit}:{cursor or ''}", lambda: _serialize_results(compute()), SEARCH_CACHE_TTL)
+    return _results_response(payload)
+
+async def _cached_results_async(kind: str, query: str, limit: int, cursor: Optional[str], db: AsyncSession, compute: Callable) -> Response:
+    cache_key = search_cache_key(query)
+    if cache_key is None:
+        return Response(content="[]", media_type="application/json")
+    prefix, normalized_query = cache_key
+    async def compute_serialized():
+        return await db.run_sync(lambda session: _serialize_results(compute(session)))
+    payload = await search_cache.get_or_compute_async(f"{kind}:{prefix}", f"{normalized_query}:{limit}:{cursor or ''}", compute_serialized, SEARCH_CACHE_TTL)
+    return _results_response(payload)
+
+# Results are ordered by relevance and keyset paginated: pass the X-Next-Cursor response header back as ?cursor=
 
 @router.get("/search/users")
-def search_users(query: str, db: Session = Depends(get_session)):
-    users = db.exec(select(User).where(User.username.contains(query) | User.bio.contains(query))).all()
-    return users
+def search_users(query: str, limit: int = Query(default=SEARCH_PAGE_SIZE, ge=1, le=MAX_SEARCH_PAGE_SIZE), cursor: Optional[str] = None, db: Session = Depends(get_session)):
+    return _cached_results("users", query, limit, cursor, lambda: search_user_index(db, query, limit, cursor))
+
+@router.get("/search/users/autocomplete")
+def autocomplete_usernames(prefix: str = Query(min_length=1), limit: int = Query(default=AUTOCOMPLETE_LIMIT, ge=1, le=MAX_AUTOCOMPLETE_LIMIT), db: Session = Depends(get_session)):
+    # Typeahead for mentions and the follow search box, served from memory
+    return username_index.search(db, prefix, limit)
 
 @router.get("/search/posts")
-def search_posts(query: str, db: Session = Depends(get_session)):
-    posts = db.exec(select(Post).where(Post.content.contains(query))).all()
-    return posts
+def search_posts(query: str, limit: int = Query(default=SEARCH_PAGE_SIZE, ge=1, le=MAX_SEARCH_PAGE_SIZE), cursor: Optional[str] = None, db: Session = Depends(get_session)):
+    return _cached_results("posts", query, limit, cursor, lambda: search_post_index(db, query, limit, cursor))
 
 @router.get("/search/trending")
-def get_trending_topics(db: Session = Depends(get_session)):
-    # This is a placeholder. A real trending algorithm would be more complex.
-    # For now, it returns the most recent posts as a proxy for trending.
-    posts = db.exec(select(Post).order_by(Post.created_at.desc()).limit(10)).all()
-    return posts
+def get_trending_topics(limit: int = Query(default=TRENDING_LIMIT, ge=1, le=MAX_TRENDING_LIMIT)):
+    # Terms and hashtags from recently published posts, most frequent first, served from memory
+    return trending_terms.top(limit)
+
+@async_router.get("/search/users")
+async def search_users_async(query: str, limit: int = Query(default=SEARCH_PAGE_SIZE, ge=1, le=MAX_SEARCH_PAGE_SIZE), cursor: Optional[str] = None, db: AsyncSession = Depends(get_async_session)):
+    return await _cached_results_async("users", query, limit, cursor, db, lambda session: search_user_index(session, query, limit, cursor))
+
+def _load_username_index():
+    with SessionFactory() as session:
+        username_index.load(session)
+
+@async_router.get("/search/users/autocomplete")
+async def autocomplete_usernames_async(prefix: str = Query(min_length=1), limit: int = Query(default=AUTOCOMPLETE_LIMIT, ge=1, le=MAX_AUTOCOMPLETE_LIMIT)):
+    # The one-off load holds the index lock while it queries, so it runs off the event loop
+    if not username_index.loaded:
+        await asyncio.to_thread(_load_username_index)
+    return username_index.search(None, prefix, limit)
+
+@async_router.get("/search/posts")
+async def search_posts_async(query: str, limit: int = Query(default=SEARCH_PAGE_SIZE, ge=1, le=MAX_SEARCH_PAGE_SIZE), cursor: Optional[str] = None, db: AsyncSession = Depends(get_async_session)):
+    return await _cached_results_async("posts", query, limit, cursor, db, lambda session: search_post_index(session, query, limit, cursor))
+
+@async_router.get("/search/trending")
+async def get_trending_topics_async(limit: int = Query(default=TRENDING_LIMIT, ge=1, le=MAX_TRENDING_LIMIT)):
+    return trending_terms.top(limit)
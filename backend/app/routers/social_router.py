@@ -4,6 +4,9 @@ from app.models.models import Follow, User
 from app.utils.database import get_session
 from app.utils.jwt import get_current_user
 from app.utils.notifications import create_notification
+from app.utils.timeline import backfill_timeline, remove_author_from_timeline
+from app.utils.follow_cache import follow_cache
+from app.utils.cache import invalidate_personalized_feeds
 import uuid
 
 router = APIRouter()
@@ -23,7 +26,10 @@ def follow_user(user_id: uuid.UUID, db: Session = Depends(get_session), current_
 
     new_follow = Follow(follower_id=current_user.id, following_id=user_id)
     db.add(new_follow)
+    backfill_timeline(db, current_user.id, user_id)
     db.commit()
+    follow_cache.invalidate(current_user.id)
+    invalidate_personalized_feeds([current_user.id])
     db.refresh(new_follow)
     create_notification(db, user_to_follow, "follow", "New Follower!", f"{current_user.username} is now following you.", {"follower_id": str(current_user.id)})
     return {"id": str(new_follow.id), "follower_id": str(new_follow.follower_id), "following_id": str(new_follow.following_id), "status": new_follow.status, "created_at": new_follow.created_at.isoformat()}
@@ -35,7 +41,10 @@ def unfollow_user(user_id: uuid.UUID, db: Session = Depends(get_session), curren
         raise HTTPException(status_code=404, detail="You are not following this user")
 
     db.delete(follow)
+    remove_author_from_timeline(db, current_user.id, user_id)
     db.commit()
+    follow_cache.invalidate(current_user.id)
+    invalidate_personalized_feeds([current_user.id])
     return {"message": "Unfollowed user"}
 
 @router.get("/users/me/followers")
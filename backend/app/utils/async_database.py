@@ -0,0 +1,57 @@
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.utils.database import DATABASE_URL, PoolStats, TimedCheckoutMixin, pool_options, set_sqlite_pragmas
+from app.utils.metrics import register_metrics
+import os
+
+# The hot read routes can run on an async engine, so waiting on the database no longer ties up
+# one of the threadpool's threads per request. Their queries are the same sync functions the
+# rest of the app uses, run through AsyncSession.run_sync, which runs them on the event loop
+# thread: only cheap lookups belong there, so the CPU-bound feeds stay on the sync routes.
+# Only asyncpg gains from this; aiosqlite funnels every query through one thread per
+# connection and is slower than the sync driver. ASYNC_READS_ENABLED therefore defaults to on
+# for postgresql+asyncpg only, and can be set either way explicitly.
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+def async_database_url(url: str) -> str:
+    scheme, rest = url.split("://", 1)
+    return f"{ASYNC_DRIVERS.get(scheme.split('+')[0], scheme)}://{rest}"
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or async_database_url(DATABASE_URL)
+ASYNC_READS_ENABLED = os.getenv(
+    "ASYNC_READS_ENABLED", str(ASYNC_DATABASE_URL.startswith("postgresql+asyncpg://"))
+).lower() in ("1", "true", "yes")
+
+async_pool_stats = PoolStats()
+
+class TimedAsyncQueuePool(TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    stats = async_pool_stats
+
+_async_engine = None
+_async_session_factory = None
+
+def get_async_engine():
+    # Created on first use, so the async driver is only needed when async reads are enabled
+    global _async_engine, _async_session_factory
+    if _async_engine is None:
+        engine = create_async_engine(ASYNC_DATABASE_URL, **pool_options(TimedAsyncQueuePool))
+        if engine.dialect.name == "sqlite":
+            event.listen(engine.sync_engine, "connect", set_sqlite_pragmas)
+        _async_engine = engine
+        _async_session_factory = async_sessionmaker(engine, class_=AsyncSession)
+    return _async_engine
+
+async def dispose_async_engine():
+    # Pooled aiosqlite connections each run on a non-daemon thread, which would keep the
+    # process alive after shutdown if left open
+    if _async_engine is not None:
+        await _async_engine.dispose()
+
+async def get_async_session():
+    get_async_engine()
+    async with _async_session_factory() as session:
+        yield session
+
+register_metrics("async_db_pool", async_pool_stats.stats)
@@ -0,0 +1,348 @@
+from app.utils.metrics import register_metrics
+from collections import OrderedDict
+from typing import Awaitable, Callable, Iterable, List, Optional
+import asyncio
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")  # memory or redis
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "5000"))
+# How stale engagement may leave the discover, local and personalized feeds, per worker
+FEED_ENGAGEMENT_REFRESH_SECONDS = float(os.getenv("FEED_ENGAGEMENT_REFRESH_SECONDS", "5"))
+
+class InMemoryCacheBackend:
+    # Process-local LRU with per-entry expiry. Namespace generations live in a separate
+    # bounded map so LRU pressure on values can never roll a generation back.
+    blocking = False  # safe to call on the event loop
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._values = OrderedDict()  # key -> (expires_at, value)
+        self._counters = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._values[key]
+                return None
+            self._values.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: bytes, ttl: int):
+        with self._lock:
+            self._values[key] = (time.monotonic() + ttl, value)
+            self._values.move_to_end(key)
+            while len(self._values) > self.max_entries:
+                self._values.popitem(last=False)
+
+    def delete(self, *keys: str):
+        with self._lock:
+            for key in keys:
+                self._values.pop(key, None)
+
+    def get_counter(self, key: str) -> int:
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def get_counters(self, keys: List[str]) -> List[int]:
+        with self._lock:
+            return [self._counters.get(key, 0) for key in keys]
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            value = self._counters.pop(key, 0) + 1
+            self._counters[key] = value
+            if len(self._counters) > self.max_entries * 10:
+                # Forgetting a generation would resurrect old entries, so start a new epoch
+                # instead, which makes every cached value unreachable
+                epoch = self._counters.get("epoch", 0) + 1
+                self._counters.clear()
+                self._values.clear()
+                self._counters["epoch"] = epoch
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+            self._counters.clear()
+
+class RedisCacheBackend:
+    # Shared across workers; works with redis-py or any client speaking the same protocol.
+    # Fails open: while Redis is unreachable every lookup misses and responses are computed
+    # uncached, rather than the feeds failing with it.
+    blocking = True  # network round trips; async callers run them on a thread
+
+    def __init__(self, client, prefix: str = "cache:"):
+        self.client = client
+        self.prefix = prefix
+        self.errors = 0
+        self._error_logged_at = 0.0
+        self._lock = threading.Lock()
+
+    def _failed(self, e: Exception):
+        now = time.monotonic()
+        with self._lock:
+            self.errors += 1
+            if now - self._error_logged_at <= 60:
+                return
+            self._error_logged_at = now
+        logger.warning(f"Cache backend unavailable, serving uncached: {e}")
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            return self.client.get(self.prefix + key)
+        except Exception as e:
+            self._failed(e)
+            return None
+
+    def set(self, key: str, value: bytes, ttl: int):
+        try:
+            self.client.set(self.prefix + key, value, ex=ttl)
+        except Exception as e:
+            self._failed(e)
+
+    def delete(self, *keys: str):
+        if keys:
+            try:
+                self.client.delete(*(self.prefix + key for key in keys))
+            except Exception as e:
+                self._failed(e)
+
+    def get_counter(self, key: str) -> int:
+        value = self.client.get(self.prefix + key)
+        return int(value) if value is not None else 0
+
+    def get_counters(self, keys: List[str]) -> Optional[List[int]]:
+        # One round trip for all of a key's generations. None when Redis is unreachable: without
+        # the generations a key could resolve to a stale value, so the caller skips the cache.
+        try:
+            return [int(value) if value is not None else 0 for value in self.client.mget([self.prefix + key for key in keys])]
+        except Exception as e:
+            self._failed(e)
+            return None
+
+    def incr(self, key: str) -> int:
+        try:
+            return self.client.incr(self.prefix + key)
+        except Exception as e:
+            # The invalidation is lost; entries under the namespace live out their TTL
+            self._failed(e)
+            return 0
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.prefix + "*"))
+        if keys:
+            self.client.delete(*keys)
+
+class ResponseCache:
+    # Caches already-serialized responses. Keys are grouped into namespaces; invalidating a
+    # namespace bumps its generation so every key under it misses from then on, which lets
+    # write paths target exactly the feeds they affect without knowing every cursor/limit.
+    # Namespaces nest on ":", so invalidating "topic" also invalidates "topic:garden".
+    def __init__(self, backend):
+        self.backend = backend
+        self._flights = {}  # key -> [lock, waiters], for single-flight recomputation
+        self._flights_lock = threading.Lock()
+        self._async_flights = {}  # key -> future, the same for async routes
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+
+    def _key(self, namespace: str, key: str) -> Optional[str]:
+        parts = namespace.split(":")
+        scopes = [":".join(parts[:i]) for i in range(1, len(parts) + 1)]
+        generations = self.backend.get_counters(["epoch"] + [f"gen:{scope}" for scope in scopes])
+        if generations is None:
+            return None
+        return f"{namespace}:{'.'.join(map(str, generations))}:{key}"
+
+    def _count(self, stat: str):
+        with self._stats_lock:
+            setattr(self, stat, getattr(self, stat) + 1)
+
+    def get_or_compute(self, namespace: str, key: str, compute: Callable[[], bytes], ttl: int) -> bytes:
+        full_key = self._key(namespace, key)
+        if full_key is None:
+            self._count("misses")
+            return compute()
+        value = self.backend.get(full_key)
+        if value is not None:
+            self._count("hits")
+            return value
+
+        # Single flight: when a hot key expires only the first request recomputes it, the
+        # rest wait on the same lock and then read the fresh value
+        with self._flights_lock:
+            flight = self._flights.setdefault(full_key, [threading.Lock(), 0])
+            flight[1] += 1
+        try:
+            with flight[0]:
+                value = self.backend.get(full_key)
+                if value is not None:
+                    self._count("coalesced")
+                    return value
+                self._count("misses")
+                value = compute()
+                self.backend.set(full_key, value, ttl)
+                return value
+        finally:
+            with self._flights_lock:
+                flight[1] -= 1
+                if flight[1] == 0:
+                    self._flights.pop(full_key, None)
+
+    async def _call_backend(self, function, *args):
+        if self.backend.blocking:
+            return await asyncio.to_thread(function, *args)
+        return function(*args)
+
+    async def get_or_compute_async(self, namespace: str, key: str, compute: Callable[[], Awaitable[bytes]], ttl: int) -> bytes:
+        # For async routes. Waiting on a lock would block the event loop, so concurrent misses
+        # await the first request's computation instead.
+        full_key = await self._call_backend(self._key, namespace, key)
+        if full_key is None:
+            self._count("misses")
+            return await compute()
+        value = await self._call_backend(self.backend.get, full_key)
+        if value is not None:
+            self._count("hits")
+            return value
+
+        while (flight := self._async_flights.get(full_key)) is not None:
+            try:
+                value = await asyncio.shield(flight)
+            except asyncio.CancelledError:
+                if not flight.cancelled():
+                    raise  # this request was cancelled itself
+                # The first request went away: another waiter may have recomputed the value
+                # already, otherwise join its flight or take over the computation
+                value = await self._call_backend(self.backend.get, full_key)
+                if value is None:
+                    continue
+            self._count("coalesced")
+            return value
+        flight = self._async_flights[full_key] = asyncio.get_running_loop().create_future()
+        try:
+            self._count("misses")
+            value = await compute()
+            await self._call_backend(self.backend.set, full_key, value, ttl)
+            flight.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            flight.cancel()
+            raise
+        except Exception as e:
+            flight.set_exception(e)
+            flight.exception()  # waiters re-raise it; nobody else needs to see it logged
+            raise
+        finally:
+            if self._async_flights.get(full_key) is flight:
+                del self._async_flights[full_key]
+
+    def invalidate(self, *namespaces: str):
+        for namespace in namespaces:
+            self.backend.incr(f"gen:{namespace}")
+            self._count("invalidations")
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "backend": type(self.backend).__name__,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "invalidations": self.invalidations,
+                "backend_errors": getattr(self.backend, "errors", 0),
+                "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            }
+
+def create_cache_backend(kind: str = CACHE_BACKEND, prefix: str = "cache:"):
+    if kind == "redis":
+        from app.utils.redis_client import get_redis_client
+        return RedisCacheBackend(get_redis_client(), prefix)
+    return InMemoryCacheBackend()
+
+feed_cache = ResponseCache(create_cache_backend(prefix="feed:"))
+register_metrics("feed_cache", feed_cache.stats)
+search_cache = ResponseCache(create_cache_backend(prefix="search:"))
+register_metrics("search_cache", search_cache.stats)
+
+class ThrottledInvalidation:
+    # Invalidates namespaces at most once per interval. The first trigger in a quiet period
+    # invalidates right away; triggers inside the interval are folded into one more
+    # invalidation when it ends, so no change waits longer than the interval.
+    def __init__(self, cache: ResponseCache, namespaces: Iterable[str], interval: float):
+        self.cache = cache
+        self.namespaces = tuple(namespaces)
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._timer = None
+        self._pending = False
+
+    def _start_interval(self):
+        self._timer = threading.Timer(self.interval, self._interval_ended)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def trigger(self):
+        with self._lock:
+            if self._timer is not None:
+                self._pending = True
+                return
+            self._start_interval()
+        self.cache.invalidate(*self.namespaces)
+
+    def _interval_ended(self):
+        with self._lock:
+            self._timer = None
+            if not self._pending:
+                return
+            self._pending = False
+            self._start_interval()
+        self.cache.invalidate(*self.namespaces)
+
+    def clear(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = None
+            self._pending = False
+
+# Feed invalidation events, called by write paths after they commit.
+# Personalized feeds also mix in discovery and score changes that cannot be traced to
+# individual viewers; those are refreshed with the throttled engagement invalidation.
+def invalidate_ranked_feeds(terms: Optional[Iterable[str]] = None):
+    # A post was created, edited or rescored: discovery, local and topic feeds may change.
+    # Pass the post's indexed terms to only touch the topic feeds it can appear in.
+    if terms is None:
+        feed_cache.invalidate("discover", "local", "topic")
+    else:
+        feed_cache.invalidate("discover", "local", *(f"topic:{term}" for term in terms))
+
+# "feed" covers every viewer's personalized feed, since namespaces nest on ":"
+engagement_invalidation = ThrottledInvalidation(feed_cache, ("discover", "local", "feed"), FEED_ENGAGEMENT_REFRESH_SECONDS)
+
+def invalidate_engaged_post_feeds(terms: Iterable[str]):
+    # A heart or comment nudged one post's score. The topic feeds the post appears in are
+    # refreshed at once. That happens on every interaction, so the sitewide discover, local
+    # and personalized pages are refreshed at most every FEED_ENGAGEMENT_REFRESH_SECONDS
+    # instead of being rebuilt for each one.
+    feed_cache.invalidate(*(f"topic:{term}" for term in terms))
+    engagement_invalidation.trigger()
+
+def invalidate_personalized_feeds(user_ids: Iterable):
+    feed_cache.invalidate(*(f"feed:{user_id}" for user_id in user_ids))
@@ -1,12 +1,116 @@
-
 from sqlmodel import create_engine, SQLModel, Session
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+from app.utils.metrics import register_metrics
+import app.utils.search_index  # registers the full-text index DDL with the metadata
+import os
+import threading
+import time
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///test.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds; -1 keeps connections forever
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+class PoolStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, wait: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": self.total_wait * 1e3 / self.checkouts if self.checkouts else 0.0,
+                "max_wait_ms": self.max_wait * 1e3,
+            }
+
+pool_stats = PoolStats()
+
+class TimedCheckoutMixin:
+    # Times how long each checkout waits for a free connection, which is what grows when the
+    # pool is too small for the load
+    stats = pool_stats
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.stats.record(time.perf_counter() - started, timed_out=True)
+            raise
+        self.stats.record(time.perf_counter() - started)
+        return connection
+
+class TimedQueuePool(TimedCheckoutMixin, QueuePool):
+    pass
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    # WAL lets readers run alongside the writer; with it NORMAL sync is still crash safe
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+def pool_options(poolclass) -> dict:
+    return {
+        "poolclass": poolclass,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+def build_engine(url: str = DATABASE_URL):
+    options = {}
+    if url.startswith("sqlite"):
+        options["connect_args"] = {"check_same_thread": False}
+    if ":memory:" not in url and url not in ("sqlite://", "sqlite:///"):
+        # In-memory SQLite keeps one connection per thread, so pooling options do not apply
+        options.update(pool_options(TimedQueuePool))
+    engine = create_engine(url, **options)
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", set_sqlite_pragmas)
+    return engine
+
+engine = build_engine()
+# Every request session comes from here, whichever router asks for it
+SessionFactory = sessionmaker(engine, class_=Session)
+
+def pool_metrics() -> dict:
+    pool = engine.pool
+    metrics = pool_stats.stats()
+    if isinstance(pool, QueuePool):
+        metrics.update(size=pool.size(), checked_out=pool.checkedout(), overflow=pool.overflow())
+    return metrics
 
-DATABASE_URL = "sqlite:///test.db"
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+register_metrics("db_pool", pool_metrics)
 
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
 
 def get_session():
-    with Session(engine) as session:
+    with SessionFactory() as session:
         yield session
@@ -0,0 +1,96 @@
+from sqlmodel import Session, select
+from sqlalchemy import func, update
+from app.models.models import Post, Interaction, User
+from app.utils.post_scores import refresh_post_score
+from typing import Dict, Iterable
+import uuid
+
+ENGAGEMENT_TYPES = ("heart", "comment", "share")
+
+# Interaction type -> denormalized counter column on Post
+COUNTER_COLUMNS = {
+    "heart": "hearts_count",
+    "comment": "comments_count",
+    "share": "shares_count",
+}
+
+def adjust_engagement_counter(db: Session, post_id: uuid.UUID, interaction_type: str, delta: int):
+    # Single UPDATE ... SET col = col + delta so concurrent requests never lose an increment.
+    # The caller commits, which keeps the counter in the same transaction as the interaction row.
+    column = getattr(Post, COUNTER_COLUMNS[interaction_type])
+    db.exec(update(Post).where(Post.id == post_id).values({column: column + delta}))
+
+def adjust_hearts_received(db: Session, user_id: uuid.UUID, delta: int):
+    # Author-level heart total, same atomic pattern; the caller commits
+    db.exec(update(User).where(User.id == user_id).values(hearts_received=User.hearts_received + delta))
+
+def get_engagement_counts(db: Session, post_ids: Iterable[uuid.UUID]) -> Dict[uuid.UUID, Dict[str, int]]:
+    # One GROUP BY over the whole set instead of one query per post and type
+    post_ids = list(post_ids)
+    counts = {post_id: {interaction_type: 0 for interaction_type in ENGAGEMENT_TYPES} for post_id in post_ids}
+    if not post_ids:
+        return counts
+    rows = db.exec(
+        select(Interaction.post_id, Interaction.interaction_type, func.count(Interaction.id))
+        .where(Interaction.post_id.in_(post_ids), Interaction.interaction_type.in_(ENGAGEMENT_TYPES))
+        .group_by(Interaction.post_id, Interaction.interaction_type)
+    ).all()
+    for post_id, interaction_type, count in rows:
+        counts[post_id][interaction_type] = count
+    return counts
+
+def reconcile_engagement_counters(db: Session, chunk_size: int = 500) -> int:
+    # Recompute the counters from Interaction, walking the post table in primary key order
+    # and committing per chunk. Corrected posts get their stored score refreshed too.
+    # Returns the number of posts whose counters were corrected.
+    corrected = 0
+    last_id = None
+    while True:
+        query = select(Post).order_by(Post.id).limit(chunk_size)
+        if last_id is not None:
+            query = query.where(Post.id > last_id)
+        posts = db.exec(query).all()
+        if not posts:
+            break
+        counts = get_engagement_counts(db, [post.id for post in posts])
+        for post in posts:
+            changed = False
+            for interaction_type, column in COUNTER_COLUMNS.items():
+                if getattr(post, column) != counts[post.id][interaction_type]:
+                    setattr(post, column, counts[post.id][interaction_type])
+                    changed = True
+            if changed:
+                db.add(post)
+                refresh_post_score(db, post)
+                corrected += 1
+        last_id = posts[-1].id
+        db.commit()
+    return corrected
+
+def reconcile_hearts_received(db: Session, chunk_size: int = 500) -> int:
+    # Recompute User.hearts_received from the heart interactions on each user's posts, walking
+    # the user table in primary key order and committing per chunk. Backfills accounts that
+    # predate the counter. Returns the number of users corrected.
+    corrected = 0
+    last_id = None
+    while True:
+        query = select(User).order_by(User.id).limit(chunk_size)
+        if last_id is not None:
+            query = query.where(User.id > last_id)
+        users = db.exec(query).all()
+        if not users:
+            break
+        hearts = dict(db.exec(
+            select(Post.user_id, func.count(Interaction.id))
+            .join(Interaction, Interaction.post_id == Post.id)
+            .where(Post.user_id.in_([user.id for user in users]), Interaction.interaction_type == "heart")
+            .group_by(Post.user_id)
+        ).all())
+        for user in users:
+            if user.hearts_received != hearts.get(user.id, 0):
+                user.hearts_received = hearts.get(user.id, 0)
+                db.add(user)
+                corrected += 1
+        last_id = users[-1].id
+        db.commit()
+    return corrected
@@ -1,15 +1,42 @@
 from sqlmodel import Session, select
-from app.models.models import Post, User, Follow, Interaction
+from app.models.models import Post, User, PostScore, TimelineEntry, UserPreferences
+from app.utils.timeline import get_read_time_authors
+from app.utils.pagination import encode_cursor, decode_cursor
+from app.utils.follow_cache import follow_cache
+from app.utils.text_index import topic_condition
+from app.utils.geo import covering_cells, geohash_condition, within_radius
+from app.utils.score_rules import RECENCY_WINDOW, RECENCY_BONUS, FOLLOW_MULTIPLIER, _aware
+from app.utils.vector_scoring import columns_from_posts, score_vector
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from sqlalchemy import tuple_
+from typing import Callable, Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+import heapq
+import os
+import time
+import uuid
 
-def calculate_post_score(post: Post, db: Session, current_user: Optional[User] = None):
-    # Engagement scoring
-    hearts = len(db.exec(select(Interaction).where(Interaction.post_id == post.id, Interaction.interaction_type == "heart")).all())
-    comments = len(db.exec(select(Interaction).where(Interaction.post_id == post.id, Interaction.interaction_type == "comment")).all())
-    shares = len(db.exec(select(Interaction).where(Interaction.post_id == post.id, Interaction.interaction_type == "share")).all())
+FEED_PAGE_SIZE = 20
+MAX_FEED_PAGE_SIZE = 50  # as per PRD
+
+# Candidate generation: each source only looks this far back and contributes at most its
+# budget of rows per page, so feed cost is bounded no matter how large the post table grows
+FOLLOWED_WINDOW = timedelta(days=int(os.getenv("FEED_FOLLOWED_WINDOW_DAYS", "14")))
+DISCOVERY_WINDOW = timedelta(days=int(os.getenv("FEED_DISCOVERY_WINDOW_DAYS", "7")))
+TOPIC_WINDOW = timedelta(days=int(os.getenv("FEED_TOPIC_WINDOW_DAYS", "30")))
+FOLLOWED_BUDGET = int(os.getenv("FEED_FOLLOWED_BUDGET", "200"))
+DISCOVERY_BUDGET = int(os.getenv("FEED_DISCOVERY_BUDGET", "100"))
+TOPIC_BUDGET = int(os.getenv("FEED_TOPIC_BUDGET", "100"))
+LOCAL_WINDOW = timedelta(days=int(os.getenv("FEED_LOCAL_WINDOW_DAYS", "30")))
+LOCAL_BUDGET = int(os.getenv("FEED_LOCAL_BUDGET", "200"))
+MAX_INTEREST_TOPICS = 5
+
+def get_following_ids(db: Session, user: User) -> FrozenSet[uuid.UUID]:
+    # Served from the follow cache, so relationship checks across a feed are set lookups
+    return follow_cache.get(db, user.id)
 
-    score = (hearts * 1.0) + (comments * 2.0) + (shares * 3.0) + \
+def compute_base_score(post: Post) -> float:
+    # Engagement scoring, read from the denormalized counters on Post
+    score = (post.hearts_count * 1.0) + (post.comments_count * 2.0) + (post.shares_count * 3.0) + \
             (post.completion_rate * 1.5) - (post.reports * 10.0)
 
     # Content Hierarchy Rules
@@ -21,67 +48,151 @@ def calculate_post_score(post: Post, db: Session, current_user: Optional[User] =
     elif post.post_type == "simple_text":
         score *= 0.5  # Spontaneous Text posts receive 0.5x visibility modifier
 
+    return score
+
+def recency_bonus(created_at: datetime, now: Optional[datetime] = None) -> float:
     # Recency bonus (posts in the last 24 hours get a bonus)
-    # Ensure post.created_at is timezone-aware for comparison
-    post_created_at_aware = post.created_at.replace(tzinfo=timezone.utc) if post.created_at.tzinfo is None else post.created_at
-    if post_created_at_aware > datetime.now(timezone.utc) - timedelta(days=1):
-        score += 1.0
+    now = now or datetime.now(timezone.utc)
+    return RECENCY_BONUS if _aware(created_at) > now - RECENCY_WINDOW else 0.0
 
+def apply_relationship_multiplier(score: float, is_followed: bool) -> float:
     # Relationship Multiplier
-    if current_user:
-        is_followed = db.exec(select(Follow).where(Follow.follower_id == current_user.id, Follow.following_id == post.user_id)).first()
-        if is_followed:
-            score *= 1.5  # Boost for followed users
+    return score * FOLLOW_MULTIPLIER if is_followed else score  # Boost for followed users
 
-    return score
+def _score(post: Post, is_followed: bool = False, now: Optional[datetime] = None) -> float:
+    # Scalar reference implementation of the full formula; vector_scoring must match it exactly
+    return apply_relationship_multiplier(compute_base_score(post) + recency_bonus(post.created_at, now), is_followed)
+
+def score_posts(posts: List[Post], db: Session, current_user: Optional[User] = None) -> List[Tuple[Post, float]]:
+    # Batch scoring path: engagement comes from the counters on Post, so the only query is a
+    # single follow-graph lookup, and the formula runs once over columnar NumPy arrays
+    following_ids = get_following_ids(db, current_user) if current_user else frozenset()
+    scores = score_vector(columns_from_posts(posts), following_ids)
+    return [(post, float(score)) for post, score in zip(posts, scores)]
+
+def calculate_post_score(post: Post, db: Session, current_user: Optional[User] = None):
+    return score_posts([post], db, current_user)[0][1]
+
+class FeedPage(NamedTuple):
+    posts: List[Post]
+    next_cursor: Optional[str]
+    timings: Dict[str, float]  # milliseconds per pipeline stage, plus the candidate count
+
+class CandidateSource(NamedTuple):
+    name: str
+    conditions: tuple
+    budget: int
+    window: timedelta
+    multiplier: float = 1.0  # relationship multiplier applied to every row of the source
+    timeline_of: Optional[uuid.UUID] = None
+    row_filter: Optional[Callable[[Post], bool]] = None  # exact check for rows the SQL conditions over-select
+
+def _key(row):
+    post, score = row
+    return (score, _aware(post.created_at), post.id)
+
+def _fetch_source(db: Session, source: CandidateSource, fetch_size: int, after, now: datetime):
+    # One bounded read off the PostScore rank index. Keyset pagination: only rows strictly
+    # after the cursor's (score, created_at, id) are read.
+    score = PostScore.score * source.multiplier if source.multiplier != 1.0 else PostScore.score
+    query = select(Post, score).join(PostScore, PostScore.post_id == Post.id)
+    if source.timeline_of is not None:
+        query = query.join(TimelineEntry, (TimelineEntry.post_id == Post.id) & (TimelineEntry.user_id == source.timeline_of))
+    if after is not None:
+        query = query.where(tuple_(score, PostScore.created_at, PostScore.post_id) < tuple_(*after))
+    query = query.where(PostScore.created_at >= now - source.window, *source.conditions) \
+        .order_by(PostScore.score.desc(), PostScore.created_at.desc(), PostScore.post_id.desc())
+    return db.exec(query.limit(fetch_size)).all()
+
+def generate_candidates(db: Session, sources: List[CandidateSource], limit: int, after=None):
+    # Stage one: every source returns its best rows past the cursor, capped at its budget
+    now = datetime.now(timezone.utc)
+    candidates = []
+    for source in sources:
+        # Filtered sources read their whole budget, since the filter thins them out
+        fetch_size = source.budget if source.row_filter is not None else min(source.budget, limit + 1)
+        rows = _fetch_source(db, source, fetch_size, after, now)
+        # A source that hit its budget may hold more rows below its last fetched one; that
+        # row's key is the source's floor, whether or not the row filter keeps it
+        floor = _key(rows[-1]) if len(rows) == fetch_size else None
+        if source.row_filter is not None:
+            rows = [row for row in rows if source.row_filter(row[0])]
+        candidates.append((rows, floor))
+    return candidates
+
+def rank_candidates(candidates, limit: int) -> Tuple[List[Post], Optional[str]]:
+    # Stage two: top-K heap selection over the bounded candidate set. A post found by
+    # several sources is ranked once.
+    unique = {}
+    for rows, floor in candidates:
+        for row in rows:
+            unique[row[0].id] = row
+    top = heapq.nlargest(limit + 1, unique.values(), key=_key)
+
+    # A source that hit its budget may hold more rows just below its floor, so the page
+    # must stop there or the next cursor would skip them
+    floors = [floor for rows, floor in candidates if floor is not None]
+    has_more = len(top) > limit or bool(floors)
+    if floors:
+        floor = max(floors)
+        top = [row for row in top if _key(row) >= floor]
+    page = top[:limit]
+
+    next_cursor = None
+    if has_more and page:
+        post, score = page[-1]
+        next_cursor = encode_cursor(score, post.created_at, post.id)
+    elif has_more:
+        # Every fetched row was filtered out; carry on from the floor
+        next_cursor = encode_cursor(*max(floors))
+    return [post for post, score in page], next_cursor
+
+def run_feed_pipeline(db: Session, sources: List[CandidateSource], limit: int, cursor: Optional[str]) -> FeedPage:
+    after = decode_cursor(cursor) if cursor else None
+    started = time.perf_counter()
+    candidates = generate_candidates(db, sources, limit, after)
+    generated = time.perf_counter()
+    posts, next_cursor = rank_candidates(candidates, limit)
+    ranked = time.perf_counter()
+    timings = {
+        "candidates": (generated - started) * 1000,
+        "rank": (ranked - generated) * 1000,
+        "candidate_count": sum(len(rows) for rows, floor in candidates),
+    }
+    return FeedPage(posts, next_cursor, timings)
+
+def get_personalized_feed(db: Session, current_user: User, limit: int = FEED_PAGE_SIZE, cursor: Optional[str] = None) -> FeedPage:
+    following_ids = get_following_ids(db, current_user)
+    read_time_authors = get_read_time_authors(db, following_ids, datetime.now(timezone.utc) - FOLLOWED_WINDOW)
+    not_followed = PostScore.user_id.not_in(following_ids)
+
+    # Followed content is the materialized home timeline plus, read on demand, the posts
+    # followed accounts were too popular to fan out on write, both boosted by the relationship
+    # multiplier. Scaling a source by a constant keeps its order, so each one is still read
+    # straight off the index. Discovery and interest sources skip followed authors so every
+    # post has exactly one effective score.
+    sources = [
+        CandidateSource("follows", (), FOLLOWED_BUDGET, FOLLOWED_WINDOW, FOLLOW_MULTIPLIER, timeline_of=current_user.id),
+        CandidateSource("discovery", (not_followed,), DISCOVERY_BUDGET, DISCOVERY_WINDOW),
+    ]
+    if read_time_authors:
+        sources.append(CandidateSource("popular_follows", (PostScore.user_id.in_(read_time_authors), Post.fanned_out == False), FOLLOWED_BUDGET, FOLLOWED_WINDOW, FOLLOW_MULTIPLIER))
+    interests = db.exec(select(UserPreferences.interests).where(UserPreferences.user_id == current_user.id)).first()
+    if interests:
+        sources.append(CandidateSource("interests", (not_followed, topic_condition(PostScore.post_id, interests[:MAX_INTEREST_TOPICS])), TOPIC_BUDGET, TOPIC_WINDOW))
+    return run_feed_pipeline(db, sources, limit, cursor)
+
+def get_discovery_feed(db: Session, limit: int = FEED_PAGE_SIZE, cursor: Optional[str] = None) -> FeedPage:
+    return run_feed_pipeline(db, [CandidateSource("discovery", (), DISCOVERY_BUDGET, DISCOVERY_WINDOW)], limit, cursor)
+
+def get_topic_feed(db: Session, topic: str, limit: int = FEED_PAGE_SIZE, cursor: Optional[str] = None) -> FeedPage:
+    return run_feed_pipeline(db, [CandidateSource("topic", (topic_condition(PostScore.post_id, [topic]),), TOPIC_BUDGET, TOPIC_WINDOW)], limit, cursor)
 
-def get_personalized_feed(db: Session, current_user: User):
-    following_ids = [f.following_id for f in db.exec(select(Follow).where(Follow.follower_id == current_user.id)).all()]
-    
-    # Include posts from followed users and a general pool for discovery
-    posts_from_followed = db.exec(select(Post).where(Post.user_id.in_(following_ids))).all()
-    
-    # For discovery, get some popular posts not from followed users
-    all_posts = db.exec(select(Post)).all()
-    discovery_posts = [p for p in all_posts if p.user_id not in following_ids]
-
-    # Combine and score posts
-    scored_posts = []
-    for post in posts_from_followed:
-        score = calculate_post_score(post, db, current_user)
-        scored_posts.append((post, score))
-    
-    for post in discovery_posts:
-        score = calculate_post_score(post, db, current_user)
-        scored_posts.append((post, score))
-
-    # Sort by score (descending) and then by creation date (descending) for tie-breaking
-    sorted_posts = sorted(scored_posts, key=lambda x: (x[1], x[0].created_at), reverse=True)
-    
-    # Return only the post objects
-    return [post for post, score in sorted_posts]
-
-def get_discovery_feed(db: Session):
-    # Get all posts and score them for discovery
-    all_posts = db.exec(select(Post)).all()
-    scored_posts = []
-    for post in all_posts:
-        score = calculate_post_score(post, db)
-        scored_posts.append((post, score))
-
-    # Sort by score (descending) and then by creation date (descending)
-    sorted_posts = sorted(scored_posts, key=lambda x: (x[1], x[0].created_at), reverse=True)
-    
-    # Return only the post objects, limit to 50 as per PRD
-    return [post for post, score in sorted_posts][:50]
-
-def get_topic_feed(db: Session, topic: str):
-    # Basic topic feed: search for topic in post content
-    posts = db.exec(select(Post).where(Post.content.contains(topic))).all()
-    scored_posts = []
-    for post in posts:
-        score = calculate_post_score(post, db)
-        scored_posts.append((post, score))
-    
-    sorted_posts = sorted(scored_posts, key=lambda x: (x[1], x[0].created_at), reverse=True)
-    return [post for post, score in sorted_posts]
+def get_local_feed(db: Session, lat: float, lng: float, radius_km: float, limit: int = FEED_PAGE_SIZE, cursor: Optional[str] = None) -> FeedPage:
+    # Range scans over the geohash index cover the circle's cells; the exact distance check
+    # drops the corners.
+    source = CandidateSource(
+        "local", (geohash_condition(covering_cells(lat, lng, radius_km)),), LOCAL_BUDGET, LOCAL_WINDOW,
+        row_filter=within_radius(lat, lng, radius_km),
+    )
+    return run_feed_pipeline(db, [source], limit, cursor)
@@ -0,0 +1,76 @@
+from sqlmodel import Session, select
+from app.models.models import Follow
+from app.utils.metrics import register_metrics
+from collections import OrderedDict
+from typing import FrozenSet
+import os
+import threading
+import time
+import uuid
+
+FOLLOW_CACHE_MAX_USERS = int(os.getenv("FOLLOW_CACHE_MAX_USERS", "10000"))
+FOLLOW_CACHE_TTL_SECONDS = int(os.getenv("FOLLOW_CACHE_TTL_SECONDS", "300"))
+
+class FollowCache:
+    # Per-user following sets in a bounded LRU with a TTL. follow_user/unfollow_user invalidate
+    # explicitly; the TTL only bounds staleness from writes that bypass them.
+    def __init__(self, max_users: int = FOLLOW_CACHE_MAX_USERS, ttl: int = FOLLOW_CACHE_TTL_SECONDS):
+        self.max_users = max_users
+        self.ttl = ttl
+        self._entries = OrderedDict()  # user_id -> (expires_at, following_ids)
+        self._generations = {}  # user_id -> invalidation count, guards against storing a stale load
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, db: Session, user_id: uuid.UUID) -> FrozenSet[uuid.UUID]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generations.get(user_id, 0)
+
+        following_ids = frozenset(db.exec(select(Follow.following_id).where(Follow.follower_id == user_id)).all())
+
+        with self._lock:
+            # Skip the store if a follow/unfollow landed while we were querying
+            if self._generations.get(user_id, 0) == generation:
+                self._entries[user_id] = (now + self.ttl, following_ids)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_users:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return following_ids
+
+    def invalidate(self, user_id: uuid.UUID):
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            if len(self._generations) > self.max_users:
+                # Only in-flight loads need the counter; drop the oldest ones
+                for stale_id in list(self._generations)[: len(self._generations) - self.max_users]:
+                    del self._generations[stale_id]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+follow_cache = FollowCache()
+register_metrics("follow_cache", follow_cache.stats)
@@ -0,0 +1,132 @@
+from fastapi import HTTPException
+from sqlmodel import Session, select
+from sqlalchemy import and_, or_
+from app.models.models import Post
+from typing import List, Optional, Set, Tuple
+import math
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+# Stored precision, about 5m x 5m; radius queries match shorter prefixes of it
+GEOHASH_PRECISION = 9
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+def encode_geohash(lat: float, lng: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    geohash = []
+    bit, char, even = 0, 0, True
+    while len(geohash) < precision:
+        # Bits alternate between longitude and latitude, starting with longitude
+        value, bounds = (lng, lng_range) if even else (lat, lat_range)
+        mid = (bounds[0] + bounds[1]) / 2
+        if value >= mid:
+            char = (char << 1) | 1
+            bounds[0] = mid
+        else:
+            char <<= 1
+            bounds[1] = mid
+        even = not even
+        bit += 1
+        if bit == 5:
+            geohash.append(GEOHASH_ALPHABET[char])
+            bit, char = 0, 0
+    return "".join(geohash)
+
+def cell_size_degrees(precision: int) -> Tuple[float, float]:
+    # (height, width) of a cell in degrees
+    bits = 5 * precision
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** ((bits + 1) // 2)
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi, d_lambda = phi2 - phi1, math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+def location_point(location_data: Optional[dict]) -> Optional[Tuple[float, float]]:
+    # Coordinates from a post's location_data; None when it carries no coordinates
+    if not location_data:
+        return None
+    lat = location_data.get("lat", location_data.get("latitude"))
+    lng = location_data.get("lng", location_data.get("lon", location_data.get("longitude")))
+    if lat is None or lng is None:
+        return None
+    try:
+        lat, lng = float(lat), float(lng)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid location coordinates")
+    if not (-90.0 <= lat <= 90.0 and -180.0 <= lng <= 180.0):
+        raise HTTPException(status_code=400, detail="Invalid location coordinates")
+    return lat, lng
+
+def geohash_for_location(location_data: Optional[dict]) -> Optional[str]:
+    point = location_point(location_data)
+    return encode_geohash(*point) if point else None
+
+def covering_cells(lat: float, lng: float, radius_km: float) -> List[str]:
+    # The smallest cells at least as large as the radius, so the circle's bounding box is
+    # covered by the cell holding the centre and its neighbours (at most 3x3 of them)
+    lat_radius = radius_km / KM_PER_DEGREE
+    lng_radius = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+    precision = GEOHASH_PRECISION
+    while precision > 1:
+        height, width = cell_size_degrees(precision)
+        if height >= lat_radius and width >= lng_radius:
+            break
+        precision -= 1
+    if lng_radius >= 180.0 or abs(lat) + lat_radius >= 90.0:
+        # Near the poles the box wraps the whole globe, and once the circle reaches a pole it
+        # also takes in every longitude on the far side: cover the whole band
+        return sorted({encode_geohash(max(-90.0, min(90.0, lat + d)), l, 1) for d in (-lat_radius, lat_radius) for l in range(-180, 180, 45)})
+
+    height, width = cell_size_degrees(precision)
+    cells: Set[str] = set()
+    south, north = max(-90.0, lat - lat_radius), min(90.0, lat + lat_radius)
+    cell_lat = south
+    while True:
+        cell_lng = lng - lng_radius
+        while True:
+            wrapped = (cell_lng + 180.0) % 360.0 - 180.0
+            cells.add(encode_geohash(cell_lat, wrapped, precision))
+            if cell_lng >= lng + lng_radius:
+                break
+            cell_lng = min(cell_lng + width, lng + lng_radius)
+        if cell_lat >= north:
+            break
+        cell_lat = min(cell_lat + height, north)
+    return sorted(cells)
+
+def geohash_condition(cells: List[str]):
+    # Each cell is a prefix, i.e. a contiguous range of the geohash index
+    return or_(*(and_(Post.geohash >= cell, Post.geohash < cell + "~") for cell in cells))
+
+def within_radius(lat: float, lng: float, radius_km: float):
+    # Exact filter for candidates read from the covering cells
+    def keep(post: Post) -> bool:
+        point = location_point(post.location_data)
+        return point is not None and haversine_km(lat, lng, *point) <= radius_km
+    return keep
+
+def backfill_geohashes(db: Session, chunk_size: int = 500) -> int:
+    # Derive the geohash column for posts written before it existed, in primary key order
+    updated = 0
+    last_id = None
+    while True:
+        query = select(Post).order_by(Post.id).limit(chunk_size)
+        if last_id is not None:
+            query = query.where(Post.id > last_id)
+        posts = db.exec(query).all()
+        if not posts:
+            break
+        for post in posts:
+            try:
+                geohash = geohash_for_location(post.location_data)
+            except HTTPException:
+                geohash = None
+            if post.geohash != geohash:
+                post.geohash = geohash
+                db.add(post)
+                updated += 1
+        last_id = posts[-1].id
+        db.commit()
+    return updated
@@ -4,8 +4,11 @@ from pydantic import BaseModel
 from fastapi import Depends, HTTPException, Request
 from fastapi.security import OAuth2PasswordBearer
 from sqlmodel import Session, select
+from typing import Optional
 from app.models.models import User
 from app.utils.database import get_session
+from app.utils.principal_cache import principal_cache
+from app.utils.token_cache import token_cache
 
 SECRET_KEY = "your-secret-key"  # Replace with a real secret key
 ALGORITHM = "HS256"
@@ -32,6 +35,11 @@ def create_refresh_token(data: dict):
     return encoded_jwt
 
 def verify_token(token: str, credentials_exception):
+    # Tokens are reused for many requests, so verified ones are memoized until they expire
+    digest = token_cache.digest(token)
+    email = token_cache.get(digest)
+    if email is not None:
+        return TokenData(email=email)
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
@@ -40,20 +48,46 @@ def verify_token(token: str, credentials_exception):
         token_data = TokenData(email=email)
     except JWTError:
         raise credentials_exception
+    if isinstance(payload.get("exp"), (int, float)):
+        token_cache.set(digest, email, payload["exp"])
     return token_data
 
-async def get_current_user(request: Request, db: Session = Depends(get_session)):
-    credentials_exception = HTTPException(
+def credentials_exception():
+    return HTTPException(
         status_code=401,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    token = request.headers.get("Authorization")
-    if not token:
-        raise credentials_exception
-    token = token.replace("Bearer ", "")
-    token_data = verify_token(token, credentials_exception)
-    user = db.exec(select(User).where(User.email == token_data.email)).first()
-    if user is None:
-        raise credentials_exception
-    return user
\ No newline at end of file
+
+# Authentication is resolved at most once per request and kept on request.state, shared by
+# AuthMiddleware and every get_current_user dependency. Decoding the token needs no database;
+# the user is only resolved when a route actually asks for it, usually from principal_cache.
+
+def get_token_subject(request: Request) -> Optional[str]:
+    # The token's subject, or None when the header is missing or the token is invalid
+    if not hasattr(request.state, "token_subject"):
+        request.state.token_subject = None
+        token = request.headers.get("Authorization")
+        if token:
+            try:
+                request.state.token_subject = verify_token(token.replace("Bearer ", ""), credentials_exception()).email
+            except HTTPException:
+                pass
+    return request.state.token_subject
+
+def resolve_current_user(request: Request, db: Session) -> User:
+    user = getattr(request.state, "user", None)
+    if user is not None:
+        return user
+    subject = get_token_subject(request)
+    if subject is None:
+        raise credentials_exception()
+    user = principal_cache.get(db, subject)
+    if user is None or user.deleted_at is not None:
+        raise credentials_exception()
+    request.state.user = user
+    return user
+
+def get_current_user(request: Request, db: Session = Depends(get_session)):
+    # Sync, so the lookup and the principal cache's shared generation check run on the threadpool
+    return resolve_current_user(request, db)
\ No newline at end of file
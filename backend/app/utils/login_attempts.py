@@ -0,0 +1,207 @@
+from app.utils.metrics import register_metrics
+from collections import OrderedDict
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+LOGIN_ATTEMPT_BACKEND = os.getenv("LOGIN_ATTEMPT_BACKEND", "memory")  # memory, sqlite or redis
+LOGIN_ATTEMPT_MAX_KEYS = int(os.getenv("LOGIN_ATTEMPT_MAX_KEYS", "100000"))
+LOGIN_ATTEMPT_SQLITE_PATH = os.getenv("LOGIN_ATTEMPT_SQLITE_PATH", "login_attempts.db")
+
+# Failed login counters per email. A counter expires `timeout` seconds after its most recent
+# failure, so an account stays locked while failures keep coming and unlocks once they stop.
+# Every backend has the same four methods; record_failure returns the updated count.
+
+class InMemoryLoginAttemptStore:
+    # Process-local. Every failure refreshes the expiry by the same timeout, so keeping keys
+    # in write order also keeps them in expiry order: expired keys are always at the front
+    # and are dropped as new failures come in. Past max_keys every expired counter is swept
+    # first (at most once a second, in case callers mix timeouts) and only then do the
+    # oldest live counters go.
+    FULL_SWEEP_INTERVAL = 1.0
+
+    def __init__(self, max_keys: int = LOGIN_ATTEMPT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._attempts = OrderedDict()  # key -> (count, expires_at)
+        self._lock = threading.Lock()
+        self._swept_at = float("-inf")
+        self.expirations = 0
+        self.evictions = 0
+
+    def _expire(self, now: float):
+        while self._attempts:
+            key, (count, expires_at) = next(iter(self._attempts.items()))
+            if expires_at > now:
+                break
+            del self._attempts[key]
+            self.expirations += 1
+
+    def _expire_all(self, now: float):
+        if now - self._swept_at < self.FULL_SWEEP_INTERVAL:
+            return
+        self._swept_at = now
+        expired = [key for key, (count, expires_at) in self._attempts.items() if expires_at <= now]
+        for key in expired:
+            del self._attempts[key]
+        self.expirations += len(expired)
+
+    def failures(self, key: str) -> int:
+        with self._lock:
+            entry = self._attempts.get(key)
+            return entry[0] if entry and entry[1] > time.monotonic() else 0
+
+    def record_failure(self, key: str, timeout: int) -> int:
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            entry = self._attempts.pop(key, None)
+            count = entry[0] + 1 if entry else 1
+            self._attempts[key] = (count, now + timeout)
+            if len(self._attempts) > self.max_keys:
+                self._expire_all(now)
+            while len(self._attempts) > self.max_keys:
+                self._attempts.popitem(last=False)
+                self.evictions += 1
+            return count
+
+    def reset(self, key: str):
+        with self._lock:
+            self._attempts.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._attempts.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"backend": "memory", "size": len(self._attempts), "expirations": self.expirations, "evictions": self.evictions}
+
+class SqliteLoginAttemptStore:
+    # Shared by every worker on one host through a small SQLite file, separate from the main
+    # database so it works whatever that runs on. Expired rows are swept every SWEEP_INTERVAL
+    # writes, which is also when the table is trimmed back to max_keys.
+    SWEEP_INTERVAL = 1000
+
+    def __init__(self, path: str = LOGIN_ATTEMPT_SQLITE_PATH, max_keys: int = LOGIN_ATTEMPT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._connection = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS login_attempt (key TEXT PRIMARY KEY, count INTEGER NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS ix_login_attempt_expires_at ON login_attempt (expires_at)")
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def failures(self, key: str) -> int:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT count FROM login_attempt WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return row[0] if row else 0
+
+    def record_failure(self, key: str, timeout: int) -> int:
+        now = time.time()
+        with self._lock:
+            # A single statement, so concurrent workers cannot lose each other's increments
+            row = self._connection.execute(
+                "INSERT INTO login_attempt (key, count, expires_at) VALUES (?, 1, ?) "
+                "ON CONFLICT (key) DO UPDATE SET count = CASE WHEN expires_at > ? THEN count + 1 ELSE 1 END, "
+                "expires_at = excluded.expires_at RETURNING count",
+                (key, now + timeout, now),
+            ).fetchone()
+            self._writes += 1
+            if self._writes % self.SWEEP_INTERVAL == 0:
+                self._sweep(now)
+        return row[0]
+
+    def _sweep(self, now: float):
+        self._connection.execute("DELETE FROM login_attempt WHERE expires_at <= ?", (now,))
+        self._connection.execute(
+            "DELETE FROM login_attempt WHERE key IN (SELECT key FROM login_attempt ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_keys,),
+        )
+
+    def reset(self, key: str):
+        with self._lock:
+            self._connection.execute("DELETE FROM login_attempt WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._lock:
+            self._connection.execute("DELETE FROM login_attempt")
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = self._connection.execute("SELECT COUNT(*) FROM login_attempt").fetchone()[0]
+        return {"backend": "sqlite", "size": size}
+
+class RedisLoginAttemptStore:
+    # Shared across hosts. Redis expires the keys itself; its maxmemory policy is the bound.
+    # Fails open like the cache and rate limiter: while Redis is unreachable no account counts
+    # as locked and failures go uncounted, so logins keep working behind the rate limiter and
+    # the cost of bcrypt, rather than every login and signup failing with Redis.
+    def __init__(self, client, prefix: str = "login_attempt:"):
+        self.client = client
+        self.prefix = prefix
+        self.errors = 0
+        self._error_logged_at = 0.0
+        self._lock = threading.Lock()
+
+    def _failed(self, e: Exception):
+        now = time.monotonic()
+        with self._lock:
+            self.errors += 1
+            if now - self._error_logged_at <= 60:
+                return
+            self._error_logged_at = now
+        logger.warning(f"Login attempt store unavailable, lockouts not enforced: {e}")
+
+    def failures(self, key: str) -> int:
+        try:
+            value = self.client.get(self.prefix + key)
+        except Exception as e:
+            self._failed(e)
+            return 0
+        return int(value) if value is not None else 0
+
+    def record_failure(self, key: str, timeout: int) -> int:
+        # INCR and EXPIRE in one round trip
+        try:
+            pipeline = self.client.pipeline()
+            pipeline.incr(self.prefix + key)
+            pipeline.expire(self.prefix + key, timeout)
+            count, _ = pipeline.execute()
+        except Exception as e:
+            self._failed(e)
+            return 0
+        return count
+
+    def reset(self, key: str):
+        try:
+            self.client.delete(self.prefix + key)
+        except Exception as e:
+            self._failed(e)
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.prefix + "*"))
+        if keys:
+            self.client.delete(*keys)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"backend": "redis", "errors": self.errors}
+
+def create_login_attempt_store(kind: str = LOGIN_ATTEMPT_BACKEND):
+    if kind == "redis":
+        from app.utils.redis_client import get_redis_client
+        return RedisLoginAttemptStore(get_redis_client())
+    if kind == "sqlite":
+        return SqliteLoginAttemptStore()
+    return InMemoryLoginAttemptStore()
+
+login_attempts = create_login_attempt_store()
+register_metrics("login_attempts", login_attempts.stats)
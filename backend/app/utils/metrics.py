@@ -0,0 +1,10 @@
+from typing import Callable, Dict
+
+# Components register a callable returning a dict of counters; GET /metrics collects them all
+_providers: Dict[str, Callable[[], dict]] = {}
+
+def register_metrics(name: str, provider: Callable[[], dict]):
+    _providers[name] = provider
+
+def collect_metrics() -> dict:
+    return {name: provider() for name, provider in _providers.items()}
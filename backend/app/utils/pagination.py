@@ -0,0 +1,29 @@
+from fastapi import HTTPException, Response
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+import base64
+import json
+import uuid
+
+# Paginated list endpoints keep returning a plain JSON list; the cursor for the
+# next page travels in this header and is absent on the last page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(score: float, created_at: datetime, post_id: uuid.UUID) -> str:
+    # Timestamps are stored as naive UTC, so the cursor carries them the same way
+    if created_at.tzinfo is not None:
+        created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+    payload = json.dumps([score, created_at.isoformat(), str(post_id)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[float, datetime, uuid.UUID]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        score, created_at, post_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return float(score), datetime.fromisoformat(created_at), uuid.UUID(post_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]):
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
@@ -0,0 +1,81 @@
+from sqlmodel import Session, select
+from sqlalchemy import update
+from app.models.models import Post, PostScore
+from app.utils.feed_algorithm import compute_base_score, recency_bonus
+from app.utils.score_rules import RECENCY_WINDOW
+from app.utils.vector_scoring import base_score_vector, columns_from_posts
+from app.utils.cache import invalidate_ranked_feeds
+from datetime import datetime, timezone
+from typing import Optional
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# How often the background worker drops the recency bonus from posts that aged out of the window
+SCORE_REFRESH_INTERVAL_SECONDS = int(os.getenv("SCORE_REFRESH_INTERVAL_SECONDS", "300"))
+
+def refresh_post_score(db: Session, post: Post, base_score: Optional[float] = None) -> PostScore:
+    # Recompute the stored score for one post. Call this whenever something that feeds the
+    # formula changes (interactions, reports, image, post type); the caller commits.
+    now = datetime.now(timezone.utc)
+    if base_score is None:
+        base_score = compute_base_score(post)
+    post_score = db.get(PostScore, post.id)
+    if post_score is None:
+        post_score = PostScore(post_id=post.id, user_id=post.user_id, created_at=post.created_at)
+    post_score.base_score = base_score
+    post_score.score = base_score + recency_bonus(post.created_at, now)
+    post_score.computed_at = now
+    db.add(post_score)
+    return post_score
+
+def rebuild_post_scores(db: Session, chunk_size: int = 500) -> int:
+    # Recompute every stored score, walking the post table in primary key order
+    rebuilt = 0
+    last_id = None
+    while True:
+        query = select(Post).order_by(Post.id).limit(chunk_size)
+        if last_id is not None:
+            query = query.where(Post.id > last_id)
+        posts = db.exec(query).all()
+        if not posts:
+            break
+        # Score the whole chunk in one vectorized pass
+        base_scores = base_score_vector(columns_from_posts(posts))
+        for post, base_score in zip(posts, base_scores):
+            refresh_post_score(db, post, float(base_score))
+        rebuilt += len(posts)
+        last_id = posts[-1].id
+        db.commit()
+    return rebuilt
+
+def refresh_recency_scores(db: Session, now: Optional[datetime] = None) -> int:
+    # The recency bonus is the only time-dependent part of the score; once a post leaves the
+    # window its score falls back to base_score. One indexed UPDATE covers all of them.
+    now = now or datetime.now(timezone.utc)
+    result = db.exec(
+        update(PostScore)
+        .where(PostScore.created_at <= now - RECENCY_WINDOW, PostScore.score != PostScore.base_score)
+        .values(score=PostScore.base_score, computed_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount
+
+async def run_score_worker(engine, interval: int = SCORE_REFRESH_INTERVAL_SECONDS):
+    # Started from the app lifespan; cancelled on shutdown
+    def refresh_once():
+        with Session(engine) as session:
+            return refresh_recency_scores(session)
+
+    while True:
+        try:
+            refreshed = await asyncio.to_thread(refresh_once)
+            if refreshed:
+                invalidate_ranked_feeds()
+                logger.info(f"Recency refresh updated {refreshed} post scores.")
+        except Exception as e:
+            logger.error(f"Error refreshing post scores: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,99 @@
+from sqlmodel import Session, select
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+from app.models.models import User
+from app.utils.cache import create_cache_backend
+from app.utils.metrics import register_metrics
+from collections import OrderedDict
+from typing import Optional
+import os
+import threading
+import time
+
+PRINCIPAL_CACHE_MAX_USERS = int(os.getenv("PRINCIPAL_CACHE_MAX_USERS", "10000"))
+# Also bounds how stale denormalized counters like hearts_received can be on /profiles/me
+PRINCIPAL_CACHE_TTL_SECONDS = int(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+
+USER_COLUMNS = [attribute.key for attribute in inspect(User).column_attrs]
+
+class PrincipalCache:
+    # Authenticated users by token subject, so most requests skip the User lookup. Entries are
+    # column snapshots rather than instances, since an instance belongs to the session that
+    # loaded it; a hit is attached to the request's session with merge(load=False), which
+    # does not query. Profile, password, verification and deletion writes invalidate explicitly.
+    # Invalidation bumps a per-subject generation in the cache backend, which every worker
+    # shares when CACHE_BACKEND=redis: a hit is only used while the generation it was loaded
+    # under is current, so a deleted account is turned away by every worker at once. That is
+    # one counter read per hit; with the memory backend it never leaves the process.
+    def __init__(self, max_users: int = PRINCIPAL_CACHE_MAX_USERS, ttl: int = PRINCIPAL_CACHE_TTL_SECONDS, backend=None):
+        self.max_users = max_users
+        self.ttl = ttl
+        self.backend = backend if backend is not None else create_cache_backend(prefix="principal:")
+        self._entries = OrderedDict()  # subject -> (expires_at, generation, column values)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _generation(self, subject: str) -> Optional[tuple]:
+        # None when the shared counters are unreachable; nothing is served from or stored in
+        # the cache then, since an invalidation could have been missed
+        counters = self.backend.get_counters(["epoch", f"gen:{subject}"])
+        return tuple(counters) if counters is not None else None
+
+    def get(self, db: Session, subject: str) -> Optional[User]:
+        now = time.monotonic()
+        generation = self._generation(subject)
+        with self._lock:
+            entry = self._entries.get(subject)
+            if entry and entry[0] > now and generation is not None and entry[1] == generation:
+                self._entries.move_to_end(subject)
+                self.hits += 1
+                values = entry[2]
+            else:
+                values = None
+                self.misses += 1
+
+        if values is not None:
+            user = User(**values)
+            make_transient_to_detached(user)
+            return db.merge(user, load=False)
+
+        user = db.exec(select(User).where(User.email == subject)).first()
+        if user is None or user.deleted_at is not None or generation is None:
+            return user
+
+        with self._lock:
+            # Stored under the generation read before the query: if the user was changed while
+            # we were querying, the generation has moved on and the entry is never used
+            self._entries[subject] = (now + self.ttl, generation, {column: getattr(user, column) for column in USER_COLUMNS})
+            self._entries.move_to_end(subject)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return user
+
+    def invalidate(self, subject: str):
+        self.backend.incr(f"gen:{subject}")
+        with self._lock:
+            self._entries.pop(subject, None)
+
+    def clear(self):
+        self.backend.clear()
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "backend_errors": getattr(self.backend, "errors", 0),
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+principal_cache = PrincipalCache()
+register_metrics("principal_cache", principal_cache.stats)
@@ -1,35 +1,296 @@
-from fastapi import Request, HTTPException
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import Response
-from collections import defaultdict
+from starlette.responses import JSONResponse
+from app.utils.metrics import register_metrics
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+import asyncio
+import logging
+import math
+import os
+import sqlite3
+import threading
 import time
 
-# In-memory storage for demonstration. Use Redis or similar for production.
-# {user_id: [(timestamp, count)]}
-request_counts = defaultdict(list)
+logger = logging.getLogger(__name__)
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app, limit: int = 5000, window: int = 3600): # 50 requests per hour
-        super().__init__(app)
-        self.limit = limit
-        self.window = window
+def _parse_limit(value: str) -> Tuple[int, int]:
+    # "<requests>/<window seconds>"
+    limit, window = value.split("/")
+    return int(limit), int(window)
 
-    async def dispatch(self, request: Request, call_next):
-        # Only apply rate limiting to authenticated users and specific endpoints
-        if request.url.path.startswith("/posts/") or request.url.path.startswith("/users/"):
-            # This is a simplified way to get user ID. In a real app, you'd parse JWT.
-            # For now, we'll assume the user ID is available in the request state after auth middleware
-            user_id = request.state.user.id if hasattr(request.state, 'user') else "anonymous"
+# Limits per route class. Authenticated requests count against the token subject, anonymous
+# ones against the client address.
+RATE_LIMITS: Dict[str, Tuple[int, int]] = {
+    "auth": _parse_limit(os.getenv("RATE_LIMIT_AUTH", "20/60")),  # login, signup, password resets
+    "write": _parse_limit(os.getenv("RATE_LIMIT_WRITE", "120/60")),
+    "read": _parse_limit(os.getenv("RATE_LIMIT_READ", "600/60")),
+}
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # memory, sqlite or redis
+RATE_LIMIT_SQLITE_PATH = os.getenv("RATE_LIMIT_SQLITE_PATH", "rate_limits.db")
+RATE_LIMIT_SWEEP_INTERVAL_SECONDS = int(os.getenv("RATE_LIMIT_SWEEP_INTERVAL_SECONDS", "60"))
+# Shared stores are called off the event loop, on a small pool of their own, and a request
+# that has waited RATE_LIMIT_STORE_TIMEOUT seconds for its count is let through. At most
+# RATE_LIMIT_STORE_WORKERS calls are in flight: while the store stalls, further requests are
+# let through at once rather than queueing counts that would all land when it recovers.
+RATE_LIMIT_STORE_TIMEOUT = float(os.getenv("RATE_LIMIT_STORE_TIMEOUT", "0.25"))
+RATE_LIMIT_STORE_WORKERS = int(os.getenv("RATE_LIMIT_STORE_WORKERS", "8"))
+EXEMPT_PATHS = frozenset({"/healthz", "/metrics", "/docs", "/redoc", "/openapi.json"})
 
-            current_time = time.time()
-            # Clean up old requests outside the window
-            request_counts[user_id] = [(t, c) for t, c in request_counts[user_id] if current_time - t < self.window]
+def route_class(method: str, path: str) -> Optional[str]:
+    if method == "OPTIONS" or path in EXEMPT_PATHS:
+        return None
+    if path.startswith("/auth/"):
+        return "auth"
+    return "read" if method in ("GET", "HEAD") else "write"
 
-            # Check if limit is exceeded
-            if len(request_counts[user_id]) >= self.limit:
-                raise HTTPException(status_code=429, detail="Too many requests")
+# Storage for the per-key window counts. increment() counts a request in fixed window `index`
+# of length `window` and returns (current window count, previous window count) in one atomic step and, for shared
+# stores, one round trip; decrement() takes back a request that was rejected. `blocking` marks
+# the stores that do I/O and so must not be called on the event loop.
 
-            request_counts[user_id].append((current_time, 1))
+class InMemoryRateLimitStore:
+    # Process-local: with several workers each one enforces the limits on its own
+    blocking = False
 
-        response = await call_next(request)
-        return response
+    def __init__(self):
+        self._windows = {}  # key -> [window index, current count, previous count, expires_at]
+        self._lock = threading.Lock()
+
+    def increment(self, key: str, index: int, window: int) -> Tuple[int, int]:
+        # Kept until the count stops mattering, at the end of the following window
+        expires_at = (index + 2) * window
+        with self._lock:
+            entry = self._windows.get(key)
+            if entry is None:
+                entry = self._windows[key] = [index, 0, 0, expires_at]
+            elif entry[0] != index:
+                entry[2] = entry[1] if entry[0] == index - 1 else 0
+                entry[1] = 0
+                entry[0] = index
+            entry[1] += 1
+            entry[3] = expires_at
+            return entry[1], entry[2]
+
+    def decrement(self, key: str, index: int):
+        with self._lock:
+            entry = self._windows.get(key)
+            if entry is not None and entry[0] == index:
+                entry[1] -= 1
+
+    def sweep(self, now: float) -> int:
+        with self._lock:
+            idle = [key for key, entry in self._windows.items() if entry[3] <= now]
+            for key in idle:
+                del self._windows[key]
+        return len(idle)
+
+    def clear(self):
+        with self._lock:
+            self._windows.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"backend": "memory", "tracked_keys": len(self._windows)}
+
+class SqliteRateLimitStore:
+    # Shares the counts between the workers on one host through a small SQLite file. A locked
+    # file gives up after RATE_LIMIT_STORE_TIMEOUT, and the limiter then fails open.
+    blocking = True
+
+    def __init__(self, path: str = RATE_LIMIT_SQLITE_PATH):
+        self._connection = sqlite3.connect(path, timeout=RATE_LIMIT_STORE_TIMEOUT, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limit (key TEXT PRIMARY KEY, window INTEGER NOT NULL, "
+            "current INTEGER NOT NULL, previous INTEGER NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS ix_rate_limit_expires_at ON rate_limit (expires_at)")
+        self._lock = threading.Lock()
+
+    def increment(self, key: str, index: int, window: int) -> Tuple[int, int]:
+        # One upsert rolls the window over and counts the request; SET reads the old row
+        with self._lock:
+            return self._connection.execute(
+                "INSERT INTO rate_limit (key, window, current, previous, expires_at) VALUES (:key, :window, 1, 0, :expires_at) "
+                "ON CONFLICT (key) DO UPDATE SET "
+                "previous = CASE WHEN window = :window THEN previous WHEN window = :window - 1 THEN current ELSE 0 END, "
+                "current = CASE WHEN window = :window THEN current + 1 ELSE 1 END, "
+                "window = :window, expires_at = :expires_at RETURNING current, previous",
+                {"key": key, "window": index, "expires_at": (index + 2) * window},
+            ).fetchone()
+
+    def decrement(self, key: str, index: int):
+        with self._lock:
+            self._connection.execute("UPDATE rate_limit SET current = current - 1 WHERE key = ? AND window = ?", (key, index))
+
+    def sweep(self, now: float) -> int:
+        with self._lock:
+            return self._connection.execute("DELETE FROM rate_limit WHERE expires_at <= ?", (now,)).rowcount
+
+    def clear(self):
+        with self._lock:
+            self._connection.execute("DELETE FROM rate_limit")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"backend": "sqlite", "tracked_keys": self._connection.execute("SELECT COUNT(*) FROM rate_limit").fetchone()[0]}
+
+class RedisRateLimitStore:
+    # Shared across hosts. Each window count is its own key, which Redis expires by itself.
+    blocking = True
+
+    def __init__(self, client, prefix: str = "rate_limit:"):
+        self.client = client
+        self.prefix = prefix
+
+    def increment(self, key: str, index: int, window: int) -> Tuple[int, int]:
+        current_key = f"{self.prefix}{key}:{index}"
+        # MULTI/EXEC pipeline: atomic and a single round trip
+        pipeline = self.client.pipeline(transaction=True)
+        pipeline.incr(current_key)
+        pipeline.expire(current_key, 2 * window)
+        pipeline.get(f"{self.prefix}{key}:{index - 1}")
+        current, _, previous = pipeline.execute()
+        return current, int(previous or 0)
+
+    def decrement(self, key: str, index: int):
+        self.client.decr(f"{self.prefix}{key}:{index}")
+
+    def sweep(self, now: float) -> int:
+        return 0
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.prefix + "*"))
+        if keys:
+            self.client.delete(*keys)
+
+    def stats(self) -> dict:
+        return {"backend": "redis"}
+
+def create_rate_limit_store(kind: str = RATE_LIMIT_BACKEND):
+    if kind == "redis":
+        from app.utils.redis_client import get_redis_client
+        return RedisRateLimitStore(get_redis_client())
+    if kind == "sqlite":
+        return SqliteRateLimitStore()
+    return InMemoryRateLimitStore()
+
+class SlidingWindowLimiter:
+    # Sliding window counter: each key keeps only the counts of the current and previous fixed
+    # windows, and the previous one is weighted by how much of it the sliding window still
+    # covers. That approximates a true sliding log in O(1) time and memory per key.
+    def __init__(self, limits: Dict[str, Tuple[int, int]] = RATE_LIMITS, store=None, store_timeout: float = RATE_LIMIT_STORE_TIMEOUT):
+        self.limits = limits
+        self.store = store if store is not None else InMemoryRateLimitStore()
+        self.store_timeout = store_timeout
+        self._store_slots = threading.BoundedSemaphore(RATE_LIMIT_STORE_WORKERS)
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.rejected = 0
+        self.errors = 0
+        self.swept = 0
+        self._error_logged_at = 0.0
+
+    def _count(self, stat: str):
+        with self._lock:
+            setattr(self, stat, getattr(self, stat) + 1)
+
+    def hit(self, route: str, client: str, now: Optional[float] = None) -> float:
+        # Counts the request and returns 0, or returns the seconds to wait when over the limit
+        limit, window = self.limits[route]
+        now = time.time() if now is None else now
+        index, offset = int(now // window), now % window
+        key = f"{route}:{client}"
+        try:
+            current, previous = self.store.increment(key, index, window)
+            elapsed = offset / window
+            if previous * (1 - elapsed) + current - 1 < limit:
+                self._count("allowed")
+                return 0.0
+            self.store.decrement(key, index)
+        except Exception as e:
+            return self._fail_open(now, e)
+        self._count("rejected")
+        current -= 1
+        if current < limit:
+            # Room opens up once enough of the previous window has slid out
+            return max((1 - (limit - current) / previous - elapsed) * window, 1.0)
+        return max(window - offset, 1.0)
+
+    async def hit_async(self, route: str, client: str) -> float:
+        # hit() for the event loop: shared stores run on their own pool, bounded by store_timeout
+        if not self.store.blocking:
+            return self.hit(route, client)
+        now = time.time()
+        slots = self._store_slots
+        if not slots.acquire(blocking=False):
+            return self._fail_open(now, "every store call is still waiting for an answer")
+        try:
+            future = _store_executor.submit(self.hit, route, client, now)
+        except BaseException:
+            slots.release()
+            raise
+        # The slot is held until the store call itself returns, not just until we stop waiting
+        future.add_done_callback(lambda _: slots.release())
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.store_timeout)
+        except asyncio.TimeoutError:
+            return self._fail_open(now, f"no answer within {self.store_timeout}s")
+
+    def _fail_open(self, now: float, error) -> float:
+        # Fail open: an unreachable store must not take the API down with it
+        self._count("errors")
+        if now - self._error_logged_at > 60:
+            self._error_logged_at = now
+            logger.warning(f"Rate limit store unavailable, allowing requests: {error}")
+        return 0.0
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        # Drop keys whose counts have stopped mattering; shared stores may expire keys themselves
+        swept = self.store.sweep(time.time() if now is None else now)
+        with self._lock:
+            self.swept += swept
+        return swept
+
+    def clear(self):
+        self.store.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = {"allowed": self.allowed, "rejected": self.rejected, "errors": self.errors, "swept": self.swept}
+        return {**self.store.stats(), **counters}
+
+_store_executor = ThreadPoolExecutor(max_workers=RATE_LIMIT_STORE_WORKERS, thread_name_prefix="rate-limit-store")
+rate_limiter = SlidingWindowLimiter(store=create_rate_limit_store())
+register_metrics("rate_limiter", rate_limiter.stats)
+
+async def run_rate_limit_sweeper(interval: int = RATE_LIMIT_SWEEP_INTERVAL_SECONDS):
+    # Started from the app lifespan and cancelled on shutdown
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(rate_limiter.sweep)
+        except Exception as e:
+            logger.error(f"Error sweeping rate limiter: {e}")
+
+class RateLimitMiddleware:
+    # Plain ASGI middleware: allowed requests go straight through to the app, with no extra
+    # task or response buffering per request
+    def __init__(self, app, limiter: SlidingWindowLimiter = rate_limiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            route = route_class(scope["method"], scope["path"])
+            if route is not None:
+                # AuthMiddleware has already decoded the token subject
+                client = scope.get("state", {}).get("token_subject") or f"ip:{scope['client'][0] if scope.get('client') else 'unknown'}"
+                retry_after = await self.limiter.hit_async(route, client)
+                if retry_after:
+                    # Answered here: exceptions from middleware never reach the HTTPException
+                    # handlers, which sit inside the middleware stack
+                    response = JSONResponse({"detail": "Too many requests"}, status_code=429, headers={"Retry-After": str(math.ceil(retry_after))})
+                    await response(scope, receive, send)
+                    return
+        await self.app(scope, receive, send)
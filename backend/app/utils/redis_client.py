@@ -1,11 +1,19 @@
-# import redis
+import os
 
-# # For Docker Compose, use the service name 'redis'
-# # For local development, use 'localhost'
-# REDIS_HOST = "redis"
-# REDIS_PORT = 6379
+# For Docker Compose the URL points at the 'redis' service; see .env.example
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+# Short timeouts so a stalled Redis raises quickly and callers fall back instead of hanging
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "0.25"))
+REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", "0.25"))
 
-# redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0)
+_redis_client = None
 
-# def get_redis_client():
-#     return redis_client
+def get_redis_client():
+    # Created lazily so nothing connects to Redis unless a Redis-backed component is configured
+    global _redis_client
+    if _redis_client is None:
+        import redis
+        _redis_client = redis.Redis.from_url(
+            REDIS_URL, socket_timeout=REDIS_SOCKET_TIMEOUT, socket_connect_timeout=REDIS_CONNECT_TIMEOUT
+        )
+    return _redis_client
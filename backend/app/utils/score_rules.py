@@ -0,0 +1,11 @@
+from datetime import datetime, timedelta, timezone
+
+# Constants of the feed score formula, shared by the scalar implementation in feed_algorithm
+# and the columnar one in vector_scoring. Neither imports the other for them.
+RECENCY_WINDOW = timedelta(days=1)
+RECENCY_BONUS = 1.0
+FOLLOW_MULTIPLIER = 1.5
+
+def _aware(value: datetime) -> datetime:
+    # SQLite hands back naive datetimes; everything is stored in UTC
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
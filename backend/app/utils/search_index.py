@@ -0,0 +1,243 @@
+from sqlmodel import Session, SQLModel, select
+from sqlalchemy import DDL, column, delete, event, func, insert, literal, literal_column, table, text, tuple_
+from app.models.models import Post, User
+from app.utils.pagination import encode_cursor, decode_cursor
+from app.utils.cache import search_cache
+from typing import Iterable, List, Optional, Tuple
+import re
+import unicodedata
+import uuid
+
+SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE_SIZE = 50
+QUERY_TOKEN_PATTERN = re.compile(r"\w+")
+MAX_QUERY_TOKENS = 8
+# Cached result pages are grouped by the first characters of the query's longest word
+SEARCH_CACHE_PREFIX_LENGTH = 3
+
+# Full-text search over posts and user profiles. SQLite uses FTS5 tables that carry the
+# source row's id and are kept in sync by the write paths; Postgres uses GIN expression
+# indexes, which the database keeps in sync itself. Both rank by relevance and match every
+# query word as a prefix, so partially typed words find results.
+
+class SqliteSearchBackend:
+    post_fts = table("post_fts", column("rowid"), column("id"), column("content"))
+    user_fts = table("user_fts", column("rowid"), column("id"), column("username"), column("bio"))
+    # FTS rows need an integer key to be replaced and deleted without a scan. Each source id
+    # is given one in a key table with an INTEGER PRIMARY KEY, which VACUUM never renumbers,
+    # unlike the implicit rowid of the UUID-keyed source tables.
+    post_fts_key = table("post_fts_key", column("fts_rowid"), column("id", Post.__table__.c.id.type))
+    user_fts_key = table("user_fts_key", column("fts_rowid"), column("id", User.__table__.c.id.type))
+    USERNAME_WEIGHT = 10.0
+
+    def build_query(self, tokens: List[str]) -> str:
+        return " ".join(f'"{token}"*' for token in tokens)
+
+    # Each search returns (relevance, FTS table to join or None, join condition, match condition)
+    def post_search(self, tokens: List[str]):
+        query = self.build_query(tokens)
+        # bm25 is lower for better matches
+        relevance = -func.bm25(literal_column("post_fts"))
+        return relevance, self.post_fts, Post.id == self.post_fts.c.id, text("post_fts MATCH :search_query").bindparams(search_query=query)
+
+    def user_search(self, tokens: List[str]):
+        query = self.build_query(tokens)
+        relevance = -func.bm25(literal_column("user_fts"), self.USERNAME_WEIGHT, 1.0)
+        return relevance, self.user_fts, User.id == self.user_fts.c.id, text("user_fts MATCH :search_query").bindparams(search_query=query)
+
+    # Indexed text is taken from the instance; the id is copied from the source row so it is
+    # stored exactly as the join compares it
+    def _index(self, db: Session, fts, keys, model, row_id: uuid.UUID, values: list):
+        db.flush()  # the source row must exist
+        db.exec(insert(keys).prefix_with("OR IGNORE").from_select(["id"], select(model.id).where(model.id == row_id)))
+        fts_rowid = select(keys.c.fts_rowid).where(keys.c.id == model.id).scalar_subquery()
+        db.exec(insert(fts).prefix_with("OR REPLACE").from_select(
+            [c.name for c in fts.columns], select(fts_rowid, model.id, *values).where(model.id == row_id)
+        ))
+
+    def _remove(self, db: Session, fts, keys, row_id: uuid.UUID):
+        db.exec(delete(fts).where(fts.c.rowid.in_(select(keys.c.fts_rowid).where(keys.c.id == row_id))))
+        db.exec(delete(keys).where(keys.c.id == row_id))
+
+    def index_post(self, db: Session, post: Post):
+        self._index(db, self.post_fts, self.post_fts_key, Post, post.id, [literal(post.content)])
+
+    def remove_post(self, db: Session, post_id: uuid.UUID):
+        self._remove(db, self.post_fts, self.post_fts_key, post_id)
+
+    def index_user(self, db: Session, user: User):
+        self._index(db, self.user_fts, self.user_fts_key, User, user.id, [literal(user.username), literal(user.bio or "")])
+
+    def remove_user(self, db: Session, user_id: uuid.UUID):
+        self._remove(db, self.user_fts, self.user_fts_key, user_id)
+
+    def reset(self, db: Session):
+        # Recreated rather than emptied, so indexes from an older layout are replaced too
+        for statement in FTS_DROP_DDL + FTS_CREATE_DDL:
+            db.exec(text(statement))
+
+class PostgresSearchBackend:
+    # Must match the indexed expressions below exactly for the GIN indexes to be used. The
+    # constants are inlined, not bound: a server-side prepared statement's generic plan cannot
+    # match an index expression against parameters.
+    config = literal_column("'simple'")
+    post_document = func.to_tsvector(config, Post.content)
+    user_document = func.setweight(func.to_tsvector(config, User.username), literal_column("'A'")).op("||")(
+        func.setweight(func.to_tsvector(config, func.coalesce(User.bio, literal_column("''"))), literal_column("'D'"))
+    )
+
+    def build_query(self, tokens: List[str]) -> str:
+        return " & ".join(f"{token}:*" for token in tokens)
+
+    def post_search(self, tokens: List[str]):
+        tsquery = func.to_tsquery(self.config, self.build_query(tokens))
+        return func.ts_rank(self.post_document, tsquery), None, None, self.post_document.op("@@")(tsquery)
+
+    def user_search(self, tokens: List[str]):
+        tsquery = func.to_tsquery(self.config, self.build_query(tokens))
+        return func.ts_rank(self.user_document, tsquery), None, None, self.user_document.op("@@")(tsquery)
+
+    def index_post(self, db: Session, post: Post):
+        pass
+
+    def remove_post(self, db: Session, post_id: uuid.UUID):
+        pass
+
+    def index_user(self, db: Session, user: User):
+        pass
+
+    def remove_user(self, db: Session, user_id: uuid.UUID):
+        pass
+
+    def reset(self, db: Session):
+        pass
+
+SEARCH_BACKENDS = {
+    "sqlite": SqliteSearchBackend(),
+    "postgresql": PostgresSearchBackend(),
+}
+
+# The search indexes are created and dropped with the rest of the schema
+FTS_CREATE_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS post_fts USING fts5(id UNINDEXED, content, tokenize='unicode61 remove_diacritics 2')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS user_fts USING fts5(id UNINDEXED, username, bio, tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TABLE IF NOT EXISTS post_fts_key (fts_rowid INTEGER PRIMARY KEY, id CHAR(32) NOT NULL UNIQUE)",
+    "CREATE TABLE IF NOT EXISTS user_fts_key (fts_rowid INTEGER PRIMARY KEY, id CHAR(32) NOT NULL UNIQUE)",
+)
+FTS_DROP_DDL = ("DROP TABLE IF EXISTS post_fts", "DROP TABLE IF EXISTS user_fts", "DROP TABLE IF EXISTS post_fts_key", "DROP TABLE IF EXISTS user_fts_key")
+POSTGRES_INDEX_DDL = (
+    "CREATE INDEX IF NOT EXISTS ix_post_content_fts ON post USING GIN (to_tsvector('simple', content))",
+    "CREATE INDEX IF NOT EXISTS ix_user_profile_fts ON \"user\" USING GIN "
+    "((setweight(to_tsvector('simple', username), 'A') || setweight(to_tsvector('simple', coalesce(bio, '')), 'D')))",
+)
+for ddl in FTS_CREATE_DDL:
+    event.listen(SQLModel.metadata, "after_create", DDL(ddl).execute_if(dialect="sqlite"))
+for ddl in FTS_DROP_DDL:
+    event.listen(SQLModel.metadata, "before_drop", DDL(ddl).execute_if(dialect="sqlite"))
+for ddl in POSTGRES_INDEX_DDL:
+    event.listen(SQLModel.metadata, "after_create", DDL(ddl).execute_if(dialect="postgresql"))
+
+def get_search_backend(db: Session):
+    return SEARCH_BACKENDS[db.get_bind().dialect.name]
+
+# Index maintenance, called by the write paths before they commit
+def index_post(db: Session, post: Post):
+    get_search_backend(db).index_post(db, post)
+
+def remove_post(db: Session, post_id: uuid.UUID):
+    get_search_backend(db).remove_post(db, post_id)
+
+def index_user(db: Session, user: User):
+    get_search_backend(db).index_user(db, user)
+
+def remove_user(db: Session, user_id: uuid.UUID):
+    get_search_backend(db).remove_user(db, user_id)
+
+def _query_tokens(query: str) -> List[str]:
+    return [token.casefold() for token in QUERY_TOKEN_PATTERN.findall(query)][:MAX_QUERY_TOKENS]
+
+def _cache_tokens(text: str) -> List[str]:
+    # Casefolded and without diacritics, so a namespace covers every spelling either backend
+    # might match: SQLite's tokenizer folds accents, Postgres' 'simple' configuration does not
+    stripped = "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+    return [token.casefold() for token in QUERY_TOKEN_PATTERN.findall(stripped)]
+
+# Search result caching. A row only matches a query if every query word is a prefix of one
+# of its words, so a query cached under the prefix of its longest word can only change when
+# a row with a word starting with that prefix is written, and writes invalidate exactly those.
+def search_cache_key(query: str) -> Optional[Tuple[str, str]]:
+    # (namespace suffix, normalized query) or None when the query has no words. The namespace
+    # is accent-folded, for invalidation; the query keeps its accents, exactly as it is sent
+    # to the backend, so "café" and "cafe" never share a page on a backend that tells them apart.
+    tokens = _query_tokens(query)
+    if not tokens:
+        return None
+    folded = _cache_tokens(" ".join(tokens)) or tokens
+    return max(folded, key=len)[:SEARCH_CACHE_PREFIX_LENGTH], " ".join(tokens)
+
+def _invalidate_searches(kind: str, texts: Iterable[Optional[str]]):
+    prefixes = {
+        token[:length]
+        for text in texts if text
+        for token in _cache_tokens(text)
+        for length in range(1, min(len(token), SEARCH_CACHE_PREFIX_LENGTH) + 1)
+    }
+    search_cache.invalidate(*(f"{kind}:{prefix}" for prefix in prefixes))
+
+def invalidate_post_searches(*contents: Optional[str]):
+    _invalidate_searches("posts", contents)
+
+def invalidate_user_searches(*texts: Optional[str]):
+    _invalidate_searches("users", texts)
+
+def search_statement(model, search, tokens: List[str], limit: int, cursor: Optional[str]):
+    # Keyset pagination over (relevance, created_at, id), most relevant first. Relevance
+    # depends on corpus statistics, so a page can shift slightly if the index changes in between.
+    relevance, fts_table, join_condition, match = search(tokens)
+    statement = select(model, relevance.label("relevance"))
+    if fts_table is not None:
+        statement = statement.join(fts_table, join_condition)
+    statement = statement.where(match, model.deleted_at == None)
+    if cursor:
+        statement = statement.where(tuple_(relevance, model.created_at, model.id) < tuple_(*decode_cursor(cursor)))
+    return statement.order_by(relevance.desc(), model.created_at.desc(), model.id.desc()).limit(limit + 1)
+
+def _search(db: Session, model, search, query: str, limit: int, cursor: Optional[str]):
+    tokens = _query_tokens(query)
+    if not tokens:
+        return [], None
+    rows = db.exec(search_statement(model, search, tokens, limit, cursor)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last, last_relevance = rows[-1]
+        next_cursor = encode_cursor(last_relevance, last.created_at, last.id)
+    return [row[0] for row in rows], next_cursor
+
+def search_posts(db: Session, query: str, limit: int = SEARCH_PAGE_SIZE, cursor: Optional[str] = None) -> Tuple[List[Post], Optional[str]]:
+    return _search(db, Post, get_search_backend(db).post_search, query, limit, cursor)
+
+def search_users(db: Session, query: str, limit: int = SEARCH_PAGE_SIZE, cursor: Optional[str] = None) -> Tuple[List[User], Optional[str]]:
+    return _search(db, User, get_search_backend(db).user_search, query, limit, cursor)
+
+def rebuild_search_index(db: Session, chunk_size: int = 500) -> int:
+    # Re-index every post and user from scratch, walking each table in primary key order
+    get_search_backend(db).reset(db)
+    db.commit()
+    indexed = 0
+    for model, index in ((Post, index_post), (User, index_user)):
+        last_id = None
+        while True:
+            query = select(model).order_by(model.id).limit(chunk_size)
+            if last_id is not None:
+                query = query.where(model.id > last_id)
+            rows = db.exec(query).all()
+            if not rows:
+                break
+            for row in rows:
+                index(db, row)
+            indexed += len(rows)
+            last_id = rows[-1].id
+            db.commit()
+    return indexed
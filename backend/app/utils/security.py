@@ -1,28 +1,84 @@
 
+import asyncio
 import bcrypt
-from collections import defaultdict
-import time
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException
+from app.utils.metrics import register_metrics
+from app.utils.login_attempts import login_attempts
+import os
+import threading
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# bcrypt runs on its own small pool so login storms cannot take over the shared threadpool
+# that every sync endpoint runs on. Callers are async routes that await the result, so a
+# request waiting on a hash holds no thread at all. At most HASHING_WORKERS +
+# HASHING_QUEUE_LIMIT requests wait on the pool at once; beyond that callers get a 503
+# straight away.
+HASHING_WORKERS = int(os.getenv("HASHING_WORKERS", str(os.cpu_count() or 1)))
+HASHING_QUEUE_LIMIT = int(os.getenv("HASHING_QUEUE_LIMIT", "16"))
 
-LOGIN_ATTEMPTS = defaultdict(lambda: {"count": 0, "timestamp": 0})
 LOGIN_ATTEMPT_LIMIT = 5
-LOGIN_ATTEMPT_TIMEOUT = 60 * 5  # 5 minutes
+LOGIN_ATTEMPT_TIMEOUT = 60 * 5  # 5 minutes after the latest failure
+
+_hashing_executor = ThreadPoolExecutor(max_workers=HASHING_WORKERS, thread_name_prefix="password-hashing")
+_hashing_slots = threading.BoundedSemaphore(HASHING_WORKERS + HASHING_QUEUE_LIMIT)
+_hashing_stats = {"completed": 0, "failed": 0, "rejected": 0}
+_hashing_stats_lock = threading.Lock()
+
+def _count(stat: str):
+    with _hashing_stats_lock:
+        _hashing_stats[stat] += 1
 
 def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(BCRYPT_ROUNDS)).decode('utf-8')
 
 def verify_password(password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
 
+def needs_rehash(hashed_password: str) -> bool:
+    # bcrypt hashes look like $2b$<cost>$<salt and hash>
+    try:
+        return int(hashed_password.split("$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+async def run_hashing(function, *args):
+    # Run hash_password/verify_password on the hashing pool and await the result
+    slots = _hashing_slots
+    if not slots.acquire(blocking=False):
+        _count("rejected")
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+    try:
+        future = _hashing_executor.submit(function, *args)
+    except BaseException:
+        slots.release()
+        raise
+    # The slot is held until the hash itself finishes, even if the awaiting request goes away
+    future.add_done_callback(lambda _: slots.release())
+    try:
+        result = await asyncio.wrap_future(future)
+    except BaseException:
+        _count("failed")
+        raise
+    _count("completed")
+    return result
+
+def hashing_stats() -> dict:
+    with _hashing_stats_lock:
+        counters = dict(_hashing_stats)
+    return {"workers": HASHING_WORKERS, "queue_limit": HASHING_QUEUE_LIMIT, "rounds": BCRYPT_ROUNDS, **counters}
+
+register_metrics("password_hashing", hashing_stats)
+
+# Counters are kept per normalized email, so case variants share one
+def _login_attempt_key(email: str) -> str:
+    return email.strip().casefold()
+
 def is_login_attempt_blocked(email: str) -> bool:
-    attempt = LOGIN_ATTEMPTS[email]
-    if attempt["count"] >= LOGIN_ATTEMPT_LIMIT:
-        if time.time() - attempt["timestamp"] < LOGIN_ATTEMPT_TIMEOUT:
-            return True
-        else:
-            # Reset after timeout
-            LOGIN_ATTEMPTS.pop(email)
-    return False
+    return login_attempts.failures(_login_attempt_key(email)) >= LOGIN_ATTEMPT_LIMIT
 
 def record_failed_login_attempt(email: str):
-    LOGIN_ATTEMPTS[email]["count"] += 1
-    LOGIN_ATTEMPTS[email]["timestamp"] = time.time()
+    login_attempts.record_failure(_login_attempt_key(email), LOGIN_ATTEMPT_TIMEOUT)
+
+def reset_login_attempts(email: str):
+    login_attempts.reset(_login_attempt_key(email))
@@ -0,0 +1,83 @@
+from sqlmodel import Session, select
+from sqlalchemy import delete, false, func, insert, or_
+from app.models.models import Post, PostTerm
+from typing import Dict, Iterable
+import re
+import unicodedata
+
+# Words only, optionally prefixed with # for hashtags. Apostrophes split words, so the
+# possessive in "garden's" leaves "garden" plus an "s" too short to index.
+TOKEN_PATTERN = re.compile(r"(#?)(\w+)")
+MIN_TERM_LENGTH = 2
+STOP_WORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "for", "from", "i", "in", "is", "it",
+    "its", "me", "my", "of", "on", "or", "so", "that", "the", "this", "to", "was", "we", "with",
+})
+
+def normalize_term(term: str) -> str:
+    return unicodedata.normalize("NFKC", term).casefold()
+
+def extract_terms(content: str) -> Dict[str, bool]:
+    # Normalized term -> whether it appeared as a hashtag. Hashtags are kept even when they
+    # would otherwise be dropped as stop words or as too short.
+    terms = {}
+    for hash_mark, word in TOKEN_PATTERN.findall(unicodedata.normalize("NFKC", content)):
+        term = normalize_term(word)
+        is_hashtag = bool(hash_mark)
+        if not is_hashtag and (len(term) < MIN_TERM_LENGTH or term in STOP_WORDS):
+            continue
+        terms[term] = terms.get(term, False) or is_hashtag
+    return terms
+
+def index_post_terms(db: Session, post: Post):
+    # Replace the post's index rows; call on create and whenever content changes. The caller commits.
+    db.exec(delete(PostTerm).where(PostTerm.post_id == post.id).execution_options(synchronize_session=False))
+    terms = extract_terms(post.content)
+    if terms:
+        db.exec(insert(PostTerm), params=[
+            {"post_id": post.id, "term": term, "is_hashtag": is_hashtag} for term, is_hashtag in terms.items()
+        ])
+
+def rebuild_post_terms(db: Session, chunk_size: int = 500) -> int:
+    # Re-index every post, walking the post table in primary key order
+    indexed = 0
+    last_id = None
+    while True:
+        query = select(Post).order_by(Post.id).limit(chunk_size)
+        if last_id is not None:
+            query = query.where(Post.id > last_id)
+        posts = db.exec(query).all()
+        if not posts:
+            break
+        for post in posts:
+            index_post_terms(db, post)
+        indexed += len(posts)
+        last_id = posts[-1].id
+        db.commit()
+    return indexed
+
+def _matching_post_ids(topic: str):
+    # Posts containing every term of the topic; a leading # restricts the match to hashtags
+    hashtag_only = topic.strip().startswith("#")
+    terms = list(extract_terms(topic))
+    if not terms:
+        return None
+    query = select(PostTerm.post_id).where(PostTerm.term.in_(terms))
+    if hashtag_only:
+        query = query.where(PostTerm.is_hashtag == True)
+    if len(terms) == 1:
+        return query
+    return query.group_by(PostTerm.post_id).having(func.count(PostTerm.term) == len(terms))
+
+def topic_condition(post_id_column, topics: Iterable[str]):
+    # SQL condition matching posts about any of the topics, resolved through the term index
+    subqueries = [subquery for subquery in map(_matching_post_ids, topics) if subquery is not None]
+    if not subqueries:
+        return false()
+    return or_(*(post_id_column.in_(subquery) for subquery in subqueries))
+
+def topic_cache_namespace(topic: str) -> str:
+    # A post can only match a topic if it contains every one of its terms, so keying topic
+    # feeds by their smallest term lets a post invalidate them through its own terms
+    terms = extract_terms(topic)
+    return f"topic:{min(terms)}" if terms else "topic"
@@ -0,0 +1,82 @@
+from sqlmodel import Session, select
+from sqlalchemy import delete, func, insert
+from app.models.models import Post, Follow, TimelineEntry
+from datetime import datetime
+from typing import Iterable, List, Set
+import os
+import uuid
+
+# Entries kept per home timeline; older ones are trimmed on write
+HOME_TIMELINE_MAX_LENGTH = int(os.getenv("HOME_TIMELINE_MAX_LENGTH", "800"))
+# Authors with more followers than this are not fanned out on write. Their posts are
+# merged into followers' feeds at read time instead, so one post is never a huge write spike.
+# Each post records which way it went, so an author crossing the limit in either direction
+# never has a post in both places or in neither.
+FANOUT_FOLLOWER_LIMIT = int(os.getenv("FANOUT_FOLLOWER_LIMIT", "5000"))
+
+def _follower_ids(db: Session, author_id: uuid.UUID, limit: int) -> List[uuid.UUID]:
+    return db.exec(select(Follow.follower_id).where(Follow.following_id == author_id, Follow.status == "active").limit(limit)).all()
+
+def get_read_time_authors(db: Session, following_ids: Iterable[uuid.UUID], since: datetime) -> Set[uuid.UUID]:
+    # Followed authors with posts since `since` that were not fanned out, off the
+    # (user_id, fanned_out, created_at) index
+    following_ids = list(following_ids)
+    if not following_ids:
+        return set()
+    return set(db.exec(
+        select(Post.user_id).distinct()
+        .where(Post.user_id.in_(following_ids), Post.fanned_out == False, Post.created_at >= since)
+    ).all())
+
+def trim_timelines(db: Session, user_ids: Iterable[uuid.UUID]):
+    # Keep the newest HOME_TIMELINE_MAX_LENGTH entries per timeline, all owners in one statement
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    ranked = select(
+        TimelineEntry.id,
+        func.row_number().over(partition_by=TimelineEntry.user_id, order_by=TimelineEntry.created_at.desc()).label("position"),
+    ).where(TimelineEntry.user_id.in_(user_ids)).subquery()
+    overflow = select(ranked.c.id).where(ranked.c.position > HOME_TIMELINE_MAX_LENGTH)
+    db.exec(delete(TimelineEntry).where(TimelineEntry.id.in_(overflow)).execution_options(synchronize_session=False))
+
+def fan_out_post(db: Session, post: Post) -> List[uuid.UUID]:
+    # Append a new post to every follower's home timeline; the caller commits.
+    # Returns the owners of the timelines written, none for read-time authors.
+    # Fetch one past the limit, which is enough to tell a read-time author without loading all followers
+    follower_ids = _follower_ids(db, post.user_id, FANOUT_FOLLOWER_LIMIT + 1)
+    if len(follower_ids) > FANOUT_FOLLOWER_LIMIT:
+        post.fanned_out = False
+        return []
+    if not follower_ids:
+        return []
+    db.exec(insert(TimelineEntry), params=[
+        {"id": uuid.uuid4(), "user_id": follower_id, "post_id": post.id, "author_id": post.user_id, "created_at": post.created_at}
+        for follower_id in follower_ids
+    ])
+    trim_timelines(db, follower_ids)
+    return follower_ids
+
+def backfill_timeline(db: Session, follower_id: uuid.UUID, author_id: uuid.UUID) -> int:
+    # Copy the newly followed author's recent fanned-out posts into the follower's timeline;
+    # the rest are merged at read time. The caller commits.
+    remove_author_from_timeline(db, follower_id, author_id)
+    recent_posts = db.exec(
+        select(Post.id, Post.created_at).where(Post.user_id == author_id, Post.fanned_out == True)
+        .order_by(Post.created_at.desc()).limit(HOME_TIMELINE_MAX_LENGTH)
+    ).all()
+    if not recent_posts:
+        return 0
+    db.exec(insert(TimelineEntry), params=[
+        {"id": uuid.uuid4(), "user_id": follower_id, "post_id": post_id, "author_id": author_id, "created_at": created_at}
+        for post_id, created_at in recent_posts
+    ])
+    trim_timelines(db, [follower_id])
+    return len(recent_posts)
+
+def remove_author_from_timeline(db: Session, follower_id: uuid.UUID, author_id: uuid.UUID):
+    db.exec(
+        delete(TimelineEntry)
+        .where(TimelineEntry.user_id == follower_id, TimelineEntry.author_id == author_id)
+        .execution_options(synchronize_session=False)
+    )
@@ -0,0 +1,64 @@
+from app.utils.metrics import register_metrics
+from collections import OrderedDict
+from typing import Optional
+import hashlib
+import os
+import threading
+import time
+
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000"))
+
+class VerifiedTokenCache:
+    # Subjects of tokens whose signature and claims were already verified, keyed by the
+    # token's SHA-256 digest so raw tokens are never held. Each entry lives until the token's
+    # own exp, so a cached token is never accepted past the point decoding would reject it.
+    def __init__(self, max_entries: int = TOKEN_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # digest -> (exp, subject)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def get(self, digest: bytes, now: Optional[float] = None) -> Optional[str]:
+        now = now if now is not None else time.time()
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(digest)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[digest]
+            self.misses += 1
+            return None
+
+    def set(self, digest: bytes, subject: str, exp: float):
+        with self._lock:
+            self._entries[digest] = (exp, subject)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+token_cache = VerifiedTokenCache()
+register_metrics("token_cache", token_cache.stats)
@@ -0,0 +1,181 @@
+from app.utils.metrics import register_metrics
+from typing import Dict, List, Optional
+import asyncio
+import heapq
+import json
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Counters kept. Any term with more than 1/TRENDING_CAPACITY of the decayed stream is
+# guaranteed a counter; counts are overestimated by at most the reported max_error.
+TRENDING_CAPACITY = int(os.getenv("TRENDING_CAPACITY", "1000"))
+TRENDING_HALF_LIFE_SECONDS = int(os.getenv("TRENDING_HALF_LIFE_SECONDS", str(6 * 3600)))
+# Counts are kept per process. With several workers each one saves its own counts to the same
+# path and the snapshot holds whichever worker wrote last; after a restart every worker resumes
+# from that one worker's view, which sees a similar share of posts as the others.
+TRENDING_SNAPSHOT_PATH = os.getenv("TRENDING_SNAPSHOT_PATH", "trending_snapshot.json")
+TRENDING_SNAPSHOT_INTERVAL_SECONDS = int(os.getenv("TRENDING_SNAPSHOT_INTERVAL_SECONDS", "60"))
+TRENDING_LIMIT = 10
+MAX_TRENDING_LIMIT = 50
+HASHTAG_WEIGHT = 2.0
+# Words nearly every post on a gratitude network uses; they would always be "trending"
+IGNORED_TERMS = frozenset({"grateful", "gratitude", "thankful", "thanks", "today", "thank", "blessed"})
+# Rescale stored counts before the forward-decay weights get large enough to lose precision
+MAX_DECAY_EXPONENT = 50.0
+
+class TrendingTerms:
+    # Space-Saving heavy hitters with exponential time decay, in bounded memory. Decay is
+    # applied forward: a new occurrence weighs exp(rate * (t - landmark)), so old counts never
+    # need touching and the ranking is the same as the decayed one. When all counters are in
+    # use the smallest is handed to the new term, which inherits its count as overestimate.
+    def __init__(self, capacity: int = TRENDING_CAPACITY, half_life: float = TRENDING_HALF_LIFE_SECONDS):
+        self.capacity = capacity
+        self.rate = math.log(2) / half_life
+        self.landmark = time.time()
+        self._counts: Dict[str, List[float]] = {}  # term -> [count, error]
+        self._heap = []  # (count, term), possibly stale; see _evict_min
+        self._top: Optional[List[tuple]] = None  # cached ranking, dropped on every update
+        self._lock = threading.Lock()
+        self.updates = 0
+        self.evictions = 0
+
+    def _rescale(self, now: float):
+        factor = math.exp(-self.rate * (now - self.landmark))
+        for entry in self._counts.values():
+            entry[0] *= factor
+            entry[1] *= factor
+        self.landmark = now
+        self._rebuild_heap()
+
+    def _rebuild_heap(self):
+        self._heap = [(entry[0], term) for term, entry in self._counts.items()]
+        heapq.heapify(self._heap)
+
+    def _evict_min(self) -> float:
+        # Heap entries are not updated when a count grows, so skip the stale ones. Every
+        # tracked term keeps at least one entry no larger than its count, so the first
+        # current entry popped is the true minimum.
+        while True:
+            count, term = heapq.heappop(self._heap)
+            entry = self._counts.get(term)
+            if entry is None:
+                continue
+            if entry[0] != count:
+                heapq.heappush(self._heap, (entry[0], term))
+                continue
+            del self._counts[term]
+            self.evictions += 1
+            return count
+
+    def add_terms(self, terms: Dict[str, bool], now: Optional[float] = None):
+        # terms maps term -> is_hashtag, as returned by text_index.extract_terms
+        now = now if now is not None else time.time()
+        with self._lock:
+            if self.rate * (now - self.landmark) > MAX_DECAY_EXPONENT:
+                self._rescale(now)
+            weight = math.exp(self.rate * (now - self.landmark))
+            for term, is_hashtag in terms.items():
+                if term in IGNORED_TERMS:
+                    continue
+                increment = weight * (HASHTAG_WEIGHT if is_hashtag else 1.0)
+                entry = self._counts.get(term)
+                if entry is not None:
+                    entry[0] += increment
+                    continue
+                error = self._evict_min() if len(self._counts) >= self.capacity else 0.0
+                self._counts[term] = [error + increment, error]
+                heapq.heappush(self._heap, (error + increment, term))
+            if len(self._heap) > 4 * self.capacity:
+                self._rebuild_heap()
+            self._top = None
+            self.updates += 1
+
+    def top(self, limit: int = TRENDING_LIMIT, now: Optional[float] = None) -> List[dict]:
+        # The ranking is recomputed once per change, so repeated reads cost O(limit)
+        now = now if now is not None else time.time()
+        with self._lock:
+            if self._top is None:
+                self._top = heapq.nlargest(MAX_TRENDING_LIMIT, ((entry[0], entry[1], term) for term, entry in self._counts.items()))
+            decay = math.exp(-self.rate * (now - self.landmark))
+            return [
+                {"term": term, "score": round(count * decay, 4), "max_error": round(error * decay, 4)}
+                for count, error, term in self._top[:limit]
+            ]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "half_life": math.log(2) / self.rate,
+                "landmark": self.landmark,
+                "counts": {term: entry[:] for term, entry in self._counts.items()},
+            }
+
+    def restore(self, snapshot: dict):
+        # Bring the saved counts to their present value with the rate they were kept at and
+        # restart the decay from now, which also covers a changed half-life
+        now = time.time()
+        factor = math.exp(-(math.log(2) / snapshot["half_life"]) * (now - snapshot["landmark"]))
+        counts = sorted(snapshot["counts"].items(), key=lambda item: item[1][0], reverse=True)[: self.capacity]
+        with self._lock:
+            self.landmark = now
+            self._counts = {term: [float(count) * factor, float(error) * factor] for term, (count, error) in counts}
+            self._rebuild_heap()
+            self._top = None
+
+    def clear(self):
+        with self._lock:
+            self._counts.clear()
+            self._heap.clear()
+            self._top = None
+            self.landmark = time.time()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"tracked_terms": len(self._counts), "capacity": self.capacity, "updates": self.updates, "evictions": self.evictions}
+
+trending_terms = TrendingTerms()
+register_metrics("trending", trending_terms.stats)
+
+def save_trending_snapshot(path: str = TRENDING_SNAPSHOT_PATH):
+    # Written to a temporary file and renamed so a crash never leaves a torn snapshot. The
+    # temporary name is unique, so workers saving at the same moment never share one.
+    fd, temporary_path = tempfile.mkstemp(prefix=f"{os.path.basename(path)}.", suffix=".tmp", dir=os.path.dirname(path) or ".")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(trending_terms.snapshot(), f)
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.unlink(temporary_path)
+        raise
+
+def load_trending_snapshot(path: str = TRENDING_SNAPSHOT_PATH) -> bool:
+    try:
+        with open(path) as f:
+            trending_terms.restore(json.load(f))
+        return True
+    except FileNotFoundError:
+        return False
+    except (ValueError, KeyError, TypeError) as e:
+        logger.error(f"Ignoring unreadable trending snapshot {path}: {e}")
+        return False
+
+async def run_trending_snapshots(interval: int = TRENDING_SNAPSHOT_INTERVAL_SECONDS):
+    # Started from the app lifespan; cancelled on shutdown, which writes one last snapshot
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(save_trending_snapshot)
+            except Exception as e:
+                logger.error(f"Error saving trending snapshot: {e}")
+    finally:
+        try:
+            save_trending_snapshot()
+        except Exception as e:
+            logger.error(f"Error saving trending snapshot: {e}")
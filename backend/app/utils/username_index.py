@@ -0,0 +1,192 @@
+from sqlmodel import Session, select
+from app.models.models import User
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+import heapq
+import threading
+import unicodedata
+import uuid
+
+AUTOCOMPLETE_LIMIT = 10
+MAX_AUTOCOMPLETE_LIMIT = 25
+# One- and two-character prefixes can match a large share of all users, so their top results
+# are kept up to date on every write instead of being computed from the matching range
+SHORT_PREFIX_LENGTH = 2
+# Top-N results kept per recently queried longer prefix
+PREFIX_CACHE_SIZE = 1024
+
+def normalize_username(username: str) -> str:
+    return unicodedata.normalize("NFKC", username).casefold()
+
+def _short_prefixes(normalized: str) -> List[str]:
+    return [normalized[:length] for length in range(1, min(len(normalized), SHORT_PREFIX_LENGTH) + 1)]
+
+class UsernameIndex:
+    # Typeahead over usernames: a sorted array of (normalized username, user id) answers a
+    # prefix as one contiguous bisect range. Loaded from the database on first use; signup,
+    # rename, account deletion and hearts keep it current after they commit.
+    # Short prefixes are answered from ranked lists kept per prefix: the exact best entries of
+    # its range, at least MAX_AUTOCOMPLETE_LIMIT of them unless the range is smaller. Each
+    # list keeps up to twice that, so that users dropping out of it rarely force a rescan.
+    def __init__(self, kept_per_prefix: int = 2 * MAX_AUTOCOMPLETE_LIMIT):
+        self.kept_per_prefix = kept_per_prefix
+        self._keys: List[Tuple[str, uuid.UUID]] = []
+        self._users: Dict[uuid.UUID, Tuple[str, str, int]] = {}  # id -> (normalized, username, hearts_received)
+        self._short: Dict[str, list] = {}  # prefix -> [sorted ranks, whether the list holds its whole range]
+        self._top = OrderedDict()  # (prefix, limit) -> results, LRU
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _rank(self, user_id: uuid.UUID) -> Tuple[int, str, uuid.UUID]:
+        # Most hearted first, then alphabetical
+        normalized, username, hearts = self._users[user_id]
+        return (-hearts, normalized, user_id)
+
+    def _build_short(self):
+        self._short = {}
+        for rank in sorted(self._rank(user_id) for user_id in self._users):
+            for prefix in _short_prefixes(rank[1]):
+                top = self._short.setdefault(prefix, [[], True])
+                if len(top[0]) < self.kept_per_prefix:
+                    top[0].append(rank)
+                else:
+                    top[1] = False
+
+    def _rescan_short(self, prefix: str):
+        start = bisect_left(self._keys, (prefix,))
+        end = bisect_left(self._keys, (prefix + "\U0010ffff",), start)
+        if start == end:
+            self._short.pop(prefix, None)
+            return
+        ranks = heapq.nsmallest(self.kept_per_prefix, (self._rank(user_id) for normalized, user_id in self._keys[start:end]))
+        self._short[prefix] = [ranks, end - start <= self.kept_per_prefix]
+
+    def _update_short(self, normalized: str, old_rank, new_rank):
+        # Called once _keys and _users hold the new state; either rank may be None
+        for prefix in _short_prefixes(normalized):
+            top = self._short.get(prefix)
+            if top is None:
+                # No list means no user under this prefix yet
+                if new_rank is not None:
+                    self._short[prefix] = [[new_rank], True]
+                continue
+            ranks, complete = top
+            if old_rank is not None:
+                position = bisect_left(ranks, old_rank)
+                if position < len(ranks) and ranks[position] == old_rank:
+                    del ranks[position]
+            # Users ranked below the list's last entry are only added when the list is their
+            # whole range; otherwise someone left out of it could rank above them
+            if new_rank is not None and (complete or (ranks and new_rank < ranks[-1])):
+                insort(ranks, new_rank)
+                if len(ranks) > self.kept_per_prefix:
+                    ranks.pop()
+                    top[1] = False
+            if not top[1] and len(ranks) < self.kept_per_prefix // 2:
+                self._rescan_short(prefix)
+            elif not ranks:
+                del self._short[prefix]
+
+    def load(self, db: Session):
+        # Holding the lock while loading makes writes that commit meanwhile wait and apply on top
+        with self._lock:
+            if self._loaded:
+                return
+            rows = db.exec(select(User.id, User.username, User.hearts_received).where(User.deleted_at == None)).all()
+            self._users = {user_id: (normalize_username(username), username, hearts) for user_id, username, hearts in rows}
+            self._keys = sorted((normalized, user_id) for user_id, (normalized, username, hearts) in self._users.items())
+            self._build_short()
+            self._top.clear()
+            self._loaded = True
+
+    def reset(self):
+        with self._lock:
+            self._keys = []
+            self._users = {}
+            self._short = {}
+            self._top.clear()
+            self._loaded = False
+
+    def _forget_prefixes(self, normalized: str):
+        # Drop cached results for every prefix that can contain this username
+        for key in [key for key in self._top if normalized.startswith(key[0])]:
+            del self._top[key]
+
+    def _remove(self, user_id: uuid.UUID):
+        entry = self._users.get(user_id)
+        if entry is not None:
+            rank = self._rank(user_id)
+            del self._users[user_id]
+            position = bisect_left(self._keys, (entry[0], user_id))
+            del self._keys[position]
+            self._update_short(entry[0], rank, None)
+            self._forget_prefixes(entry[0])
+
+    # Writes are skipped until the index is loaded, since the load reads committed state anyway
+    def upsert(self, user_id: uuid.UUID, username: str, hearts_received: int):
+        with self._lock:
+            if not self._loaded:
+                return
+            self._remove(user_id)
+            normalized = normalize_username(username)
+            self._users[user_id] = (normalized, username, hearts_received)
+            insort(self._keys, (normalized, user_id))
+            self._update_short(normalized, None, self._rank(user_id))
+            self._forget_prefixes(normalized)
+
+    def remove(self, user_id: uuid.UUID):
+        with self._lock:
+            if self._loaded:
+                self._remove(user_id)
+
+    def adjust_hearts(self, user_id: uuid.UUID, delta: int):
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                return
+            old_rank = self._rank(user_id)
+            normalized, username, hearts = entry[0], entry[1], entry[2] + delta
+            self._users[user_id] = (normalized, username, hearts)
+            self._update_short(normalized, old_rank, self._rank(user_id))
+            # A full cached list stays valid while the user is neither in it nor climbing into it,
+            # which keeps busy short prefixes cached through most hearts
+            for key in [key for key in self._top if normalized.startswith(key[0])]:
+                results = self._top[key]
+                last = results[-1] if results else None
+                if len(results) < key[1] or (-hearts, normalized) < (-last["hearts_received"], normalize_username(last["username"])) \
+                        or any(result["id"] == user_id for result in results):
+                    del self._top[key]
+
+    def search(self, db: Session, prefix: str, limit: int = AUTOCOMPLETE_LIMIT) -> List[dict]:
+        if not self._loaded:
+            self.load(db)
+        prefix = normalize_username(prefix)
+        with self._lock:
+            users = self._users
+            if len(prefix) <= SHORT_PREFIX_LENGTH:
+                top = self._short.get(prefix)
+                ranks = top[0][:limit] if top else []
+                return [{"id": user_id, "username": users[user_id][1], "hearts_received": users[user_id][2]} for hearts, normalized, user_id in ranks]
+            cached = self._top.get((prefix, limit))
+            if cached is not None:
+                self._top.move_to_end((prefix, limit))
+                return cached
+            start = bisect_left(self._keys, (prefix,))
+            end = bisect_left(self._keys, (prefix + "\U0010ffff",), start)
+            # Most hearted first, then alphabetical
+            top = heapq.nsmallest(limit, self._keys[start:end], key=lambda key: (-users[key[1]][2], key[0]))
+            results = [{"id": user_id, "username": users[user_id][1], "hearts_received": users[user_id][2]} for normalized, user_id in top]
+            self._top[(prefix, limit)] = results
+            if len(self._top) > PREFIX_CACHE_SIZE:
+                self._top.popitem(last=False)
+            return results
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def __len__(self):
+        return len(self._keys)
+
+username_index = UsernameIndex()
@@ -0,0 +1,65 @@
+# Columnar version of the feed score formula. Evaluates the same arithmetic as
+# feed_algorithm.compute_base_score/_score, in the same order, over whole NumPy arrays,
+# so results are bit-for-bit identical to the scalar path.
+import numpy as np
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, NamedTuple, Optional, Set
+import uuid
+
+from app.models.models import Post
+from app.utils.score_rules import RECENCY_WINDOW, RECENCY_BONUS, FOLLOW_MULTIPLIER, _aware
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+RECENCY_WINDOW_US = RECENCY_WINDOW // timedelta(microseconds=1)
+
+class FeatureColumns(NamedTuple):
+    hearts: np.ndarray
+    comments: np.ndarray
+    shares: np.ndarray
+    completion_rate: np.ndarray
+    reports: np.ndarray
+    has_image: np.ndarray
+    type_multiplier: np.ndarray
+    created_at_us: np.ndarray  # int64 microseconds since the epoch, exact for the recency cut-off
+    author_ids: List[uuid.UUID]
+
+def _to_us(value: datetime) -> int:
+    return (_aware(value) - EPOCH) // timedelta(microseconds=1)
+
+def _type_multiplier(post_type: str) -> float:
+    if post_type == "daily_gratitude":
+        return 3.0  # Daily Gratitude Multiplier
+    if post_type == "simple_text":
+        return 0.5  # Spontaneous Text posts receive 0.5x visibility modifier
+    return 1.0
+
+def columns_from_posts(posts: Iterable[Post]) -> FeatureColumns:
+    posts = list(posts)
+    return FeatureColumns(
+        hearts=np.fromiter((p.hearts_count for p in posts), dtype=np.float64, count=len(posts)),
+        comments=np.fromiter((p.comments_count for p in posts), dtype=np.float64, count=len(posts)),
+        shares=np.fromiter((p.shares_count for p in posts), dtype=np.float64, count=len(posts)),
+        completion_rate=np.fromiter((p.completion_rate for p in posts), dtype=np.float64, count=len(posts)),
+        reports=np.fromiter((p.reports for p in posts), dtype=np.float64, count=len(posts)),
+        has_image=np.fromiter((bool(p.image_url) for p in posts), dtype=bool, count=len(posts)),
+        type_multiplier=np.fromiter((_type_multiplier(p.post_type) for p in posts), dtype=np.float64, count=len(posts)),
+        created_at_us=np.fromiter((_to_us(p.created_at) for p in posts), dtype=np.int64, count=len(posts)),
+        author_ids=[p.user_id for p in posts],
+    )
+
+def base_score_vector(columns: FeatureColumns) -> np.ndarray:
+    score = (columns.hearts * 1.0) + (columns.comments * 2.0) + (columns.shares * 3.0) + \
+            (columns.completion_rate * 1.5) - (columns.reports * 10.0)
+    score = np.where(columns.has_image, score + 2.5, score)  # Photo Bonus
+    return score * columns.type_multiplier
+
+def follow_mask(columns: FeatureColumns, following_ids: Optional[Set[uuid.UUID]]) -> np.ndarray:
+    if not following_ids:
+        return np.zeros(len(columns.author_ids), dtype=bool)
+    return np.fromiter((author_id in following_ids for author_id in columns.author_ids), dtype=bool, count=len(columns.author_ids))
+
+def score_vector(columns: FeatureColumns, following_ids: Optional[Set[uuid.UUID]] = None, now: Optional[datetime] = None) -> np.ndarray:
+    now_us = _to_us(now or datetime.now(timezone.utc))
+    score = base_score_vector(columns)
+    score = np.where(columns.created_at_us > now_us - RECENCY_WINDOW_US, score + RECENCY_BONUS, score)
+    return np.where(follow_mask(columns, following_ids), score * FOLLOW_MULTIPLIER, score)
@@ -0,0 +1,90 @@
+# Hot read routes under 500 simultaneous clients, served by the sync routes on the threadpool
+# and by the async routes on the async engine. Requests go in-process over ASGI. Seeds the
+# local database with a few posts if it has none.
+# The sync engine gets a pool as large as the client count. With far fewer connections than
+# waiting requests the sync routes stall until pool timeouts: a request keeps its connection
+# while it queues for a thread again to serialize its response, behind handlers that hold
+# every thread waiting for a connection.
+# Run from the backend directory: python -m benchmarks.bench_async_reads [requests per endpoint]
+import asyncio
+import os
+import sys
+import time
+
+CLIENTS = 500
+os.environ.setdefault("DB_POOL_SIZE", str(CLIENTS))
+os.environ.setdefault("DB_MAX_OVERFLOW", "0")
+
+import httpx
+from sqlmodel import Session, select
+
+from app.main import app
+from app.models.models import Post
+from app.routers import interactions_router, posts_router, profiles_router, search_router
+from app.utils.async_database import dispose_async_engine
+from app.utils.cache import feed_cache
+from app.utils.database import engine
+from app.utils.rate_limiter import rate_limiter
+from benchmarks.bench_middleware import seed
+
+ASYNC_ENDPOINTS = {
+    route.endpoint
+    for module in (posts_router, interactions_router, profiles_router, search_router)
+    for route in module.async_router.routes
+}
+
+def use_async_reads(enabled):
+    routes = [route for route in ALL_ROUTES if enabled or getattr(route, "endpoint", None) not in ASYNC_ENDPOINTS]
+    app.router.routes[:] = routes
+
+async def run(paths, requests):
+    latencies = []
+    errors = 0
+    limits = httpx.Limits(max_connections=None)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", limits=limits) as client:
+        async def worker(count, offset):
+            nonlocal errors
+            for i in range(count):
+                started = time.perf_counter()
+                try:
+                    response = await client.get(paths[(offset + i) % len(paths)])
+                    failed = response.status_code != 200
+                except Exception:
+                    failed = True
+                latencies.append(time.perf_counter() - started)
+                errors += failed
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(max(requests // CLIENTS, 1), client) for client in range(CLIENTS)))
+        elapsed = time.perf_counter() - started
+    latencies.sort()
+    return (len(latencies) - errors) / elapsed, latencies[len(latencies) // 2] * 1e3, latencies[int(len(latencies) * 0.99)] * 1e3, errors
+
+async def measure(paths, requests):
+    await run(paths, CLIENTS)  # warm up, which also fills the async pool
+    try:
+        return await run(paths, requests)
+    finally:
+        await dispose_async_engine()  # its connections belong to this event loop
+
+def bench(requests):
+    with Session(engine) as session:
+        posts = session.exec(select(Post).limit(20)).all()
+    endpoints = {
+        "/posts/{id}": [f"/posts/{post.id}" for post in posts],
+        "/posts/{id}/comments": [f"/posts/{post.id}/comments" for post in posts],
+        "/profiles/{id}": [f"/profiles/{posts[0].user_id}"],
+    }
+    for name, paths in endpoints.items():
+        for label, enabled in (("sync threadpool", False), ("async engine", True)):
+            use_async_reads(enabled)
+            feed_cache.clear()
+            rps, p50, p99, errors = asyncio.run(measure(paths, requests))
+            print(f"{name:22} {label:16} {CLIENTS} clients  {rps:8,.0f} ok/s  p50 {p50:8.2f} ms  p99 {p99:8.2f} ms  errors {errors}")
+
+if __name__ == "__main__":
+    ALL_ROUTES = list(app.router.routes)
+    rate_limiter.limits.update({route: (10 ** 9, 60) for route in rate_limiter.limits})  # measure the routes, never reject
+    seed()
+    for requests in [int(arg) for arg in sys.argv[1:]] or [5_000]:
+        bench(requests)
@@ -0,0 +1,41 @@
+# Username autocomplete latency on a synthetic index.
+# Run from the backend directory: python -m benchmarks.bench_autocomplete [sizes...]
+import random
+import string
+import sys
+import time
+import uuid
+
+from app.utils.username_index import UsernameIndex, normalize_username
+
+PREFIXES = ["a", "gr", "tha", "user1", "zq"]
+QUERIES = 2000
+
+def make_index(n, rng):
+    index = UsernameIndex()
+    users = {}
+    for _ in range(n):
+        username = "".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 6))) + str(rng.randint(0, 9999))
+        users[uuid.uuid4()] = (normalize_username(username), username, rng.randint(0, 5000))
+    index._users = users
+    index._keys = sorted((normalized, user_id) for user_id, (normalized, username, hearts) in users.items())
+    index._build_short()
+    index._loaded = True
+    return index
+
+def bench(n):
+    index = make_index(n, random.Random(n))
+    for prefix in PREFIXES:
+        started = time.perf_counter()
+        index.search(None, prefix)
+        cold_us = (time.perf_counter() - started) * 1e6
+        started = time.perf_counter()
+        for _ in range(QUERIES):
+            index.search(None, prefix)
+        warm_us = (time.perf_counter() - started) * 1e6 / QUERIES
+        print(f"{n:>9,} users  prefix {prefix!r:8}  cold {cold_us:9.1f} us  cached {warm_us:6.2f} us")
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    for n in sizes:
+        bench(n)
@@ -0,0 +1,97 @@
+# Requests/sec and latency through the full app with the auth and rate limit middleware written
+# on BaseHTTPMiddleware (before) and as plain ASGI (after). Requests go in-process over ASGI,
+# so the numbers show framework overhead rather than network time. Seeds the local database
+# with a few posts if it has none.
+# Run from the backend directory: python -m benchmarks.bench_middleware [requests per endpoint]
+import asyncio
+import sys
+import time
+
+import httpx
+from sqlmodel import Session, select
+from starlette.middleware import Middleware
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse
+
+from app.main import AuthMiddleware, app
+from app.models.models import Post, User
+from app.utils.database import create_db_and_tables, engine
+from app.utils.jwt import get_token_subject
+from app.utils.post_scores import refresh_post_score
+from app.utils.rate_limiter import RateLimitMiddleware, rate_limiter, route_class
+from app.utils.search_index import index_post
+
+ENDPOINTS = ["/healthz", "/posts", "/feed/discover"]
+CONCURRENCY = 32
+
+class BaseHTTPAuthMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        get_token_subject(request)
+        return await call_next(request)
+
+class BaseHTTPRateLimitMiddleware(BaseHTTPMiddleware):
+    def __init__(self, app, limiter=rate_limiter):
+        super().__init__(app)
+        self.limiter = limiter
+
+    async def dispatch(self, request, call_next):
+        route = route_class(request.method, request.url.path)
+        if route is not None:
+            client = getattr(request.state, "token_subject", None) or f"ip:{request.client.host if request.client else 'unknown'}"
+            if self.limiter.hit(route, client):
+                return JSONResponse({"detail": "Too many requests"}, status_code=429)
+        return await call_next(request)
+
+BEFORE = {AuthMiddleware: BaseHTTPAuthMiddleware, RateLimitMiddleware: BaseHTTPRateLimitMiddleware}
+
+def use_middleware(replacements):
+    app.user_middleware = [Middleware(replacements.get(cls, cls), *args, **kwargs) for cls, args, kwargs in ORIGINAL_MIDDLEWARE]
+    app.middleware_stack = None  # rebuilt on the next request
+
+def seed():
+    create_db_and_tables()
+    with Session(engine) as session:
+        if session.exec(select(Post)).first():
+            return
+        user = User(email="bench@example.com", username="bench", password_hash="unused")
+        session.add(user)
+        session.flush()
+        for i in range(50):
+            post = Post(content=f"Benchmark post number {i}", user_id=user.id)
+            session.add(post)
+            refresh_post_score(session, post)
+            index_post(session, post)
+        session.commit()
+
+async def run(path, requests):
+    latencies = []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def worker(count):
+            for _ in range(count):
+                started = time.perf_counter()
+                response = await client.get(path)
+                latencies.append(time.perf_counter() - started)
+                assert response.status_code == 200, response.status_code
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(requests // CONCURRENCY) for _ in range(CONCURRENCY)))
+        elapsed = time.perf_counter() - started
+    latencies.sort()
+    return len(latencies) / elapsed, latencies[len(latencies) // 2] * 1e3, latencies[int(len(latencies) * 0.99)] * 1e3
+
+def bench(requests):
+    for path in ENDPOINTS:
+        results = {}
+        for label, replacements in (("BaseHTTPMiddleware", BEFORE), ("pure ASGI", {})):
+            use_middleware(replacements)
+            asyncio.run(run(path, CONCURRENCY * 10))  # warm up
+            results[label] = asyncio.run(run(path, requests))
+        for label, (rps, p50, p99) in results.items():
+            print(f"{path:15} {label:18}  {rps:8,.0f} req/s  p50 {p50:7.2f} ms  p99 {p99:7.2f} ms")
+
+if __name__ == "__main__":
+    ORIGINAL_MIDDLEWARE = list(app.user_middleware)
+    rate_limiter.limits.update({route: (10 ** 9, 60) for route in rate_limiter.limits})  # measure the check, never reject
+    seed()
+    for requests in [int(arg) for arg in sys.argv[1:]] or [3_200]:
+        bench(requests)
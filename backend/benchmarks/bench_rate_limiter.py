@@ -0,0 +1,53 @@
+# Per-request rate limit check cost with many active users: the old per-user timestamp list
+# against the sliding window counter.
+# Run from the backend directory: python -m benchmarks.bench_rate_limiter [active users]
+import random
+import sys
+import time
+
+from app.utils.rate_limiter import SlidingWindowLimiter
+
+LIMIT = 600
+WINDOW = 60
+REQUESTS = 200_000
+
+def timestamp_list_check(request_counts, user_id, now):
+    # The previous implementation: rebuild the user's list of request times on every request
+    request_counts[user_id] = [(t, c) for t, c in request_counts[user_id] if now - t < WINDOW]
+    if len(request_counts[user_id]) >= LIMIT:
+        return False
+    request_counts[user_id].append((now, 1))
+    return True
+
+def bench(users):
+    rng = random.Random(42)
+    # Every user is partway through their budget, as a busy minute leaves them
+    started_at = 1_000_000.0
+    request_counts = {f"user{i}": [(started_at + j * WINDOW / LIMIT, 1) for j in range(LIMIT // 2)] for i in range(users)}
+    limiter = SlidingWindowLimiter({"read": (LIMIT, WINDOW)})
+    for i in range(users):
+        for j in range(LIMIT // 2):
+            limiter.hit("read", f"user{i}", now=started_at + j * WINDOW / LIMIT)
+    traffic = [(f"user{rng.randrange(users)}", started_at + 30 + i * 20 / REQUESTS) for i in range(REQUESTS)]
+
+    started = time.perf_counter()
+    for user_id, now in traffic:
+        timestamp_list_check(request_counts, user_id, now)
+    list_us = (time.perf_counter() - started) * 1e6 / REQUESTS
+
+    started = time.perf_counter()
+    for user_id, now in traffic:
+        limiter.hit("read", user_id, now=now)
+    counter_us = (time.perf_counter() - started) * 1e6 / REQUESTS
+
+    started = time.perf_counter()
+    limiter.sweep(now=started_at + 3 * WINDOW)
+    sweep_ms = (time.perf_counter() - started) * 1e3
+
+    print(f"{users:>7,} active users  timestamp list {list_us:7.2f} us/request  "
+          f"sliding window counter {counter_us:5.2f} us/request  speedup {list_us / counter_us:6.1f}x  "
+          f"sweep of idle keys {sweep_ms:6.1f} ms")
+
+if __name__ == "__main__":
+    for users in [int(arg) for arg in sys.argv[1:]] or [1_000, 10_000]:
+        bench(users)
@@ -0,0 +1,35 @@
+# Per-request token verification cost with and without the verified-token cache.
+# Run from the backend directory: python -m benchmarks.bench_token_verification [requests]
+import sys
+import time
+
+from fastapi import HTTPException
+
+from app.utils import jwt
+from app.utils.token_cache import token_cache
+
+CLIENTS = 100
+
+def bench(requests):
+    tokens = [jwt.create_access_token(data={"sub": f"user{i}@example.com"}) for i in range(CLIENTS)]
+    error = HTTPException(status_code=401)
+
+    started = time.perf_counter()
+    for i in range(requests):
+        token_cache.clear()
+        jwt.verify_token(tokens[i % CLIENTS], error)
+    uncached_us = (time.perf_counter() - started) * 1e6 / requests
+
+    token_cache.clear()
+    started = time.perf_counter()
+    for i in range(requests):
+        jwt.verify_token(tokens[i % CLIENTS], error)
+    cached_us = (time.perf_counter() - started) * 1e6 / requests
+
+    print(f"{requests:>9,} requests from {CLIENTS} clients  "
+          f"decode every time {uncached_us:7.1f} us/request  "
+          f"memoized {cached_us:6.1f} us/request  speedup {uncached_us / cached_us:5.1f}x")
+
+if __name__ == "__main__":
+    for requests in [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000]:
+        bench(requests)
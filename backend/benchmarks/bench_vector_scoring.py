@@ -0,0 +1,56 @@
+# Scalar vs vectorized feed scoring on synthetic candidates.
+# Run from the backend directory: python -m benchmarks.bench_vector_scoring [sizes...]
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import numpy as np
+
+from app.utils.feed_algorithm import _score
+from app.utils.vector_scoring import columns_from_posts, score_vector
+
+POST_TYPES = ["simple_text", "daily_gratitude", "daily", "photo"]
+
+def make_candidates(n, rng):
+    now = datetime.now(timezone.utc)
+    authors = [uuid.uuid4() for _ in range(1000)]
+    posts = [
+        SimpleNamespace(
+            hearts_count=int(rng.integers(0, 500)),
+            comments_count=int(rng.integers(0, 100)),
+            shares_count=int(rng.integers(0, 20)),
+            completion_rate=float(rng.random()),
+            reports=int(rng.integers(0, 2)),
+            image_url="uploads/post.jpg" if rng.random() < 0.3 else None,
+            post_type=POST_TYPES[int(rng.integers(0, len(POST_TYPES)))],
+            created_at=now - timedelta(seconds=float(rng.uniform(0, 7 * 86400))),
+            user_id=authors[int(rng.integers(0, len(authors)))],
+        )
+        for _ in range(n)
+    ]
+    return posts, set(authors[:100]), now
+
+def bench(n):
+    posts, following_ids, now = make_candidates(n, np.random.default_rng(n))
+
+    started = time.perf_counter()
+    [_score(post, post.user_id in following_ids, now) for post in posts]
+    scalar_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    columns = columns_from_posts(posts)
+    loaded = time.perf_counter()
+    score_vector(columns, following_ids, now)
+    vector_seconds = time.perf_counter() - loaded
+    load_seconds = loaded - started
+
+    print(f"{n:>9,} candidates  scalar {scalar_seconds * 1000:9.1f} ms  "
+          f"column load {load_seconds * 1000:8.1f} ms  vector {vector_seconds * 1000:7.1f} ms  "
+          f"speedup (compute) {scalar_seconds / vector_seconds:6.1f}x")
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    for n in sizes:
+        bench(n)
@@ -1,3 +1,7 @@
+import os
+# Mount the async read routes, which only default to on for PostgreSQL
+os.environ.setdefault("ASYNC_READS_ENABLED", "true")
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlmodel import Session, SQLModel, create_engine, select
@@ -7,10 +11,62 @@ from typing import Optional
 from app.main import app
 from app.models.models import User, Post, Interaction, Follow, Notification, UserPreferences, Achievement
 from app.routers.auth_router import get_session
+from app.utils.post_scores import refresh_post_score
+from app.utils.cache import engagement_invalidation, feed_cache, search_cache
+from app.utils.search_index import index_post, index_user
+from app.utils.username_index import username_index
+from app.utils.trending import trending_terms
+from app.utils.principal_cache import principal_cache
+from app.utils.token_cache import token_cache
+from app.utils.login_attempts import login_attempts
+from app.utils.rate_limiter import rate_limiter
+from app.utils.async_database import get_async_session
+from app.routers import metrics_router
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 # Use an in-memory SQLite database for testing
 DATABASE_URL = "sqlite:///./test.db"
 engine = create_engine(DATABASE_URL, echo=True, connect_args={"check_same_thread": False})
+# The async read routes read the same file. NullPool, since each request from the test client
+# runs on its own event loop and pooled aiosqlite connections would outlive it.
+async_engine = create_async_engine("sqlite+aiosqlite:///./test.db", poolclass=NullPool)
+
+
+@pytest.fixture(autouse=True)
+def clear_response_caches():
+    # Each test starts from an empty database, so cached responses must not leak between tests
+    feed_cache.clear()
+    engagement_invalidation.clear()
+    search_cache.clear()
+    username_index.reset()
+    trending_terms.clear()
+    principal_cache.clear()
+    token_cache.clear()
+    login_attempts.clear()
+    rate_limiter.clear()
+    yield
+
+
+@pytest.fixture(autouse=True)
+def async_session_override():
+    # Every test module's client fixture overrides get_session; this keeps the async routes
+    # off the configured DATABASE_URL too. Set per test, since client fixtures clear overrides.
+    async def get_async_session_override():
+        async with AsyncSession(async_engine) as session:
+            yield session
+
+    app.dependency_overrides[get_async_session] = get_async_session_override
+    yield
+    app.dependency_overrides.pop(get_async_session, None)
+
+
+@pytest.fixture(name="metrics_headers")
+def metrics_headers_fixture(monkeypatch):
+    # The test client has no client address, so /metrics needs the token
+    monkeypatch.setattr(metrics_router, "METRICS_TOKEN", "test-metrics-token")
+    return {"Authorization": "Bearer test-metrics-token"}
 
 
 @pytest.fixture(name="db")
@@ -38,6 +94,7 @@ def test_user_email_fixture(db: Session):
     from app.utils.security import hash_password
     user = User(email="test@example.com", username="testuser", password_hash=hash_password("password"), email_verified=True)
     db.add(user)
+    index_user(db, user)
     db.commit()
     db.refresh(user)
     return user.email
@@ -48,6 +105,7 @@ def test_user2_email_fixture(db: Session):
     from app.utils.security import hash_password
     user = User(email="test2@example.com", username="testuser2", password_hash=hash_password("password"), email_verified=True)
     db.add(user)
+    index_user(db, user)
     db.commit()
     db.refresh(user)
     return user.email
@@ -58,6 +116,8 @@ def test_post_fixture(client: TestClient, db: Session, test_user_email: str): #
     user = db.exec(select(User).where(User.email == test_user_email)).first() # Fetch user from session
     post = Post(content="This is a test post", user_id=user.id)
     db.add(post)
+    refresh_post_score(db, post)  # Posts inserted directly need their ranking row
+    index_post(db, post)  # and their search index entry
     db.commit()
     db.refresh(post)
     return post
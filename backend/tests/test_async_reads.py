@@ -0,0 +1,126 @@
+import asyncio
+import inspect
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.routers import interactions_router, posts_router, profiles_router, search_router
+from app.utils.async_database import async_database_url
+from app.utils.cache import InMemoryCacheBackend, ResponseCache
+
+
+def _endpoint(path: str):
+    return next(route.endpoint for route in app.routes if getattr(route, "path", None) == path)
+
+def test_async_routes_match_first():
+    for path in ("/posts/{post_id:uuid}", "/posts/{post_id:uuid}/comments", "/profiles/{user_id:uuid}", "/search/posts"):
+        assert inspect.iscoroutinefunction(_endpoint(path)), path
+    # Feed ranking is CPU-bound and stays on the threadpool
+    assert not inspect.iscoroutinefunction(_endpoint("/feed/discover"))
+
+def test_async_database_url():
+    assert async_database_url("sqlite:///test.db") == "sqlite+aiosqlite:///test.db"
+    assert async_database_url("postgresql://user:pw@db:5432/app") == "postgresql+asyncpg://user:pw@db:5432/app"
+    assert async_database_url("postgresql+psycopg2://db/app") == "postgresql+asyncpg://db/app"
+
+ASYNC_ENDPOINTS = {
+    route.endpoint
+    for module in (posts_router, interactions_router, profiles_router, search_router)
+    for route in module.async_router.routes
+}
+
+@pytest.fixture(params=["async", "sync"])
+def read_routes(request, monkeypatch):
+    # "sync" serves the app as with ASYNC_READS_ENABLED=false, where nothing shadows the sync routes
+    if request.param == "sync":
+        monkeypatch.setattr(app.router, "routes", [route for route in app.router.routes if getattr(route, "endpoint", None) not in ASYNC_ENDPOINTS])
+    return request.param
+
+def test_read_routes(read_routes, client: TestClient, test_post, test_user_email: str, auth_token: str):
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    client.post(f"/posts/{test_post.id}/comments", headers=headers, json={"content": "So true"}).raise_for_status()
+
+    assert client.get(f"/posts/{test_post.id}").json()["content"] == "This is a test post"
+    assert [c["content"] for c in client.get(f"/posts/{test_post.id}/comments").json()] == ["So true"]
+    assert client.get(f"/profiles/{test_post.user_id}").json()["email"] == test_user_email
+    assert [p["id"] for p in client.get("/feed/discover").json()] == [str(test_post.id)]
+    assert [p["id"] for p in client.get("/feed", headers=headers).json()] == [str(test_post.id)]
+    assert client.get("/feed").status_code == 401
+    assert [p["id"] for p in client.get("/search/posts?query=test").json()] == [str(test_post.id)]
+    assert [u["username"] for u in client.get("/search/users/autocomplete?prefix=test").json()] == ["testuser"]
+
+    # Paths the UUID-only async routes do not match still reach the sync routes
+    assert client.get("/posts/drafts", headers=headers).status_code == 200
+    assert client.get("/profiles/me", headers=headers).json()["email"] == test_user_email
+
+def test_async_single_flight():
+    cache = ResponseCache(InMemoryCacheBackend())
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return b"page"
+
+    async def main():
+        return await asyncio.gather(*(cache.get_or_compute_async("discover", "20:", compute, 60) for _ in range(5)))
+
+    assert asyncio.run(main()) == [b"page"] * 5
+    assert len(calls) == 1
+    assert cache.stats()["coalesced"] == 4
+    assert asyncio.run(cache.get_or_compute_async("discover", "20:", compute, 60)) == b"page"
+    assert cache.stats()["hits"] == 1
+
+def test_async_single_flight_survives_a_cancelled_leader():
+    cache = ResponseCache(InMemoryCacheBackend())
+    calls = []
+
+    async def main():
+        started = asyncio.Event()
+
+        async def compute():
+            calls.append(1)
+            if len(calls) == 1:
+                started.set()
+                await asyncio.sleep(10)  # the first request's client goes away mid-computation
+            return b"page"
+
+        leader = asyncio.create_task(cache.get_or_compute_async("discover", "20:", compute, 60))
+        await started.wait()
+        waiters = [asyncio.create_task(cache.get_or_compute_async("discover", "20:", compute, 60)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        results = await asyncio.gather(*waiters)
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return results
+
+    # One waiter takes over the computation and the others coalesce on it
+    assert asyncio.run(main()) == [b"page"] * 3
+    assert len(calls) == 2
+    assert cache.stats()["coalesced"] == 2
+
+def test_async_cache_calls_blocking_backends_off_the_loop():
+    import threading
+    threads = set()
+
+    class RecordingBackend(InMemoryCacheBackend):
+        blocking = True
+
+        def get(self, key):
+            threads.add(threading.get_ident())
+            return super().get(key)
+
+        def get_counters(self, keys):
+            threads.add(threading.get_ident())
+            return super().get_counters(keys)
+
+    cache = ResponseCache(RecordingBackend())
+
+    async def main():
+        async def compute():
+            return b"page"
+        await cache.get_or_compute_async("discover", "20:", compute, 60)
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(main())
+    assert threads and loop_thread not in threads
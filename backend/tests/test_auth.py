@@ -1,5 +1,7 @@
 import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from sqlmodel import Session, SQLModel, create_engine, select
 
 from app.main import app
@@ -219,4 +221,170 @@ def test_get_other_user_profile(client: TestClient, db: Session, test_user_email
     user2_obj = db.exec(select(User).where(User.email == test_user2_email)).first() # Fetch user2 from session
     assert user2_obj is not None
     response = client.get(f"/profiles/{str(user2_obj.id)}", headers={"Authorization": f"Bearer {auth_token}"}).json()
-    assert response["email"] == test_user2_email
\ No newline at end of file
+    assert response["email"] == test_user2_email
+
+
+def _user_lookups(client, method, url, **kwargs):
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(Engine, "before_cursor_execute", record)
+    try:
+        response = getattr(client, method)(url, **kwargs)
+    finally:
+        event.remove(Engine, "before_cursor_execute", record)
+    return response, statements
+
+
+def test_principal_resolved_once_per_request(client: TestClient, test_user_email: str, auth_token: str):
+    response, statements = _user_lookups(client, "get", "/posts/drafts", headers={"Authorization": f"Bearer {auth_token}"})
+    assert response.status_code == 200
+    assert len([s for s in statements if 'FROM user' in s]) == 1
+
+    response, statements = _user_lookups(client, "get", "/healthz", headers={"Authorization": f"Bearer {auth_token}"})
+    assert response.status_code == 200
+    assert statements == []
+
+    response, statements = _user_lookups(client, "get", "/posts/drafts", headers={"Authorization": "Bearer not-a-token"})
+    assert response.status_code == 401
+    assert statements == []
+
+
+def test_principal_cache(client: TestClient, test_user_email: str, auth_token: str):
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    client.get("/posts/drafts", headers=headers)
+    response, statements = _user_lookups(client, "get", "/posts/drafts", headers=headers)
+    assert response.status_code == 200
+    assert [s for s in statements if 'FROM user' in s] == []
+
+    # Profile writes invalidate the cached principal
+    client.put("/profiles/me", json={"bio": "Cached no more"}, headers=headers)
+    assert client.get("/profiles/me", headers=headers).json()["bio"] == "Cached no more"
+
+    # Soft-deleted accounts are rejected on the very next request
+    assert client.delete("/auth/delete", headers=headers).status_code == 200
+    assert client.get("/posts/drafts", headers=headers).status_code == 401
+    assert client.get("/profiles/me", headers=headers).status_code == 401
+
+
+def test_principal_cache_invalidation_reaches_every_worker(session: Session, test_user_email: str):
+    import fakeredis
+    from datetime import datetime, timezone
+    from app.utils.cache import RedisCacheBackend
+    from app.utils.principal_cache import PrincipalCache
+    redis = fakeredis.FakeRedis()
+    # Two worker processes, each with its own cache, sharing Redis
+    first, second = (PrincipalCache(backend=RedisCacheBackend(redis, "principal:")) for _ in range(2))
+    with Session(engine) as db:
+        assert first.get(db, test_user_email) is not None
+        assert first.get(db, test_user_email) is not None
+    assert first.stats()["hits"] == 1
+
+    # The deletion is handled by the second worker
+    user = session.exec(select(User).where(User.email == test_user_email)).one()
+    user.deleted_at = datetime.now(timezone.utc)
+    session.add(user)
+    session.commit()
+    second.invalidate(test_user_email)
+
+    with Session(engine) as db:
+        assert first.get(db, test_user_email).deleted_at is not None
+    assert first.stats()["hits"] == 1
+
+
+def test_profile_update_keeps_concurrent_counter_changes(client: TestClient, session: Session, test_user_email: str, auth_token: str):
+    from app.routers.profiles_router import UserProfileUpdate, update_current_user_profile
+    from app.utils.engagement import adjust_hearts_received
+    from app.utils.principal_cache import principal_cache
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    client.get("/profiles/me", headers=headers)  # caches the principal with hearts_received 0
+    user_id = session.exec(select(User).where(User.email == test_user_email)).one().id
+    with Session(engine) as other:
+        adjust_hearts_received(other, user_id, 5)
+        other.commit()
+
+    # The principal comes from the cache on one session, the update runs on another
+    with Session(engine) as auth_session, Session(engine) as route_session:
+        current_user = principal_cache.get(auth_session, test_user_email)
+        assert current_user.hearts_received == 0
+        updated = update_current_user_profile(UserProfileUpdate(bio="Still counting"), current_user, route_session)
+        assert (updated.bio, updated.hearts_received) == ("Still counting", 5)
+    session.expire_all()
+    assert session.get(User, user_id).hearts_received == 5
+
+
+def test_verified_token_cache():
+    from fastapi import HTTPException
+    from datetime import datetime, timedelta, timezone
+    from jose import jwt as jose_jwt
+    from app.utils.token_cache import token_cache
+    error = HTTPException(status_code=401)
+
+    token = jwt.create_access_token(data={"sub": "cached@example.com"})
+    misses = token_cache.stats()["misses"]
+    assert jwt.verify_token(token, error).email == "cached@example.com"
+    assert jwt.verify_token(token, error).email == "cached@example.com"
+    assert token_cache.stats()["misses"] == misses + 1
+    assert token_cache.stats()["hits"] >= 1
+
+    # Entries expire with the token itself
+    digest = token_cache.digest(token)
+    exp = jose_jwt.get_unverified_claims(token)["exp"]
+    assert token_cache.get(digest, now=exp + 1) is None
+
+    # Tokens that fail verification are never cached
+    expired = jose_jwt.encode({"sub": "cached@example.com", "exp": datetime.now(timezone.utc) - timedelta(seconds=1)}, jwt.SECRET_KEY, algorithm=jwt.ALGORITHM)
+    forged = token[:-2] + ("AA" if not token.endswith("AA") else "BB")
+    for bad in (expired, forged, expired):
+        with pytest.raises(HTTPException):
+            jwt.verify_token(bad, error)
+    assert token_cache.get(token_cache.digest(expired)) is None
+
+
+def test_login_rehashes_to_current_cost(client: TestClient, session: Session, monkeypatch):
+    import bcrypt
+    import app.utils.security as security
+    user = User(email="oldcost@example.com", username="oldcost", password_hash=bcrypt.hashpw(b"password", bcrypt.gensalt(4)).decode(), email_verified=True)
+    session.add(user)
+    session.commit()
+
+    monkeypatch.setattr(security, "BCRYPT_ROUNDS", 5)
+    response = client.post("/auth/login", json={"email": "oldcost@example.com", "password": "password"})
+    assert response.status_code == 200
+    session.refresh(user)
+    assert user.password_hash.startswith("$2b$05$")
+    assert not security.needs_rehash(user.password_hash)
+    assert client.post("/auth/login", json={"email": "oldcost@example.com", "password": "password"}).status_code == 200
+
+
+def test_login_survives_failed_rehash_commit(client: TestClient, session: Session, monkeypatch):
+    import bcrypt
+    import app.utils.security as security
+    old_hash = bcrypt.hashpw(b"password", bcrypt.gensalt(4)).decode()
+    session.add(User(email="rehashfail@example.com", username="rehashfail", password_hash=old_hash, email_verified=True))
+    session.commit()
+
+    def failing_commit():
+        raise RuntimeError("database is locked")
+    monkeypatch.setattr(security, "BCRYPT_ROUNDS", 5)
+    monkeypatch.setattr(session, "commit", failing_commit)
+    response = client.post("/auth/login", json={"email": "rehashfail@example.com", "password": "password"})
+    assert response.status_code == 200
+    assert "access_token" in response.json()
+    monkeypatch.undo()
+    session.expire_all()
+    assert session.exec(select(User).where(User.email == "rehashfail@example.com")).one().password_hash == old_hash
+
+
+def test_hashing_pool_full_returns_503(client: TestClient, session: Session, monkeypatch):
+    import threading
+    import app.utils.security as security
+    session.add(User(email="busy@example.com", username="busy", password_hash=hash_password("password"), email_verified=True))
+    session.commit()
+    monkeypatch.setattr(security, "_hashing_slots", threading.BoundedSemaphore(1))
+    security._hashing_slots.acquire()  # every slot taken by requests already hashing
+
+    response = client.post("/auth/signup", json={"email": "new@example.com", "password": "password", "username": "newuser"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert client.post("/auth/login", json={"email": "busy@example.com", "password": "password"}).status_code == 503
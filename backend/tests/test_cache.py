@@ -0,0 +1,133 @@
+import asyncio
+import threading
+import time
+import fakeredis
+import pytest
+from sqlmodel import Session
+from app.models.models import Post
+from app.utils.cache import InMemoryCacheBackend, RedisCacheBackend, ResponseCache
+
+
+@pytest.fixture(params=["memory", "redis"])
+def cache(request):
+    if request.param == "redis":
+        return ResponseCache(RedisCacheBackend(fakeredis.FakeRedis(), prefix="test:"))
+    return ResponseCache(InMemoryCacheBackend(max_entries=100))
+
+def test_namespace_invalidation(cache):
+    calls = []
+    def compute():
+        calls.append(1)
+        return f"v{len(calls)}".encode()
+
+    assert cache.get_or_compute("discover", "20:", compute, 60) == b"v1"
+    assert cache.get_or_compute("discover", "20:", compute, 60) == b"v1"
+    assert cache.get_or_compute("topic", "art:20:", compute, 60) == b"v2"
+    cache.invalidate("discover")
+    assert cache.get_or_compute("discover", "20:", compute, 60) == b"v3"
+    assert cache.get_or_compute("topic", "art:20:", compute, 60) == b"v2"
+    assert cache.stats()["hits"] == 2
+
+def test_nested_namespaces(cache):
+    calls = []
+    def compute():
+        calls.append(1)
+        return f"v{len(calls)}".encode()
+
+    assert cache.get_or_compute("topic:garden", "garden:20:", compute, 60) == b"v1"
+    cache.invalidate("topic:coffee")
+    assert cache.get_or_compute("topic:garden", "garden:20:", compute, 60) == b"v1"
+    cache.invalidate("topic")
+    assert cache.get_or_compute("topic:garden", "garden:20:", compute, 60) == b"v2"
+
+def test_single_flight_on_expired_key(cache):
+    calls = []
+    def slow_compute():
+        calls.append(1)
+        time.sleep(0.1)
+        return b"fresh"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute("discover", "20:", slow_compute, 60))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [b"fresh"] * 8
+    assert len(calls) == 1
+    assert cache.stats()["coalesced"] == 7
+
+def test_in_memory_backend_is_bounded_and_expires():
+    backend = InMemoryCacheBackend(max_entries=2)
+    backend.set("a", b"1", 60)
+    backend.set("b", b"2", 60)
+    backend.get("a")
+    backend.set("c", b"3", 60)
+    assert backend.get("b") is None  # least recently used
+    assert backend.get("a") == b"1"
+    backend.set("d", b"4", 0)
+    assert backend.get("d") is None
+
+def test_engagement_refreshes_ranked_feeds_at_most_once_per_interval(client, auth_token: str, monkeypatch):
+    from app.utils.cache import engagement_invalidation
+    monkeypatch.setattr(engagement_invalidation, "interval", 0.3)
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    post = client.post("/posts", json={"content": "Grateful for my garden"}, headers=headers).json()
+    first = client.get("/feed/discover")
+    assert first.headers["Server-Timing"].startswith("candidates;dur=")
+    second = client.get("/feed/discover")
+    assert second.headers["Server-Timing"] == "cache;desc=hit"
+    assert second.content == first.content
+    client.get("/feed/topic/garden")
+    client.get("/feed/topic/coffee")
+
+    # The first heart refreshes discover and the post's topic feeds, not unrelated topics
+    client.post(f"/posts/{post['id']}/heart", headers=headers).raise_for_status()
+    assert client.get("/feed/discover").json()[0]["hearts_count"] == 1
+    assert client.get("/feed/topic/coffee").headers["Server-Timing"] == "cache;desc=hit"
+    garden = client.get("/feed/topic/garden")
+    assert garden.headers["Server-Timing"] != "cache;desc=hit"
+    assert garden.json()[0]["hearts_count"] == 1
+
+    # Engagement within the interval leaves discover stale until the interval ends
+    client.post(f"/posts/{post['id']}/comments", json={"content": "Lovely"}, headers=headers).raise_for_status()
+    assert client.get("/feed/discover").headers["Server-Timing"] == "cache;desc=hit"
+    time.sleep(0.5)
+    assert client.get("/feed/discover").json()[0]["comments_count"] == 1
+
+    # New posts still change discover right away
+    client.post("/posts", json={"content": "Grateful for coffee"}, headers=headers)
+    assert len(client.get("/feed/discover").json()) == 2
+
+def test_throttled_invalidation(cache):
+    from app.utils.cache import ThrottledInvalidation
+    throttled = ThrottledInvalidation(cache, ("discover", "local"), 0.2)
+    throttled.trigger()
+    assert cache.stats()["invalidations"] == 2
+    throttled.trigger()
+    throttled.trigger()
+    assert cache.stats()["invalidations"] == 2
+    time.sleep(0.3)
+    # The triggers inside the interval were folded into one invalidation at its end
+    assert cache.stats()["invalidations"] == 4
+    time.sleep(0.3)
+    assert cache.stats()["invalidations"] == 4
+    throttled.clear()
+
+class UnreachableRedis:
+    def __getattr__(self, name):
+        def fail(*args, **kwargs):
+            raise ConnectionError("Redis is down")
+        return fail
+
+def test_redis_backend_fails_open():
+    cache = ResponseCache(RedisCacheBackend(UnreachableRedis()))
+    assert cache.get_or_compute("discover", "20:", lambda: b"page", 60) == b"page"
+    assert asyncio.run(cache.get_or_compute_async("discover", "20:", _async_value(b"page"), 60)) == b"page"
+    cache.invalidate("discover")
+    assert cache.stats()["backend_errors"] == 3
+
+def _async_value(value):
+    async def compute():
+        return value
+    return compute
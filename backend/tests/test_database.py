@@ -0,0 +1,32 @@
+from sqlalchemy import text
+from app.utils.database import SQLITE_BUSY_TIMEOUT_MS, TimedQueuePool, build_engine, get_session, pool_metrics, pool_stats
+from app.routers import auth_router
+
+
+def test_sqlite_engine_is_tuned_on_connect(tmp_path):
+    engine = build_engine(f"sqlite:///{tmp_path / 'tuned.db'}")
+    assert isinstance(engine.pool, TimedQueuePool)
+    with engine.connect() as connection:
+        assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert connection.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert connection.execute(text("PRAGMA busy_timeout")).scalar() == SQLITE_BUSY_TIMEOUT_MS
+    engine.dispose()
+
+def test_in_memory_sqlite_skips_pool_options():
+    engine = build_engine("sqlite://")
+    assert not isinstance(engine.pool, TimedQueuePool)
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT 1")).scalar() == 1
+
+def test_pool_checkouts_are_timed(tmp_path):
+    checkouts = pool_stats.stats()["checkouts"]
+    engine = build_engine(f"sqlite:///{tmp_path / 'timed.db'}")
+    for _ in range(3):
+        with engine.connect():
+            pass
+    assert pool_stats.stats()["checkouts"] == checkouts + 3
+    assert {"avg_wait_ms", "max_wait_ms", "timeouts", "checked_out"} <= set(pool_metrics())
+    engine.dispose()
+
+def test_routers_share_one_session_dependency():
+    assert auth_router.get_session is get_session
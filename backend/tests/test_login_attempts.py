@@ -0,0 +1,121 @@
+import time
+import fakeredis
+import pytest
+from fastapi.testclient import TestClient
+from app.models.models import User
+from app.utils.login_attempts import InMemoryLoginAttemptStore, RedisLoginAttemptStore, SqliteLoginAttemptStore
+from app.utils.security import hash_password, LOGIN_ATTEMPT_LIMIT
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def store(request, tmp_path):
+    if request.param == "redis":
+        return RedisLoginAttemptStore(fakeredis.FakeRedis(), prefix="test:")
+    if request.param == "sqlite":
+        return SqliteLoginAttemptStore(str(tmp_path / "attempts.db"))
+    return InMemoryLoginAttemptStore()
+
+def test_failures_count_and_expire(store):
+    assert store.failures("a@example.com") == 0
+    assert store.record_failure("a@example.com", 60) == 1
+    assert store.record_failure("a@example.com", 60) == 2
+    assert store.failures("a@example.com") == 2
+    assert store.failures("b@example.com") == 0
+    store.reset("a@example.com")
+    assert store.failures("a@example.com") == 0
+
+    store.record_failure("short@example.com", 1)
+    time.sleep(1.1)
+    assert store.failures("short@example.com") == 0
+    assert store.record_failure("short@example.com", 60) == 1
+
+def test_memory_store_is_bounded():
+    store = InMemoryLoginAttemptStore(max_keys=3)
+    for i in range(10):
+        store.record_failure(f"user{i}@example.com", 60)
+    assert store.stats()["size"] == 3
+    assert store.stats()["evictions"] == 7
+    assert store.failures("user9@example.com") == 1
+    assert store.failures("user0@example.com") == 0
+
+    # Expired counters are dropped as new failures arrive, without waiting for eviction
+    store = InMemoryLoginAttemptStore()
+    store.record_failure("gone@example.com", 0)
+    store.record_failure("new@example.com", 60)
+    assert store.stats() == {"backend": "memory", "size": 1, "expirations": 1, "evictions": 0}
+
+def test_memory_store_sweeps_expired_before_evicting_live():
+    store = InMemoryLoginAttemptStore(max_keys=2)
+    store.record_failure("victim@example.com", 60)
+    store.record_failure("short@example.com", 0)  # expired, but behind a live counter
+    store.record_failure("new@example.com", 60)
+    assert store.failures("victim@example.com") == 1
+    assert store.stats() == {"backend": "memory", "size": 2, "expirations": 1, "evictions": 0}
+
+class UnreachableRedis:
+    def __getattr__(self, name):
+        def fail(*args, **kwargs):
+            raise ConnectionError("Redis is down")
+        return fail
+
+def test_redis_store_fails_open():
+    store = RedisLoginAttemptStore(UnreachableRedis())
+    assert store.failures("a@example.com") == 0
+    assert store.record_failure("a@example.com", 60) == 0
+    store.reset("a@example.com")
+    assert store.stats() == {"backend": "redis", "errors": 3}
+
+def test_login_works_while_the_attempt_store_is_down(client: TestClient, db, monkeypatch):
+    import app.utils.security as security
+
+    monkeypatch.setattr(security, "login_attempts", RedisLoginAttemptStore(UnreachableRedis()))
+    db.add(User(email="steady@example.com", username="steady", password_hash=hash_password("password"), email_verified=True))
+    db.commit()
+    assert client.post("/auth/login", json={"email": "steady@example.com", "password": "wrong"}).status_code == 401
+    assert client.post("/auth/login", json={"email": "steady@example.com", "password": "password"}).status_code == 200
+    assert client.post("/auth/signup", json={"email": "fresh@example.com", "password": "password", "username": "fresh"}).status_code == 201
+
+def test_sqlite_store_is_shared_between_processes(tmp_path):
+    path = str(tmp_path / "attempts.db")
+    first, second = SqliteLoginAttemptStore(path), SqliteLoginAttemptStore(path, max_keys=2)
+    first.record_failure("shared@example.com", 60)
+    assert second.record_failure("shared@example.com", 60) == 2
+    assert first.failures("shared@example.com") == 2
+
+    for i in range(5):
+        second.record_failure(f"user{i}@example.com", 60)
+    second._sweep(time.time())
+    assert second.stats()["size"] == 2
+
+def test_login_lockout(client: TestClient, db):
+    db.add(User(email="locked@example.com", username="locked", password_hash=hash_password("password"), email_verified=True))
+    db.commit()
+
+    for _ in range(LOGIN_ATTEMPT_LIMIT):
+        assert client.post("/auth/login", json={"email": "locked@example.com", "password": "wrong"}).status_code == 401
+    # Case variants of the same address share the counter
+    response = client.post("/auth/login", json={"email": "Locked@Example.com", "password": "password"})
+    assert response.status_code == 403
+
+def test_unknown_accounts_do_not_evict_lockout_counters(client: TestClient, db):
+    from app.utils.login_attempts import login_attempts
+    db.add(User(email="victim@example.com", username="victim", password_hash=hash_password("password"), email_verified=True))
+    db.commit()
+
+    for _ in range(LOGIN_ATTEMPT_LIMIT):
+        client.post("/auth/login", json={"email": "victim@example.com", "password": "wrong"})
+    size = login_attempts.stats()["size"]
+    for i in range(10):
+        assert client.post("/auth/login", json={"email": f"spray{i}@example.com", "password": "wrong"}).status_code == 401
+    assert login_attempts.stats()["size"] == size
+    assert client.post("/auth/login", json={"email": "victim@example.com", "password": "password"}).status_code == 403
+
+def test_successful_login_resets_failures(client: TestClient, db):
+    db.add(User(email="forgetful@example.com", username="forgetful", password_hash=hash_password("password"), email_verified=True))
+    db.commit()
+
+    for _ in range(LOGIN_ATTEMPT_LIMIT - 1):
+        client.post("/auth/login", json={"email": "forgetful@example.com", "password": "wrong"})
+    assert client.post("/auth/login", json={"email": "forgetful@example.com", "password": "password"}).status_code == 200
+    assert client.post("/auth/login", json={"email": "forgetful@example.com", "password": "wrong"}).status_code == 401
+    assert client.post("/auth/login", json={"email": "forgetful@example.com", "password": "password"}).status_code == 200
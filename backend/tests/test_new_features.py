@@ -100,14 +100,15 @@ def test_search_posts(db: Session, test_user_email: str, test_post: Post, auth_t
     assert len(data) > 0
     assert data[0]["content"] == test_post.content
 
-def test_get_trending_topics(db: Session, test_user_email: str, test_post: Post, auth_token: str):
+def test_get_trending_topics(db: Session, test_user_email: str, auth_token: str):
     user = db.exec(select(User).where(User.email == test_user_email)).first()
     assert user is not None
+    client.post("/posts", json={"content": "Grateful for the #Sunrise hike with friends"}, headers={"Authorization": f"Bearer {auth_token}"})
     response = client.get("/search/trending", headers={"Authorization": f"Bearer {auth_token}"})
     response.raise_for_status()
     data = response.json()
     assert len(data) > 0
-    assert data[0]["content"] == test_post.content
+    assert data[0]["term"] == "sunrise"
 
 # New tests for User Profiles System
 def test_get_current_user_profile(client: TestClient, test_user_email: str, auth_token: str):
@@ -0,0 +1,167 @@
+import time
+import fakeredis
+import pytest
+from fastapi.testclient import TestClient
+from app.utils.rate_limiter import (
+    InMemoryRateLimitStore, RedisRateLimitStore, SlidingWindowLimiter, SqliteRateLimitStore, rate_limiter, route_class,
+)
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def store(request, tmp_path):
+    if request.param == "redis":
+        return RedisRateLimitStore(fakeredis.FakeRedis(), prefix="test:")
+    if request.param == "sqlite":
+        return SqliteRateLimitStore(str(tmp_path / "rate_limits.db"))
+    return InMemoryRateLimitStore()
+
+
+def test_route_classes():
+    assert route_class("POST", "/auth/login") == "auth"
+    assert route_class("GET", "/feed/discover") == "read"
+    assert route_class("POST", "/posts") == "write"
+    assert route_class("GET", "/healthz") is None
+    assert route_class("OPTIONS", "/posts") is None
+
+def test_sliding_window_counter(store):
+    limiter = SlidingWindowLimiter({"read": (10, 60)}, store)
+    for _ in range(10):
+        assert limiter.hit("read", "alice", now=60.0) == 0
+    # Full for the rest of this window
+    assert limiter.hit("read", "alice", now=90.0) == 30.0
+    assert limiter.hit("read", "bob", now=90.0) == 0
+
+    # Halfway into the next window half of the previous count still applies
+    for _ in range(5):
+        assert limiter.hit("read", "alice", now=150.0) == 0
+    retry_after = limiter.hit("read", "alice", now=150.0)
+    assert 0 < retry_after <= 30
+    assert limiter.hit("read", "alice", now=150.0 + retry_after + 0.01) == 0
+
+    # Two windows later nothing carries over
+    for _ in range(10):
+        assert limiter.hit("read", "alice", now=300.0) == 0
+    assert limiter.stats()["rejected"] == 2
+
+@pytest.mark.parametrize("store", ["memory", "sqlite"], indirect=True)
+def test_sweep_drops_idle_keys(store):
+    limiter = SlidingWindowLimiter({"read": (10, 60), "auth": (5, 600)}, store)
+    limiter.hit("read", "idle", now=0.0)
+    limiter.hit("read", "active", now=100.0)
+    limiter.hit("auth", "slow", now=0.0)
+    assert limiter.sweep(now=130.0) == 1
+    assert limiter.stats()["tracked_keys"] == 2
+    assert limiter.sweep(now=1200.0) == 2
+
+def test_sqlite_store_is_shared_between_processes(tmp_path):
+    path = str(tmp_path / "rate_limits.db")
+    first = SlidingWindowLimiter({"auth": (3, 60)}, SqliteRateLimitStore(path))
+    second = SlidingWindowLimiter({"auth": (3, 60)}, SqliteRateLimitStore(path))
+    assert first.hit("auth", "carol", now=60.0) == 0
+    assert second.hit("auth", "carol", now=61.0) == 0
+    assert first.hit("auth", "carol", now=62.0) == 0
+    assert second.hit("auth", "carol", now=63.0) > 0
+
+def test_fails_open_when_store_is_down():
+    class BrokenStore(InMemoryRateLimitStore):
+        def increment(self, key, index, window):
+            raise ConnectionError("store unreachable")
+
+    limiter = SlidingWindowLimiter({"read": (1, 60)}, BrokenStore())
+    assert limiter.hit("read", "dave") == 0
+    assert limiter.hit("read", "dave") == 0
+    assert limiter.stats()["errors"] == 2
+
+def test_stalled_store_fails_open():
+    import asyncio
+    import threading
+    import time
+    release = threading.Event()
+
+    class StalledStore(InMemoryRateLimitStore):
+        blocking = True
+
+        def increment(self, key, index, window):
+            release.wait(5)  # a store that accepted the connection but never answers
+            return super().increment(key, index, window)
+
+    limiter = SlidingWindowLimiter({"read": (1, 60)}, StalledStore(), store_timeout=0.05)
+
+    async def hit_while_loop_runs():
+        ticks = 0
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+        ticker = asyncio.create_task(tick())
+        results = await asyncio.gather(limiter.hit_async("read", "erin"), limiter.hit_async("read", "erin"))
+        ticker.cancel()
+        return results, ticks
+
+    started = time.monotonic()
+    try:
+        results, ticks = asyncio.run(hit_while_loop_runs())
+    finally:
+        release.set()
+    assert results == [0.0, 0.0]
+    assert time.monotonic() - started < 1
+    assert ticks >= 2  # the event loop kept running while the store stalled
+    assert limiter.stats()["errors"] == 2
+
+def test_stalled_store_does_not_queue_counts():
+    import asyncio
+    import threading
+    from app.utils.rate_limiter import RATE_LIMIT_STORE_WORKERS
+    release = threading.Event()
+    calls = []
+
+    class StalledStore(InMemoryRateLimitStore):
+        blocking = True
+
+        def increment(self, key, index, window):
+            calls.append(key)
+            release.wait(5)
+            return super().increment(key, index, window)
+
+    store = StalledStore()
+    limiter = SlidingWindowLimiter({"read": (1000, 60)}, store, store_timeout=0.05)
+
+    async def burst():
+        return await asyncio.gather(*(limiter.hit_async("read", "frank") for _ in range(RATE_LIMIT_STORE_WORKERS * 3)))
+
+    try:
+        assert asyncio.run(burst()) == [0.0] * (RATE_LIMIT_STORE_WORKERS * 3)
+    finally:
+        release.set()
+    # Only the calls that had a slot reached the store; the rest were let through uncounted
+    assert len(calls) == RATE_LIMIT_STORE_WORKERS
+    assert limiter.stats()["errors"] == RATE_LIMIT_STORE_WORKERS * 3
+    # Once the stalled calls return, the slots are free again
+    for _ in range(50):
+        if limiter._store_slots.acquire(blocking=False):
+            break
+        time.sleep(0.01)
+    else:
+        raise AssertionError("store slots were never released")
+
+def test_middleware_rejects_over_limit(client: TestClient, monkeypatch):
+    monkeypatch.setitem(rate_limiter.limits, "auth", (2, 60))
+    body = {"email": "nobody@example.com", "password": "password"}
+    assert client.post("/auth/login", json=body).status_code == 401
+    assert client.post("/auth/login", json=body).status_code == 401
+    response = client.post("/auth/login", json=body)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    # Other route classes and exempt paths keep their own budgets
+    assert client.get("/healthz").status_code == 200
+    assert client.get("/feed/discover").status_code == 200
+
+def test_middleware_keys_on_token_subject(client: TestClient, auth_token: str, monkeypatch):
+    monkeypatch.setitem(rate_limiter.limits, "read", (1, 60))
+    assert client.get("/feed/discover").status_code == 200
+    assert client.get("/feed/discover").status_code == 429
+    # The subject decoded by AuthMiddleware gets its own budget
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    assert client.get("/feed/discover", headers=headers).status_code == 200
+    assert client.get("/feed/discover", headers=headers).status_code == 429
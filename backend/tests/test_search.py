@@ -0,0 +1,240 @@
+from datetime import datetime, timezone
+import random
+import threading
+import time
+import uuid
+import pytest
+from hypothesis import given, settings, strategies as st
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlmodel import Session, select
+from app.models.models import Interaction, Post, User
+from app.utils.engagement import reconcile_hearts_received
+from app.utils.search_index import POSTGRES_INDEX_DDL, PostgresSearchBackend, index_post, rebuild_search_index, remove_post, search_cache_key, search_posts, search_statement
+from app.utils.pagination import NEXT_CURSOR_HEADER
+from app.utils.username_index import UsernameIndex, normalize_username
+from app.utils.cache import search_cache
+from app.utils.trending import TrendingTerms, trending_terms, save_trending_snapshot, load_trending_snapshot
+
+
+def _paginate(client, url, params):
+    ids, cursor = [], None
+    while True:
+        response = client.get(url, params={**params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        ids.extend(item["id"] for item in response.json())
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if not cursor:
+            return ids
+
+def test_post_search_ranked_and_paginated(client, auth_token: str):
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    weak = client.post("/posts", json={"content": "Grateful for a walk past the community gardens today"}, headers=headers).json()
+    strong = client.post("/posts", json={"content": "Garden day: garden salad from our garden"}, headers=headers).json()
+    client.post("/posts", json={"content": "Grateful for coffee"}, headers=headers)
+
+    results = client.get("/search/posts", params={"query": "GARD"}).json()
+    assert [p["id"] for p in results] == [strong["id"], weak["id"]]
+    assert _paginate(client, "/search/posts", {"query": "gard", "limit": 1}) == [strong["id"], weak["id"]]
+    assert client.get("/search/posts", params={"query": "garden coffee"}).json() == []
+    assert client.get("/search/posts", params={"query": "!!!"}).json() == []
+    assert client.get("/search/posts", params={"query": "garden", "cursor": "bogus"}).status_code == 400
+
+    # Edits are re-indexed
+    client.put(f"/posts/{strong['id']}", json={"content": "Grateful for a sunny morning"}, headers=headers)
+    assert [p["id"] for p in client.get("/search/posts", params={"query": "garden"}).json()] == [weak["id"]]
+    assert [p["id"] for p in client.get("/search/posts", params={"query": "sunny"}).json()] == [strong["id"]]
+
+def test_post_search_survives_rowid_renumbering(client, db: Session, auth_token: str):
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    garden = client.post("/posts", json={"content": "Grateful for my garden"}, headers=headers).json()
+    coffee = client.post("/posts", json={"content": "Grateful for coffee"}, headers=headers).json()
+    # What VACUUM may do to a table without an INTEGER PRIMARY KEY: swap the implicit rowids
+    db.exec(text("UPDATE post SET rowid = -rowid"))
+    db.exec(text("UPDATE post SET rowid = (SELECT MAX(-rowid) FROM post) + 1 + rowid"))
+    db.commit()
+    assert [p["id"] for p in client.get("/search/posts", params={"query": "garden"}).json()] == [garden["id"]]
+    assert [p["id"] for p in client.get("/search/posts", params={"query": "coffee"}).json()] == [coffee["id"]]
+
+    # Deletes and re-indexing find their rows by post id too
+    client.put(f"/posts/{garden['id']}", json={"content": "Grateful for sunshine"}, headers=headers)
+    assert client.get("/search/posts", params={"query": "garden"}).json() == []
+    assert rebuild_search_index(db) == 3  # two posts and their author
+    assert [p["id"] for p in client.get("/search/posts", params={"query": "sunshine"}).json()] == [garden["id"]]
+
+def test_post_search_keys_never_collide(db: Session, test_user_email: str):
+    author = db.exec(select(User).where(User.email == test_user_email)).one()
+    # Ids that agree in their leading bits, as a key truncated from the UUID would not tell apart
+    first = Post(id=uuid.UUID(int=(7 << 80) | 1), content="Grateful for the orchard", user_id=author.id)
+    second = Post(id=uuid.UUID(int=(7 << 80) | 2), content="Grateful for the harbour", user_id=author.id)
+    for post in (first, second):
+        db.add(post)
+        index_post(db, post)
+    db.commit()
+    assert [p.id for p in search_posts(db, "orchard")[0]] == [first.id]
+    assert [p.id for p in search_posts(db, "harbour")[0]] == [second.id]
+
+    remove_post(db, first.id)
+    db.commit()
+    assert search_posts(db, "orchard")[0] == []
+    assert [p.id for p in search_posts(db, "harbour")[0]] == [second.id]
+
+def test_postgres_search_uses_indexed_expressions():
+    # The GIN indexes are only used when the queries repeat their expressions exactly
+    backend = PostgresSearchBackend()
+    dialect = postgresql.dialect()
+    post_sql = str(search_statement(Post, backend.post_search, ["gard", "day"], 20, None).compile(dialect=dialect))
+    assert "WHERE (to_tsvector('simple', post.content) @@ to_tsquery('simple', %(to_tsquery_1)s))" in post_sql
+    assert "to_tsvector('simple', content)" in POSTGRES_INDEX_DDL[0]
+    user_sql = str(search_statement(User, backend.user_search, ["bee"], 20, None).compile(dialect=dialect))
+    user_document = "setweight(to_tsvector('simple', username), 'A') || setweight(to_tsvector('simple', coalesce(bio, '')), 'D')"
+    assert "WHERE ((" + user_document.replace("username", '"user".username').replace("bio", '"user".bio') + ") @@" in user_sql
+    assert user_document in POSTGRES_INDEX_DDL[1]
+    assert backend.build_query(["gard", "day"]) == "gard:* & day:*"
+
+def test_user_search_tracks_profile_and_deletion(client, db: Session, test_user_email: str, test_user2_email: str, auth_token: str):
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    client.put("/profiles/me", json={"bio": "Amateur beekeeper"}, headers=headers)
+    assert [u["username"] for u in client.get("/search/users", params={"query": "beekeep"}).json()] == ["testuser"]
+
+    # Soft-deleted accounts are never returned
+    user1 = db.exec(select(User).where(User.email == test_user_email)).first()
+    user1.deleted_at = datetime.now(timezone.utc)
+    db.add(user1)
+    db.commit()
+    assert client.get("/search/users", params={"query": "testuser"}).json()[0]["username"] == "testuser2"
+    assert client.get("/search/users", params={"query": "beekeeper"}).json() == []
+
+def test_username_autocomplete(client, db: Session, test_user_email: str, test_user2_email: str, test_post, auth_token: str):
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    user2 = db.exec(select(User).where(User.email == test_user2_email)).first()
+    user2.hearts_received = 5
+    db.add(user2)
+    db.commit()
+
+    # Loaded lazily on the first query, most hearted first
+    assert [u["username"] for u in client.get("/search/users/autocomplete", params={"prefix": "TestU"}).json()] == ["testuser2", "testuser"]
+
+    # Signups, hearts and renames are reflected without reloading
+    client.post("/auth/signup", json={"email": "third@example.com", "username": "TestUserThree", "password": "password"})
+    assert [u["username"] for u in client.get("/search/users/autocomplete", params={"prefix": "testuser"}).json()] == ["testuser2", "testuser", "TestUserThree"]
+    client.post(f"/posts/{test_post.id}/heart", headers=headers)
+    assert client.get("/search/users/autocomplete", params={"prefix": "testuser", "limit": 2}).json()[1] == {"id": str(test_post.user_id), "username": "testuser", "hearts_received": 1}
+    client.put("/profiles/me", json={"username": "gratefulgrace"}, headers=headers)
+    assert [u["username"] for u in client.get("/search/users/autocomplete", params={"prefix": "grat"}).json()] == ["gratefulgrace"]
+    assert "testuser" not in [u["username"] for u in client.get("/search/users/autocomplete", params={"prefix": "testuser"}).json()]
+    assert client.get("/search/users/autocomplete", params={"prefix": ""}).status_code == 422
+
+def test_reconcile_hearts_received_backfills_existing_users(db: Session, test_user_email: str, test_user2_email: str, test_post):
+    user1, user2 = (db.exec(select(User).where(User.email == email)).first() for email in (test_user_email, test_user2_email))
+    # Hearts given before the counter existed
+    db.add(Interaction(user_id=user2.id, post_id=test_post.id, interaction_type="heart"))
+    db.add(Interaction(user_id=user1.id, post_id=test_post.id, interaction_type="heart"))
+    db.add(Interaction(user_id=user2.id, post_id=test_post.id, interaction_type="comment", content="Lovely"))
+    user2.hearts_received = 3
+    db.add(user2)
+    db.commit()
+
+    assert reconcile_hearts_received(db, chunk_size=1) == 2
+    db.refresh(user1)
+    db.refresh(user2)
+    assert (user1.hearts_received, user2.hearts_received) == (2, 0)
+    assert reconcile_hearts_received(db) == 0
+
+@settings(max_examples=100, deadline=None)
+@given(st.lists(st.tuples(st.sampled_from(["upsert", "remove", "hearts", "search"]), st.integers(0, 7), st.text("abAB", min_size=1, max_size=4), st.integers(-3, 3)), max_size=60))
+def test_username_index_matches_brute_force(operations):
+    # Small per-prefix lists, so eight users overflow them and force rescans
+    index = UsernameIndex(kept_per_prefix=6)
+    index._loaded = True  # start from an empty, loaded index
+    ids = [uuid.UUID(int=i) for i in range(8)]
+    users = {}
+    for operation, i, name, number in operations:
+        user_id = ids[i]
+        if operation == "upsert" and all(normalize_username(other) != normalize_username(name) or other_id == user_id for other_id, (other, hearts) in users.items()):
+            index.upsert(user_id, name, number)
+            users[user_id] = (name, number)
+        elif operation == "remove":
+            index.remove(user_id)
+            users.pop(user_id, None)
+        elif operation == "hearts" and user_id in users:
+            index.adjust_hearts(user_id, number)
+            users[user_id] = (users[user_id][0], users[user_id][1] + number)
+        prefix, limit = name[:1 + number % 3], 1 + number % 3
+        expected = sorted((-hearts, normalize_username(username), username) for username, hearts in users.values() if normalize_username(username).startswith(normalize_username(prefix)))[:limit]
+        assert [result["username"] for result in index.search(None, prefix, limit)] == [username for hearts, normalized, username in expected]
+
+def test_trending_terms_heavy_hitters_and_decay(tmp_path):
+    trending = TrendingTerms(capacity=10, half_life=3600)
+    now = time.time()
+    rng = random.Random(7)
+    # "family" is 20% of a stream of 500 distinct noise terms, far more than the counters
+    for i in range(2000):
+        trending.add_terms({"family" if i % 5 == 0 else f"noise{rng.randrange(500)}": False}, now)
+    top = trending.top(3, now)
+    assert top[0]["term"] == "family"
+    assert top[0]["score"] - top[0]["max_error"] <= 400 <= top[0]["score"]
+    assert trending.stats()["tracked_terms"] == 10
+
+    # A burst now outweighs the same count from two half-lives ago
+    trending.add_terms({"picnic": True}, now + 7200)
+    for _ in range(500):
+        trending.add_terms({"sunset": False}, now + 7200)
+    assert trending.top(1, now + 7200)[0]["term"] == "sunset"
+    assert trending.top(2, now + 7200)[1]["score"] == pytest.approx(100, abs=1)
+
+def test_trending_snapshot_round_trip(tmp_path):
+    trending_terms.add_terms({"garden": False, "family": True})
+    path = str(tmp_path / "trending.json")
+    save_trending_snapshot(path)
+    before = trending_terms.top()
+    trending_terms.clear()
+    assert load_trending_snapshot(path)
+    assert [t["term"] for t in trending_terms.top()] == [t["term"] for t in before] == ["family", "garden"]
+    assert not load_trending_snapshot(str(tmp_path / "missing.json"))
+
+def test_trending_snapshots_saved_concurrently(tmp_path):
+    # Several workers saving to the same path at once each use their own temporary file
+    trending_terms.add_terms({"garden": False})
+    path = str(tmp_path / "trending.json")
+    errors = []
+    def save():
+        try:
+            for _ in range(20):
+                save_trending_snapshot(path)
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=save) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert [p.name for p in tmp_path.iterdir()] == ["trending.json"]
+    trending_terms.clear()
+    assert load_trending_snapshot(path)
+    assert [t["term"] for t in trending_terms.top()] == ["garden"]
+
+def test_search_results_cached_until_matching_post(client, auth_token: str, metrics_headers):
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    first = client.post("/posts", json={"content": "Grateful for my garden"}, headers=headers).json()
+    assert [p["id"] for p in client.get("/search/posts", params={"query": "Garden"}).json()] == [first["id"]]
+    hits = search_cache.stats()["hits"]
+
+    # Same normalized query, and a post that cannot match it: served from the cache
+    client.post("/posts", json={"content": "Grateful for coffee"}, headers=headers)
+    assert [p["id"] for p in client.get("/search/posts", params={"query": " garden "}).json()] == [first["id"]]
+    assert search_cache.stats()["hits"] == hits + 1
+
+    second = client.post("/posts", json={"content": "Gardening with grandma"}, headers=headers).json()
+    assert {p["id"] for p in client.get("/search/posts", params={"query": "garden"}).json()} == {first["id"], second["id"]}
+    assert search_cache.stats()["hits"] == hits + 1
+    assert client.get("/metrics", headers=metrics_headers).json()["search_cache"]["hit_rate"] > 0
+
+def test_search_cache_key_keeps_accents_apart():
+    # Postgres' 'simple' configuration keeps accents, so the two queries can match different rows
+    assert search_cache_key("Café ") == ("caf", "café")
+    assert search_cache_key("cafe") == ("caf", "cafe")
+    # while the accent-folded namespace is invalidated by writes of either spelling
+    assert search_cache_key("Éclair day")[0] == "ecl"
+    assert search_cache_key("!?") is None